@@ -14,18 +14,24 @@ from __future__ import annotations
 
 import bisect
 import codecs
+import copy
 import re
 import sys
 import types
+from array import array
 from collections import OrderedDict
+from collections.abc import Iterator
 from re import Pattern
-from typing import Any, Callable, NoReturn
+from typing import TYPE_CHECKING, Any, Callable, NoReturn, cast
 
 try:
     from importlib.metadata import version
 except ModuleNotFoundError:
     from importlib_metadata import version  # type: ignore[import-not-found,no-redef]
 
+if TYPE_CHECKING:
+    from arpeggio.index import RuleIndex
+
 __version__ = version("Arpeggio")
 
 DEFAULT_WS = "\t\n\r "
@@ -130,7 +136,7 @@ def flatten(_iterable: Any) -> list[Any]:
     """Flattening of python iterables."""
     result: list[Any] = []
     for e in _iterable:
-        if hasattr(e, "__iter__") and type(e) not in [str, NonTerminal]:
+        if hasattr(e, "__iter__") and not isinstance(e, (str, NonTerminal)):
             result.extend(flatten(e))
         else:
             result.append(e)
@@ -262,20 +268,6 @@ class ParsingExpression:
         raise NotImplementedError
 
     def parse(self, parser: Parser) -> Any:
-        if parser.debug:
-            name = self.name
-            if name.startswith("__asgn"):
-                name = f"{self.name}[{self._attr_name}]"
-            parser.dprint(
-                ">> Matching rule {}{} at position {} => {}".format(
-                    name,
-                    f" in {parser.in_rule}" if parser.in_rule else "",
-                    parser.position,
-                    parser.context(),
-                ),
-                1,
-            )
-
         # Current position could change in recursive calls
         # so save it.
         c_pos = parser.position
@@ -288,12 +280,6 @@ class ParsingExpression:
                 result, new_pos = self._result_cache[c_pos]
                 parser.position = new_pos
                 parser.cache_hits += 1
-                if parser.debug:
-                    parser.dprint(
-                        f"** Cache hit for [{name}, {c_pos}] = '{result}' "
-                        f": new_pos={new_pos}"
-                    )
-                    parser.dprint(f"<<+ Matched rule {name} at position {new_pos}", -1)
 
                 # If NoMatch is recorded at this position raise.
                 if result is NOMATCH_MARKER:
@@ -321,9 +307,9 @@ class ParsingExpression:
 
         try:
             result = self._parse(parser)
-            if self.suppress or (
-                isinstance(result, list) and result and result[0] is None
-            ):
+            # Parse tree nodes are not checked as indexing would expand
+            # `LazyNonTerminal`.
+            if self.suppress or (type(result) is list and result and result[0] is None):
                 result = None
 
         except NoMatch:
@@ -337,18 +323,6 @@ class ParsingExpression:
             # Recover last parsing expression.
             parser.last_pexpression = last_pexpression
 
-            if parser.debug:
-                parser.dprint(
-                    "<<{} rule {}{} at position {} => {}".format(
-                        "- Not matched" if parser.position is c_pos else "+ Matched",
-                        name,
-                        f" in {parser.in_rule}" if parser.in_rule else "",
-                        parser.position,
-                        parser.context(),
-                    ),
-                    -1,
-                )
-
             # If leaving root rule restore previous root rule name.
             if self.rule_name:
                 parser.in_rule = previous_root_rule_name
@@ -359,7 +333,12 @@ class ParsingExpression:
                 result = flatten(result)
 
             # Tree reduction will eliminate Non-terminal with single child.
-            if parser.reduce_tree and len(result) == 1:
+            # Lazy nodes are not reduced as that would parse their children.
+            if (
+                parser.reduce_tree
+                and not isinstance(result, LazyNonTerminal)
+                and len(result) == 1
+            ):
                 result = result[0]
 
             # If the result is not parse tree node it must be a plain list
@@ -753,6 +732,104 @@ class Combine(Decorator):
             parser.in_lex_rule = oldin_lex_rule
 
 
+class Lazy(Decorator):
+    """
+    This decorator defines pexpression whose subtree is parsed on demand.
+    At parse time only the balanced extent of the block starting with the
+    open and ending with the close delimiter is scanned, skipping string
+    literals. The result is a `LazyNonTerminal` which parses the contained
+    rule from the start of the block on the first access to its children.
+
+    Delimiters are by default the first and the last string match of the
+    contained rule sequence (e.g. `"{"` and `"}"` for
+    `"{", ZeroOrMore(statement), "}"`).
+
+    Args:
+        open(str): Open delimiter if it can't be inferred from the rule.
+        close(str): Close delimiter if it can't be inferred from the rule.
+        quotes(str): Characters starting and ending string literals in which
+            delimiters are ignored. A backslash escapes the next character.
+            Default is single and double quote.
+    """
+
+    def __init__(self, *elements: Any, **kwargs: Any) -> None:
+        self.open: str | None = kwargs.pop("open", None)
+        self.close: str | None = kwargs.pop("close", None)
+        self.quotes: str = kwargs.pop("quotes", "\"'")
+        super().__init__(*elements, **kwargs)
+        self._scanner: tuple[Match, Match, Pattern[str]] | None = None
+
+    def _delimiter(self, delimiter: str | None, index: int) -> Match:
+        if delimiter is not None:
+            return StrMatch(delimiter)
+        expression = self.nodes[0]
+        while isinstance(expression, Sequence) and not isinstance(
+            expression, OrderedChoice
+        ):
+            expression = expression.nodes[index]
+        if not isinstance(expression, StrMatch):
+            raise GrammarError(
+                f"Can't infer {'open' if index == 0 else 'close'} delimiter of lazy "
+                f"rule '{self.nodes[0].name}'. Give it explicitly."
+            )
+        return expression
+
+    def _make_scanner(self) -> tuple[Match, Match, Pattern[str]]:
+        open_match = self._delimiter(self.open, 0)
+        close_match = self._delimiter(self.close, -1)
+
+        def delimiter_regex(delimiter: str) -> str:
+            regex = re.escape(delimiter)
+            if re.match(r"\w", delimiter[0]):
+                regex = rf"\b{regex}"
+            if re.match(r"\w", delimiter[-1]):
+                regex = rf"{regex}\b"
+            return regex
+
+        if open_match.to_match == close_match.to_match:
+            raise GrammarError(
+                f"Open and close delimiters of lazy rule '{self.nodes[0].name}' "
+                "must differ."
+            )
+        strings = [
+            rf"{re.escape(q)}(?:\\.|[^{re.escape(q)}\\])*{re.escape(q)}"
+            for q in self.quotes
+        ]
+        regex = "|".join(
+            [
+                f"(?P<close>{delimiter_regex(close_match.to_match)})",
+                f"(?P<open>{delimiter_regex(open_match.to_match)})",
+            ]
+            + strings
+        )
+        flags = re.IGNORECASE if getattr(open_match, "ignore_case", False) else 0
+        return open_match, close_match, re.compile(regex, flags | re.DOTALL)
+
+    def _parse(self, parser: Parser) -> LazyNonTerminal:
+        if self._scanner is None:
+            self._scanner = self._make_scanner()
+        open_match, close_match, scanner = self._scanner
+
+        open_match.parse(parser)
+        start = parser.position - len(open_match.to_match)
+
+        depth = 1
+        _input = parser.input
+        position = parser.position
+        while depth:
+            match = scanner.search(_input, position)
+            if match is None:
+                parser._nm_raise(close_match, len(_input), parser)
+            position = match.end()
+            if match.lastgroup == "close":
+                depth -= 1
+            elif match.lastgroup == "open":
+                depth += 1
+
+        parser.position = position
+        return LazyNonTerminal(self.nodes[0], start, position, parser)
+
+
 class Match(ParsingExpression):
     """
     Base class for all classes that will try to match something from the input.
@@ -808,16 +885,6 @@ class Match(ParsingExpression):
                 pos += 1
             parser.position = pos
 
-        if parser.debug:
-            parser.dprint(
-                "?? Try match rule {}{} at position {} => {}".format(
-                    self.name,
-                    f" in {parser.in_rule}" if parser.in_rule else "",
-                    parser.position,
-                    parser.context(),
-                )
-            )
-
         if parser.skipws and parser.position in parser.comment_positions:
             # Skip comments if already parsed.
             parser.position = parser.comment_positions[parser.position]
@@ -847,6 +914,9 @@ class RegExMatch(Match):
         str_repr(str): A string that is used to represent this regex.
         re_flags: flags parameter for re.compile if neither ignore_case
             or multiple are set.
+        keep_match(bool): If the re.Match object should be kept in the
+            terminal `extra_info` when the parser uses lazy terminals.
+            Default is False.
 
     """
 
@@ -859,6 +929,7 @@ class RegExMatch(Match):
         multiline: bool | None = None,
         str_repr: str | None = None,
         re_flags: int = re.MULTILINE,
+        keep_match: bool = False,
         **kwargs: Any,
     ) -> None:
         super().__init__(rule_name, root, **kwargs)
@@ -866,6 +937,7 @@ class RegExMatch(Match):
         self.ignore_case: bool | None = ignore_case
         self.multiline: bool | None = multiline
         self.explicit_flags: int = re_flags
+        self.keep_match: bool = keep_match
 
         self.to_match: str = str_repr if str_repr is not None else to_match
 
@@ -892,16 +964,18 @@ class RegExMatch(Match):
         m = self.regex.match(parser.input, c_pos)
         if m:
             matched = m.group()
-            if parser.debug:
-                parser.dprint(
-                    f"++ Match '{matched}' at {c_pos} => '{parser.context(len(matched))}'"
-                )
             parser.position += len(matched)
             if matched:
+                if parser.lazy_terminals:
+                    if self.keep_match:
+                        extra_info: Any = m
+                    else:
+                        extra_info = m.groups() if self.regex.groups else None
+                    return LazyTerminal(
+                        self, c_pos, parser.position, parser.input, extra_info=extra_info
+                    )
                 return Terminal(self, c_pos, matched, extra_info=m)
         else:
-            if parser.debug:
-                parser.dprint(f"-- NoMatch at {c_pos}")
             parser._nm_raise(self, c_pos, parser)
 
 
@@ -935,11 +1009,6 @@ class StrMatch(Match):
         else:
             match = input_frag == self.to_match
         if match:
-            if parser.debug:
-                parser.dprint(
-                    f"++ Match '{self.to_match}' at {c_pos} => "
-                    f"'{parser.context(len(self.to_match))}'"
-                )
             parser.position += len(self.to_match)
 
             # If this match is inside sequence than mark for suppression
@@ -947,11 +1016,6 @@ class StrMatch(Match):
 
             return Terminal(self, c_pos, self.to_match, suppress=suppress)
         else:
-            if parser.debug:
-                parser.dprint(
-                    f"-- No match '{self.to_match}' at {c_pos} => "
-                    f"'{parser.context(len(self.to_match))}'"
-                )
             parser._nm_raise(self, c_pos, parser)
 
     def __str__(self) -> str:
@@ -998,8 +1062,6 @@ class EndOfFile(Match):
         if len(parser.input) == c_pos:
             return Terminal(EOF(), c_pos, "", suppress=True)
         else:
-            if parser.debug:
-                parser.dprint("!! EOF not matched.")
             parser._nm_raise(self, c_pos, parser)
 
 
@@ -1032,8 +1094,15 @@ class ParseTreeNode:
         error (bool): Is this a false parse tree node created during error
             recovery.
         comments : A parse tree of comment(s) attached to this node.
+        line_index (LineIndex): Line index of the parsed input. Only the root
+            node of the parse tree has it.
+        rule_index (RuleIndex): Rule index of the parse tree. Only the root
+            node has it if the parser is configured with `rule_index`.
     """
 
+    line_index: LineIndex
+    rule_index: RuleIndex
+
     def __init__(self, rule: ParsingExpression, position: int, error: bool) -> None:
         assert rule
         assert rule.rule_name is not None
@@ -1056,35 +1125,13 @@ class ParseTreeNode:
         """
         Visitor pattern implementation.
 
+        The tree is traversed iteratively so the depth of the tree is not
+        limited by the Python recursion limit.
+
         Args:
             visitor(PTNodeVisitor): The visitor object.
         """
-        if visitor.debug:
-            visitor.dprint(f"Visiting {self.name}  type:{type(self).__name__} str:{self}")
-
-        children = SemanticActionResults()
-        if isinstance(self, NonTerminal):
-            for node in self:
-                child = node.visit(visitor)
-                # If visit returns None suppress that child node
-                if child is not None:
-                    children.append_result(node.rule_name, child)
-
-        visit_name = f"visit_{self.rule_name}"
-        if hasattr(visitor, visit_name):
-            # Call visit method.
-            result = getattr(visitor, visit_name)(self, children)
-
-            # If there is a method with 'second' prefix save
-            # the result of visit for post-processing
-            if hasattr(visitor, f"second_{self.rule_name}"):
-                visitor.for_second_pass.append((self.rule_name, result))
-
-            return result
-
-        elif visitor.defaults:
-            # If default actions are enabled
-            return visitor.visit__default__(self, children)
+        return _visit(self, visitor)
 
     def tree_str(self, indent: int = 0) -> str:
         return "{}{} [{}-{}]".format(
@@ -1162,6 +1209,50 @@ class Terminal(ParseTreeNode):
         return str(self) == str(other)
 
 
+class LazyTerminal(Terminal):
+    """
+    Terminal which keeps only its span in the input. The value is sliced from
+    the input on each access. Created by `RegExMatch` if parser is configured
+    with `lazy_terminals`.
+    """
+
+    __slots__ = ["_input", "_end"]
+
+    def __init__(
+        self,
+        rule: ParsingExpression,
+        position: int,
+        end: int,
+        _input: str,
+        error: bool = False,
+        suppress: bool = False,
+        extra_info: Any = None,
+    ) -> None:
+        ParseTreeNode.__init__(self, rule, position, error)
+        self._input: str = _input
+        self._end: int = end
+        self.suppress = suppress
+        self.extra_info = extra_info
+
+    @property
+    def value(self) -> str:  # type: ignore[override]
+        return self._input[self.position : self._end]
+
+    @property
+    def position_end(self) -> int:
+        return self._end
+
+    def __getstate__(self) -> Any:
+        # The inherited `value` slot is shadowed by the property so it must
+        # not be pickled.
+        slots = {
+            name: getattr(self, name)
+            for name in Terminal.__slots__ + LazyTerminal.__slots__
+            if name != "value" and hasattr(self, name)
+        }
+        return getattr(self, "__dict__", None) or None, slots
+
+
 class NonTerminal(ParseTreeNode, list):
     """
     Non-leaf node of the Parse Tree. Represents language syntax construction.
@@ -1186,6 +1277,8 @@ class NonTerminal(ParseTreeNode, list):
         "_expr_cache",
     ]
 
+    _expr_cache: dict[str, NonTerminal]
+
     def __init__(
         self,
         rule: ParsingExpression,
@@ -1200,7 +1293,6 @@ class NonTerminal(ParseTreeNode, list):
 
         self.extend(flatten([nodes]))
         self._filtered: bool = _filtered
-        self._expr_cache: dict[str, Any] = {}
 
     @property
     def value(self) -> str:
@@ -1239,6 +1331,10 @@ class NonTerminal(ParseTreeNode, list):
         """
         Find a child (non)terminal by the rule name.
 
+        On the first lookup the children are grouped by the rule name in one
+        pass into filtered NonTerminals which are cached for later lookups.
+        The cache keeps a reference to each named child of the node.
+
         Args:
             rule_name(str): The name of the rule that is referenced from
                 this node rule.
@@ -1256,39 +1352,150 @@ class NonTerminal(ParseTreeNode, list):
             raise AttributeError
 
         try:
-            # First check the cache
-            if rule_name in self._expr_cache:
-                return self._expr_cache[rule_name]  # type: ignore[no-any-return]
+            expr_cache = self._expr_cache
         except AttributeError:
             # Navigation expression cache. Used for lookup by rule name.
-            self._expr_cache = {}
-
-        # If result is not found in the cache collect all nodes
-        # with the given rule name and create new NonTerminal
-        # and cache it for later access.
-        nodes = []
-        rule = None
-        for n in self:
-            if self._filtered:
-                # For filtered NT rule_name is a rule on
-                # each of its children
-                for m in n:
-                    if m.rule_name == rule_name:
-                        nodes.append(m)
-                        rule = m.rule
-            else:
-                if n.rule_name == rule_name:
-                    nodes.append(n)
-                    rule = n.rule
+            expr_cache = self._expr_cache = self._group_by_rule_name()
 
-        if rule is None:
+        result = expr_cache.get(rule_name)
+        if result is None:
             # If rule is not found resort to default behavior
             return self.__getattribute__(rule_name)  # type: ignore[no-any-return]
-
-        result = NonTerminal(rule=rule, nodes=nodes, _filtered=True)
-        self._expr_cache[rule_name] = result
         return result
 
+    def _group_by_rule_name(self) -> dict[str, NonTerminal]:
+        """
+        Groups children by the rule name into filtered NonTerminals. For
+        filtered NT the children of its children are grouped.
+        """
+        groups: dict[str, NonTerminal] = {}
+        children = (
+            (m for n in self if isinstance(n, NonTerminal) for m in n)
+            if self._filtered
+            else self
+        )
+        for n in children:
+            rule_name = n.rule_name
+            if not rule_name:
+                continue
+            group = groups.get(rule_name)
+            if group is None:
+                group = groups[rule_name] = NonTerminal._new_filtered(n)
+            list.append(group, n)
+        return groups
+
+    @staticmethod
+    def _new_filtered(first: ParseTreeNode) -> NonTerminal:
+        """
+        Creates empty filtered NonTerminal for nodes of the rule of the given
+        first node bypassing `__init__`.
+        """
+        nt = NonTerminal.__new__(NonTerminal)
+        nt.rule = first.rule
+        nt.rule_name = first.rule_name
+        nt.position = first.position
+        nt.error = False
+        nt.comments = None
+        nt._filtered = True
+        return nt
+
+
+class LazyNonTerminal(NonTerminal):
+    """
+    Non-terminal created by the `Lazy` parsing expression. Keeps only its
+    span in the input until its children are accessed. The children are
+    then parsed by the parser which created the node using the node rule
+    started at the node position. Errors in the subtree are thus reported
+    (as `NoMatch`) on the first access.
+
+    Attributes:
+        expanded (bool, read-only): If the children are parsed.
+    """
+
+    __slots__ = ["_parser", "_input", "_file_name", "_end"]
+
+    def __init__(
+        self, rule: ParsingExpression, position: int, end: int, parser: Parser
+    ) -> None:
+        ParseTreeNode.__init__(self, rule, position, False)
+        self._filtered = False
+        self._parser: Parser | None = parser
+        self._input: str = parser.input
+        self._file_name: str | None = parser.file_name
+        self._end: int = end
+
+    @property
+    def expanded(self) -> bool:
+        return self._parser is None
+
+    @property
+    def position_end(self) -> int:
+        return self._end
+
+    def expand(self) -> None:
+        """
+        Parses the children if not already parsed. Raises `GrammarError` if
+        the parsed children don't end where the scanned block ends.
+        """
+        parser = self._parser
+        if parser is None:
+            return
+        result = parser._parse_nested(
+            self._input, self._file_name, self.rule, self.position, self._end
+        )
+        if isinstance(result, NonTerminal):
+            result = list.__iter__(result)
+        elif not isinstance(result, list):
+            result = [result]
+        list.extend(self, flatten(result))
+        self._parser = None
+
+    def __iter__(self) -> Iterator[ParseTreeNode]:
+        if self._parser is not None:
+            self.expand()
+        return list.__iter__(self)
+
+    def __reversed__(self) -> Iterator[ParseTreeNode]:
+        if self._parser is not None:
+            self.expand()
+        return list.__reversed__(self)
+
+    def __len__(self) -> int:
+        if self._parser is not None:
+            self.expand()
+        return list.__len__(self)
+
+    def __bool__(self) -> bool:
+        # Spans at least the delimiters. Doesn't expand.
+        return True
+
+    def __getitem__(self, index: Any) -> Any:
+        if self._parser is not None:
+            self.expand()
+        return list.__getitem__(self, index)
+
+    def __contains__(self, node: object) -> bool:
+        if self._parser is not None:
+            self.expand()
+        return list.__contains__(self, node)
+
+
+def expand_lazy(parse_tree: ParseTreeNode) -> ParseTreeNode:
+    """
+    Expands all `LazyNonTerminal` nodes of the tree, including the lazy
+    nodes found in the expanded subtrees. Useful to parse the lazy subtrees
+    in a batch, e.g. when the parser is idle.
+
+    Returns:
+        ParseTreeNode: The given tree.
+    """
+    stack = [parse_tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, NonTerminal):
+            stack.extend(node)
+    return parse_tree
+
 
 # ----------------------------------------------------
 # Semantic Actions
@@ -1296,8 +1503,15 @@ class NonTerminal(ParseTreeNode, list):
 class PTNodeVisitor(DebugPrinter):
     """
     Base class for all parse tree visitors.
+
+    Attributes:
+        independent_rules (set of str): Names of the rules whose subtrees
+            can be visited independently of the rest of the tree. Used in
+            parallel visits (see `visit_parse_tree`).
     """
 
+    independent_rules: Any = frozenset()
+
     def __init__(self, defaults: bool = True, **kwargs: Any) -> None:
         """
         Args:
@@ -1309,6 +1523,30 @@ class PTNodeVisitor(DebugPrinter):
 
         super().__init__(**kwargs)
 
+    def _dispatch(self, rule_name: str) -> tuple[Any, bool]:
+        """
+        Resolves the method to call for the nodes of the given rule and
+        whether the result should be kept for the second pass. The method is
+        None if there is no visit method and defaults are disabled.
+        """
+        method = getattr(self, f"visit_{rule_name}", None)
+        if method is not None:
+            return method, hasattr(self, f"second_{rule_name}")
+        if self.defaults:
+            return self.visit__default__, False
+        return None, False
+
+    def _batch_methods(self) -> dict[str, Any]:
+        """
+        Returns `visit_batch_<rule_name>` methods keyed by the rule name.
+        """
+        prefix = "visit_batch_"
+        return {
+            name[len(prefix) :]: getattr(self, name)
+            for name in dir(self)
+            if name.startswith(prefix)
+        }
+
     def visit__default__(
         self, node: ParseTreeNode, children: SemanticActionResults
     ) -> Any:
@@ -1357,14 +1595,266 @@ class PTNodeVisitor(DebugPrinter):
         return retval
 
 
-def visit_parse_tree(parse_tree: ParseTreeNode, visitor: PTNodeVisitor) -> Any:
+def _visit(
+    root: ParseTreeNode,
+    visitor: PTNodeVisitor,
+    done: Any = None,
+    batched: dict[str, tuple[Iterator[Any], bool]] | None = None,
+    enter: Callable[[ParseTreeNode], None] | None = None,
+    leave: Callable[[ParseTreeNode, Any], None] | None = None,
+    for_second_pass: list[tuple[str, Any]] | None = None,
+) -> Any:
+    """
+    Runs the first pass of the visitor over the tree. See `_visit_post_order`
+    for `done`, `batched`, `enter` and `leave`. Second pass entries are added
+    to `for_second_pass`, by default to the visitor `for_second_pass`.
+    """
+    if for_second_pass is None:
+        for_second_pass = visitor.for_second_pass
+
+    if batched and root.rule_name in batched:
+        results, second = batched[root.rule_name]
+        result = next(results)
+        if second:
+            for_second_pass.append((root.rule_name, result))
+        return result
+
+    if visitor.debug:
+        walk_enter = enter
+
+        def debug_enter(node: ParseTreeNode) -> None:
+            visitor.dprint(f"Visiting {node.name}  type:{type(node).__name__} str:{node}")
+            if walk_enter is not None:
+                walk_enter(node)
+
+        enter = debug_enter
+
+    # Dispatch table filled lazily for each rule name met in this run:
+    # rule name -> (visit method or None, is there a second pass method).
+    dispatch: dict[str, tuple[Any, bool]] = {}
+
+    def action(node: ParseTreeNode, children: SemanticActionResults) -> Any:
+        rule_name = node.rule_name
+        entry = dispatch.get(rule_name)
+        if entry is None:
+            entry = dispatch[rule_name] = visitor._dispatch(rule_name)
+        method, second = entry
+        if method is None:
+            return None
+        result = method(node, children)
+
+        # If there is a method with 'second' prefix save
+        # the result of visit for post-processing
+        if second:
+            for_second_pass.append((rule_name, result))
+
+        return result
+
+    return _visit_post_order(root, action, enter, done, for_second_pass, batched, leave)
+
+
+def _visit_post_order(
+    root: ParseTreeNode,
+    action: Callable[[ParseTreeNode, SemanticActionResults], Any],
+    enter: Callable[[ParseTreeNode], None] | None = None,
+    done: Any = None,
+    for_second_pass: list[tuple[str, Any]] | None = None,
+    batched: dict[str, tuple[Iterator[Any], bool]] | None = None,
+    leave: Callable[[ParseTreeNode, Any], None] | None = None,
+) -> Any:
+    """
+    Walks the tree in post-order using an explicit stack and returns the
+    result of the action for the root node.
+
+    Args:
+        root(ParseTreeNode): The root of the tree to walk.
+        action(callable): Called with the node and the results of its
+            children. Children resulting in None are suppressed.
+        enter(callable): If given, called with the node before its children
+            are walked.
+        done(dict): Results of already visited subtrees keyed by the id of
+            the subtree root. Each value is a tuple of the result and the
+            second pass entries of the subtree which are added to
+            `for_second_pass` when the subtree is reached. Subtrees in
+            `done` are not walked. Only the `get` method is used, so any
+            object looking up the results on demand can be given.
+        for_second_pass(list): Second pass entries of the walk.
+        batched(dict): Iterators of precomputed results of the nodes of the
+            given rule names in the order the nodes are reached, and a flag
+            whether a second pass entry should be added for each result.
+            Subtrees of such nodes are not walked.
+        leave(callable): If given, called with each walked non-terminal and
+            its result after the action.
+    """
+    if for_second_pass is None:
+        for_second_pass = []
+    if enter is not None:
+        enter(root)
+    if not isinstance(root, NonTerminal):
+        return action(root, SemanticActionResults())
+
+    stack: list[tuple[ParseTreeNode, SemanticActionResults, Any]] = [
+        (root, SemanticActionResults(), iter(root))
+    ]
+    while True:
+        node, children, child_nodes = stack[-1]
+        # The iterator of children is resumed after the descent into a
+        # non-terminal child is finished.
+        for child in child_nodes:
+            if done is not None:
+                visited = done.get(id(child))
+                if visited is not None:
+                    result, entries = visited
+                    if entries:
+                        for_second_pass.extend(entries)
+                    if result is not None:
+                        children.append_result(child.rule_name, result)
+                    continue
+            if batched is not None:
+                rule_batch = batched.get(child.rule_name)
+                if rule_batch is not None:
+                    result = next(rule_batch[0])
+                    if rule_batch[1]:
+                        for_second_pass.append((child.rule_name, result))
+                    if result is not None:
+                        children.append_result(child.rule_name, result)
+                    continue
+            if enter is not None:
+                enter(child)
+            if isinstance(child, NonTerminal):
+                stack.append((child, SemanticActionResults(), iter(child)))
+                break
+            result = action(child, SemanticActionResults())
+            # If action returns None suppress that child node
+            if result is not None:
+                children.append_result(child.rule_name, result)
+        else:
+            stack.pop()
+            result = action(node, children)
+            if leave is not None:
+                leave(node, result)
+            if not stack:
+                return result
+            if result is not None:
+                stack[-1][1].append_result(node.rule_name, result)
+
+
+def _outermost_nodes(
+    roots: list[ParseTreeNode], rule_names: Any, skip_rules: Any = ()
+) -> list[ParseTreeNode]:
+    """
+    Returns the outermost nodes of the given rules in the given trees in
+    document order. Subtrees of the rules in `skip_rules` are not searched.
+    """
+    nodes = []
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        rule_name = node.rule_name
+        if rule_name in skip_rules:
+            continue
+        if rule_name in rule_names:
+            nodes.append(node)
+        elif isinstance(node, NonTerminal):
+            stack.extend(reversed(node))
+    return nodes
+
+
+def _visit_batches(
+    visitor: PTNodeVisitor, roots: list[ParseTreeNode], skip_rules: Any = ()
+) -> dict[str, tuple[Iterator[Any], bool]] | None:
+    """
+    Calls `visit_batch_<rule_name>` methods of the visitor for all the
+    outermost nodes of their rules in the given trees. Returns iterators of
+    the results keyed by the rule name together with the flag whether there
+    is a second pass method for the rule (see `_visit_post_order`).
+
+    The nodes are reached by the visit in the same, document, order so the
+    results are not mapped to the nodes.
+    """
+    batch_methods = visitor._batch_methods()
+    if not batch_methods:
+        return None
+
+    by_rule: dict[str, list[ParseTreeNode]] = {name: [] for name in batch_methods}
+    for node in _outermost_nodes(roots, batch_methods, skip_rules):
+        by_rule[node.rule_name].append(node)
+
+    batched = {}
+    for rule_name, nodes in by_rule.items():
+        if not nodes:
+            continue
+        if visitor.debug:
+            visitor.dprint(f"Visiting batch of {len(nodes)} {rule_name} nodes")
+        results = batch_methods[rule_name](NodeBatch(rule_name, nodes))
+        if len(results) != len(nodes):
+            raise SemanticError(
+                f"visit_batch_{rule_name} returned {len(results)} results "
+                f"for {len(nodes)} nodes."
+            )
+        batched[rule_name] = (iter(results), hasattr(visitor, f"second_{rule_name}"))
+    return batched
+
+
+def _visit_subtrees(
+    visitor: PTNodeVisitor, subtrees: list[ParseTreeNode]
+) -> list[tuple[Any, list[tuple[str, Any]]]]:
+    """
+    Runs the first pass of a copy of the visitor over each subtree. Returns
+    the result and the second pass entries for each subtree. Used by pool
+    workers in parallel visits.
+    """
+    visitor = copy.copy(visitor)
+    visitor.for_second_pass = []
+    batched = _visit_batches(visitor, subtrees)
+    results = []
+    for subtree in subtrees:
+        result = _visit(subtree, visitor, batched=batched)
+        results.append((result, visitor.for_second_pass))
+        visitor.for_second_pass = []
+    return results
+
+
+def visit_parse_tree(
+    parse_tree: ParseTreeNode,
+    visitor: PTNodeVisitor,
+    parallel: int = 0,
+    executor: Any = "process",
+    cache: Any = None,
+) -> Any:
     """
     Applies visitor to parse_tree and runs the second pass
     afterwards.
 
+    Nodes of the rules for which the visitor has `visit_batch_<rule_name>`
+    method are visited before the rest of the tree. The method is called
+    once with the `NodeBatch` of all the nodes of its rule and returns the
+    sequence of results for the nodes which are then used as results of
+    the nodes in the visit. Subtrees of such nodes are not visited.
+
+    If `parallel` is given, the subtrees created by the rules listed in the
+    visitor `independent_rules` are visited first in a pool of workers.
+    Their results and second pass calls are then merged in the document
+    order, so the result is the same as for the sequential visit provided
+    that visiting independent subtrees doesn't depend on, or change, the
+    state of the visitor. Each worker uses a shallow copy of the visitor.
+    With a process pool the results must be picklable and are copies. If
+    the default start method of processes is not "fork", or if an executor
+    instance is given, the subtrees and the visitor are pickled as well
+    (parse with `lazy_terminals=True` as `re.Match` objects kept in
+    terminals can't be pickled).
+
     Args:
         parse_tree(ParseTreeNode):
         visitor(PTNodeVisitor):
+        parallel(int): The number of workers for visiting independent
+            subtrees. Default is 0, i.e. sequential visit.
+        executor(str or concurrent.futures.Executor): "process" or "thread"
+            pool or an executor instance to use. Default is "process".
+        cache(arpeggio.cache.VisitCache): If given, first pass results of the
+            unchanged subtrees are taken from the cache (see `VisitCache`
+            for the contract visitors must follow). Can't be used with
+            parallel or batch visits.
     """
     if not parse_tree:
         raise Exception("Parse tree is empty. You did call parse(), didn't you?")
@@ -1372,8 +1862,12 @@ def visit_parse_tree(parse_tree: ParseTreeNode, visitor: PTNodeVisitor) -> Any:
     if visitor.debug:
         visitor.dprint("ASG: First pass")
 
-    # Visit tree.
-    result = parse_tree.visit(visitor)
+    if cache is not None:
+        if parallel or visitor._batch_methods():
+            raise ValueError("Cached visit can't be parallel or use batch methods.")
+        result = cache.visit(parse_tree, visitor)
+    else:
+        result = _visit_uncached(parse_tree, visitor, parallel, executor)
 
     # Second pass
     if visitor.debug:
@@ -1384,6 +1878,109 @@ def visit_parse_tree(parse_tree: ParseTreeNode, visitor: PTNodeVisitor) -> Any:
     return result
 
 
+def _visit_uncached(
+    parse_tree: ParseTreeNode, visitor: PTNodeVisitor, parallel: int, executor: Any
+) -> Any:
+    subtrees = None
+    if parallel and visitor.independent_rules:
+        subtrees = _outermost_nodes([parse_tree], visitor.independent_rules)
+        if subtrees and subtrees[0] is parse_tree:
+            subtrees = None
+
+    # Nodes of the rules with batch visit methods in independent subtrees
+    # are batched by the workers.
+    batched = _visit_batches(
+        visitor, [parse_tree], visitor.independent_rules if subtrees else ()
+    )
+    done = _visit_in_pool(visitor, subtrees, parallel, executor) if subtrees else None
+
+    # Visit tree.
+    return _visit(parse_tree, visitor, done, batched)
+
+
+# Visitor and chunks of subtrees of the visit a forked process pool worker
+# was started for. Set in the worker by the pool initializer.
+_worker_visit: tuple[PTNodeVisitor, list[list[ParseTreeNode]]] | None = None
+
+
+def _init_forked_worker(
+    visitor: PTNodeVisitor, chunks: list[list[ParseTreeNode]]
+) -> None:
+    global _worker_visit
+    _worker_visit = (visitor, chunks)
+
+
+def _visit_forked_chunk(index: int) -> list[tuple[Any, list[tuple[str, Any]]]]:
+    visitor, chunks = _worker_visit  # type: ignore[misc]
+    return _visit_subtrees(visitor, chunks[index])
+
+
+def _visit_in_pool(
+    visitor: PTNodeVisitor, subtrees: list[ParseTreeNode], parallel: int, executor: Any
+) -> dict[int, tuple[Any, list[tuple[str, Any]]]]:
+    """
+    Visits subtrees in a pool of workers. Returns results and second pass
+    entries keyed by the id of the subtree root.
+
+    Process pools created here use the default start method. If it is
+    "fork" the workers get the visitor and the subtrees through the pool
+    initializer, so they are inherited and only the results are pickled.
+    Otherwise the subtrees are pickled to the workers as well.
+    """
+    import multiprocessing
+    from concurrent.futures import (
+        Executor,
+        ProcessPoolExecutor,
+        ThreadPoolExecutor,
+    )
+
+    # Split subtrees in contiguous chunks, a few per worker, to amortize the
+    # cost of task submission.
+    chunk_size = -(-len(subtrees) // (parallel * 4))
+    chunks = [subtrees[i : i + chunk_size] for i in range(0, len(subtrees), chunk_size)]
+
+    forked = False
+    if isinstance(executor, Executor):
+        pool = executor
+    elif executor == "process":
+        mp_context = multiprocessing.get_context()
+        forked = mp_context.get_start_method() == "fork"
+        if forked:
+            pool = ProcessPoolExecutor(
+                max_workers=parallel,
+                mp_context=mp_context,
+                initializer=_init_forked_worker,
+                initargs=(visitor, chunks),
+            )
+        else:
+            pool = ProcessPoolExecutor(max_workers=parallel, mp_context=mp_context)
+    elif executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=parallel)
+    else:
+        raise ValueError(f'Executor must be "process" or "thread", got {executor!r}.')
+
+    if not forked and visitor.file is sys.stdout:
+        # Standard output can't be pickled for process workers. Debug
+        # messages printed to None file go to the standard output of the
+        # worker.
+        visitor = copy.copy(visitor)
+        visitor.file = None
+
+    try:
+        if forked:
+            futures = [pool.submit(_visit_forked_chunk, i) for i in range(len(chunks))]
+        else:
+            futures = [pool.submit(_visit_subtrees, visitor, chunk) for chunk in chunks]
+        done = {}
+        for chunk, future in zip(chunks, futures):  # noqa: B905
+            for subtree, visited in zip(chunk, future.result()):  # noqa: B905
+                done[id(subtree)] = visited
+    finally:
+        if pool is not executor:
+            pool.shutdown()
+    return done
+
+
 class SemanticAction:
     """
     Semantic actions are executed during semantic analysis. They are in charge
@@ -1448,26 +2045,100 @@ class SemanticActionResults(list):
     Enables dot access by the name of the rule similar to NonTerminal
     tree navigation.
     Enables index access as well as iteration.
+
+    Only the rule names of the results are stored along the results. The
+    mapping of rule names to results (`results`) is built on the first dot
+    access from the results appended with `append_result`.
     """
 
+    __slots__ = ["_names", "_results"]
+
     def __init__(self) -> None:
         super().__init__()
-        self.results: dict[str, list[Any]] = {}
+        self._names: list[str] | None = None
+        self._results: dict[str, list[Any]] | None = None
 
     def append_result(self, name: str, result: Any) -> None:
-        if name:
-            if name not in self.results:
-                self.results[name] = []
-            self.results[name].append(result)
+        names = self._names
+        if names is None:
+            names = self._names = []
+        names.append(name)
+        if name and self._results is not None:
+            self._results.setdefault(name, []).append(result)
 
         self.append(result)
 
+    @property
+    def results(self) -> dict[str, list[Any]]:
+        results = self._results
+        if results is None:
+            results = self._results = {}
+            if self._names:
+                for name, result in zip(self._names, self):  # noqa: B905
+                    if name:
+                        results.setdefault(name, []).append(result)
+        return results
+
     def __getattr__(self, attr_name: str) -> list[Any]:
-        if attr_name == "results":
-            raise AttributeError
+        # Unset slots and special methods looked up e.g. by pickle are not
+        # rule names.
+        if attr_name in ("_names", "_results", "results") or attr_name.startswith("__"):
+            raise AttributeError(attr_name)
 
         return self.results.get(attr_name, [])
 
+    def __getstate__(self) -> Any:
+        return self._names, self._results
+
+    def __setstate__(self, state: Any) -> None:
+        self._names, self._results = state
+
+
+class NodeBatch:
+    """
+    All nodes of one rule given at once to `visit_batch_<rule_name>` visitor
+    method. Positions are given as arrays so that conversions can be done in
+    bulk (e.g. `numpy.array(batch.values, dtype=float)`).
+
+    Attributes:
+        rule_name (str): The name of the rule of the nodes.
+        nodes (list of ParseTreeNode): The nodes in document order.
+        positions (array): Start positions of the nodes.
+    """
+
+    def __init__(self, rule_name: str, nodes: list[ParseTreeNode]) -> None:
+        self.rule_name: str = rule_name
+        self.nodes: list[ParseTreeNode] = nodes
+        self.positions: array[int] = array("q", [node.position for node in nodes])
+        self._values: list[str] | None = None
+        self._ends: array[int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def values(self) -> list[str]:
+        """
+        Values of terminals or flat strings of non-terminals.
+        """
+        if self._values is None:
+            self._values = [
+                node.value
+                if isinstance(node, Terminal)
+                else cast(NonTerminal, node).flat_str()
+                for node in self.nodes
+            ]
+        return self._values
+
+    @property
+    def ends(self) -> array[int]:
+        """
+        End positions of the nodes.
+        """
+        if self._ends is None:
+            self._ends = array("q", [node.position_end for node in self.nodes])
+        return self._ends
+
 
 # Common semantic actions
 class SemanticActionSingleChild(SemanticAction):
@@ -1588,6 +2259,102 @@ def validate_parser_model(node, visited=None):
         validate_parser_model(child, visited)
 
 
+# ----------------------------------------------------
+# Line index
+
+
+class LineIndex:
+    """
+    Index of line starts used to convert input positions to (line, column)
+    tuples. A line is terminated by "\n", "\r\n" or "\r".
+
+    The index is built in one pass over the input on the first conversion.
+    It does not reference the parser so it stays usable after the parser is
+    gone (each parse tree root gets the index of its input as `line_index`).
+
+    Attributes:
+        input (str): The indexed input string.
+    """
+
+    _newline_re: Pattern[str] = re.compile(r"\r\n?|\n")
+
+    def __init__(self, _input: str) -> None:
+        self.input: str = _input
+        self._line_starts: array[int] | None = None
+        self._line_ends: list[int] | None = None
+        self._np_line_starts: Any = None
+
+    @property
+    def line_starts(self) -> array[int]:
+        """
+        Positions where lines start. The first line starts at position 0.
+        """
+        if self._line_starts is None:
+            line_starts = array("q", [0])
+            line_starts.extend(m.end() for m in self._newline_re.finditer(self.input))
+            self._line_starts = line_starts
+        return self._line_starts
+
+    @property
+    def line_ends(self) -> list[int]:
+        """
+        Positions of the "\\n" characters, i.e. the ends of the lines not
+        terminated by a single "\\r".
+        """
+        if self._line_ends is None:
+            _input = self.input
+            self._line_ends = [
+                start - 1 for start in self.line_starts[1:] if _input[start - 1] == "\n"
+            ]
+        return self._line_ends
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_starts)
+
+    def linecol(self, pos: int) -> tuple[int, int]:
+        """
+        Calculate (line, column) tuple for the given position. Both line and
+        column are 1-based.
+        """
+        line_starts = self.line_starts
+        line = bisect.bisect_right(line_starts, pos)
+        return line, pos - line_starts[line - 1] + 1
+
+    def linecols(self, positions: Any) -> tuple[Any, Any]:
+        """
+        Calculate lines and columns for all the given positions at once.
+
+        Args:
+            positions: An iterable of positions. If it is a NumPy array the
+                conversion is vectorized and NumPy arrays are returned.
+
+        Returns:
+            A tuple (lines, columns) of sequences aligned with positions.
+        """
+        line_starts = self.line_starts
+        # NumPy is imported only when given its array so it is not loaded
+        # with arpeggio.
+        if type(positions).__module__ == "numpy":
+            import numpy  # type: ignore[import-not-found]
+
+            if self._np_line_starts is None:
+                self._np_line_starts = numpy.frombuffer(line_starts, dtype=numpy.int64)
+            np_line_starts = self._np_line_starts
+            lines = numpy.searchsorted(np_line_starts, positions, side="right")
+            return lines, positions - np_line_starts[lines - 1] + 1
+
+        # Positions are iterated twice.
+        positions = list(positions)
+        bisect_right = bisect.bisect_right
+        lines = [bisect_right(line_starts, pos) for pos in positions]
+        cols = [
+            pos - line_starts[line - 1] + 1
+            for pos, line in zip(positions, lines)  # noqa: B905
+        ]
+        return lines, cols
+
+
 # ----------------------------------------------------
 # Parsers
 
@@ -1621,6 +2388,29 @@ class Parser(DebugPrinter):
     comments_model: Any = None
     root_rule_name: str = ""
 
+    # Attributes holding the state of the parse in progress. They are saved
+    # and restored around nested `parse` calls to make the parser reentrant.
+    _parse_state_attrs: tuple[str, ...] = (
+        "position",
+        "nm",
+        "_line_index",
+        "input",
+        "file_name",
+        "comment_positions",
+        "cache_hits",
+        "cache_misses",
+        "parse_tree",
+        "in_rule",
+        "in_parse_comments",
+        "in_lex_rule",
+        "in_not",
+        "last_pexpression",
+        "skipws",
+        "_ws",
+        "_real_ws",
+        "_eolterm",
+    )
+
     def __init__(
         self,
         skipws: bool = True,
@@ -1629,6 +2419,10 @@ class Parser(DebugPrinter):
         autokwd: bool = False,
         ignore_case: bool = False,
         memoization: bool = False,
+        compact_tree: bool = False,
+        lazy_terminals: bool = False,
+        rule_index: bool = False,
+        tracer: Any = None,
         **kwargs: Any,
     ) -> None:
         """
@@ -1643,6 +2437,26 @@ class Parser(DebugPrinter):
             ignore_case(bool): If case is ignored (default=False)
             memoization(bool): If memoization should be used
                 (a.k.a. packrat parsing)
+            compact_tree(bool): If the parse tree should be converted to
+                the array-backed `arpeggio.compact.CompactTree` after parsing.
+                The conversion lowers the memory retained by the tree but not
+                the peak memory of the parse.
+                The result of `parse` is then a view of its root node.
+                Default is False.
+            lazy_terminals(bool): If regex matches should produce
+                `LazyTerminal` nodes which slice their value from the input
+                on access and keep in `extra_info` only captured groups
+                instead of the re.Match object (see `RegExMatch.keep_match`).
+                Default is False.
+            rule_index(bool): If `arpeggio.index.RuleIndex` of the parse tree
+                should be built after parsing. It is available as
+                `rule_index` attribute of the parse tree root.
+                Default is False.
+            tracer(arpeggio.trace.Tracer): If given, the parser switches to
+                the instrumented engine which reports parsing events to the
+                tracer. Can be changed later by setting `tracer` attribute.
+                Debug mode uses `arpeggio.trace.DebugTracer` if no tracer is
+                set. Default is None.
         """
 
         super().__init__(**kwargs)
@@ -1661,12 +2475,25 @@ class Parser(DebugPrinter):
         self.autokwd: bool = autokwd
         self.ignore_case: bool = ignore_case
         self.memoization: bool = memoization
+        self.compact_tree: bool = compact_tree
+        self.lazy_terminals: bool = lazy_terminals
+        self.rule_index: bool = rule_index
+        # The tracer the parser model is instrumented for.
+        self._engine_tracer: Any = None
+        self._debug_tracer: Any = None
+        # Traced parse methods of the model nodes keyed by the node method
+        # and the instrumented node methods (see `arpeggio.trace`).
+        self._traced: dict[int, Callable[[Parser], Any]] | None = None
+        self._traced_nodes: list[tuple[ParsingExpression, str]] | None = None
+        self.tracer = tracer
         self.comments_model: Any = None
         self.comments: list[Any] = []
         self.comment_positions: dict[int, int] = {}
         self.sem_actions: dict[str, Any] = {}
 
         self.parse_tree: Any = None
+        # Stats of the last parse done with `stats=True`.
+        self.parse_stats: Any = None
 
         # Create regex used for autokwd matching
         flags: int = 0
@@ -1690,6 +2517,20 @@ class Parser(DebugPrinter):
         # Last parsing expression traversed
         self.last_pexpression: Any = None
 
+        # Is there a parse in progress? Used to support reentrant parsing.
+        self._parsing: bool = False
+
+    @property
+    def tracer(self) -> Any:
+        return self._tracer
+
+    @tracer.setter
+    def tracer(self, new_value: Any) -> None:
+        self._tracer: Any = new_value
+        # The parser model is instrumented on the first parse if not built.
+        if self.parser_model is not None and not self._parsing:
+            self._select_engine()
+
     @property
     def ws(self) -> str:
         return self._ws
@@ -1716,24 +2557,119 @@ class Parser(DebugPrinter):
         else:
             self._ws = self._real_ws
 
-    def parse(self, _input: str, file_name: str | None = None) -> Any:
+    def parse(
+        self, _input: str, file_name: str | None = None, stats: bool = False
+    ) -> Any:
         """
         Parses input and produces parse tree.
 
+        The parser is reentrant, i.e. `parse` may be called while another
+        parse with the same parser is in progress (e.g. from a custom parsing
+        expression handling an embedded language). The state of the
+        interrupted parse is restored when the nested call finishes.
+
         Args:
             _input(str): An input string to parse.
             file_name(str): If input is loaded from file this can be
                 set to file name. It is used in error messages.
+            stats(bool): If true, `arpeggio.stats.ParseStats` are collected
+                and a tuple of the parse tree and the stats is returned. The
+                stats are also kept in `parse_stats` attribute.
+        """
+        if stats:
+            from arpeggio.stats import _parse_with_stats
+
+            return _parse_with_stats(self, _input, file_name)
+
+        return self._parse_reentrant(_input, file_name)
+
+    def _parse_reentrant(
+        self,
+        _input: str,
+        file_name: str | None,
+        expression: ParsingExpression | None = None,
+    ) -> Any:
+        """
+        Parses input from the root rule or, if given, only the expression.
+        If another parse is in progress the input is parsed as a nested parse.
+        """
+        if not self._parsing:
+            self._parsing = True
+            try:
+                return self._parse_input(_input, file_name, expression)
+            finally:
+                self._parsing = False
+
+        return self._parse_nested(_input, file_name, expression)
+
+    def _parse_nested(
+        self,
+        _input: str,
+        file_name: str | None,
+        expression: ParsingExpression | None = None,
+        position: int = 0,
+        end: int | None = None,
+    ) -> Any:
+        """
+        Parses saving the state of the parser and restoring it afterwards.
+        Used for nested parses and for expanding `LazyNonTerminal` nodes
+        which may happen during or after other parses. If `end` is given the
+        expression must end at that position.
         """
-        self.position: int = 0  # Input position
+        state = {attr: getattr(self, attr) for attr in self._parse_state_attrs}
+        parsing = self._parsing
+        self._parsing = True
+        if self.memoization:
+            # Memoization caches are keyed by input position only so the
+            # results of the interrupted parse must not be used.
+            self._clear_caches()
+        try:
+            result = self._parse_input(_input, file_name, expression, position)
+            if end is not None and self.position != end:
+                raise GrammarError(
+                    f"Lazy rule '{expression.rule_name if expression else ''}' "
+                    f"at position {self.pos_to_linecol(position)} is parsed up to "
+                    f"{self.pos_to_linecol(self.position)} but its scanned block "
+                    f"ends at {self.pos_to_linecol(end)}. The scanner doesn't "
+                    "know about comments, e.g. a quote in a comment is scanned "
+                    "as a string start.",
+                    expression,
+                )
+            return result
+        except NoMatch as e:
+            # Detach the error from the parser state which is about to be
+            # restored so that the error message refers to the nested input.
+            e.parser = copy.copy(self)
+            raise
+        finally:
+            for attr, value in state.items():
+                setattr(self, attr, value)
+            self._parsing = parsing
+
+    def _parse_input(
+        self,
+        _input: str,
+        file_name: str | None,
+        expression: ParsingExpression | None = None,
+        position: int = 0,
+    ) -> Any:
+        """
+        Parses input from the root rule or, if given, only the expression
+        starting at the given position. The result of the expression is
+        returned as is.
+        """
+        self.position: int = position  # Input position
         self.nm: NoMatch | None = None  # Last NoMatch exception
-        self.line_ends: list[int] = []
+        self._line_index: LineIndex | None = None
         self.input: str = _input
         self.file_name: str | None = file_name
         self.comment_positions = {}
         self.cache_hits: int = 0
         self.cache_misses: int = 0
+        self._select_engine()
         try:
+            if expression is not None:
+                return expression.parse(self)
             self.parse_tree = self._parse()
         except NoMatch as e:
             # Remove Not marker
@@ -1752,6 +2688,22 @@ class Parser(DebugPrinter):
             # through traceback stack frames
             self.nm = None
 
+        if self.compact_tree and isinstance(self.parse_tree, ParseTreeNode):
+            from arpeggio.compact import CompactTree
+
+            self.parse_tree = CompactTree.from_parse_tree(
+                self.parse_tree, self.input
+            ).root
+
+        if isinstance(self.parse_tree, ParseTreeNode):
+            # Make position conversion available without the parser.
+            self.parse_tree.line_index = self.line_index
+
+            if self.rule_index:
+                from arpeggio.index import RuleIndex
+
+                self.parse_tree.rule_index = RuleIndex(self.parse_tree)
+
         # In debug mode export parse tree to dot file for
         # visualization
         if self.debug and self.parse_tree:
@@ -1767,16 +2719,44 @@ class Parser(DebugPrinter):
         """Override in subclasses."""
         raise NotImplementedError
 
-    def parse_file(self, file_name: str) -> Any:
+    def _active_tracer(self) -> Any:
+        """
+        Returns the tracer set on the parser or, in debug mode, the debug
+        tracer.
+        """
+        if self.tracer is None and self.debug:
+            if self._debug_tracer is None:
+                from arpeggio.trace import DebugTracer
+
+                self._debug_tracer = DebugTracer()
+            return self._debug_tracer
+        return self.tracer
+
+    def _select_engine(self) -> None:
+        """
+        Instruments the parser model for the current tracer or removes the
+        instrumentation if there is none. The default engine has no tracing
+        code at all so the tracer is checked only once per parse.
+        """
+        tracer = self._active_tracer()
+        if tracer is not self._engine_tracer:
+            from arpeggio.trace import _instrument_model
+
+            _instrument_model(self, tracer)
+            self._engine_tracer = tracer
+
+    def parse_file(self, file_name: str, stats: bool = False) -> Any:
         """
         Parses content from the given file.
         Args:
             file_name(str): A file name.
+            stats(bool): If `arpeggio.stats.ParseStats` should be collected
+                (see `parse`).
         """
         with codecs.open(file_name, "r", "utf-8") as f:
             content = f.read()
 
-        return self.parse(content, file_name=file_name)
+        return self.parse(content, file_name=file_name, stats=stats)
 
     def getASG(
         self, sem_actions: dict[str, Any] | None = None, defaults: bool = True
@@ -1805,73 +2785,85 @@ class Parser(DebugPrinter):
 
         for_second_pass: list[tuple[str, Any]] = []
 
-        def tree_walk(node: ParseTreeNode) -> Any:
-            """
-            Walking the parse tree and calling first_pass for every registered
-            semantic actions and creating list of object that needs to be
-            called in the second pass.
-            """
+        def enter(node: ParseTreeNode) -> None:
+            self.dprint(
+                f"Walking down {node.name}   type: {type(node).__name__}  str: {node}"
+            )
 
-            if self.debug:
-                self.dprint(
-                    f"Walking down {node.name}   type: {type(node).__name__}  str: {node}"
-                )
+        def keep_node(parser: Parser, node: ParseTreeNode, children: Any) -> Any:
+            return node
 
-            children = SemanticActionResults()
-            if isinstance(node, NonTerminal):
-                for n in node:
-                    child = tree_walk(n)
-                    if child is not None:
-                        children.append_result(n.rule_name, child)
-
-            if self.debug:
-                self.dprint(
-                    f"Processing {node.name} = '{node}'  "
-                    f"type:{type(node).__name__} "
-                    f"len:{len(node) if isinstance(node, list) else 0}"
-                )
-                for i, a in enumerate(children):
-                    self.dprint(f"  {i + 1}:{a} type:{type(a).__name__}")
+        # If no rule is present use some sane defaults
+        default_action = SemanticAction().first_pass if defaults else keep_node
 
-            if node.rule_name in sem_actions:
-                sem_action = sem_actions[node.rule_name]
-                if isinstance(sem_action, types.FunctionType):
-                    retval = sem_action(self, node, children)
-                else:
-                    retval = sem_action.first_pass(self, node, children)
+        # Dispatch table filled lazily for each rule name met in this run:
+        # rule name -> (first pass callable, is there a second pass).
+        dispatch: dict[str, tuple[Any, bool]] = {}
 
-                if hasattr(sem_action, "second_pass"):
-                    for_second_pass.append((node.rule_name, retval))
+        def resolve(rule_name: str) -> tuple[Any, bool]:
+            sem_action = sem_actions.get(rule_name)
+            if sem_action is None:
+                return default_action, False
+            second = hasattr(sem_action, "second_pass")
+            if isinstance(sem_action, types.FunctionType):
+                return sem_action, second
+            return sem_action.first_pass, second
 
-                if self.debug:
-                    action_name = (
-                        sem_action.__name__
-                        if hasattr(sem_action, "__name__")
-                        else sem_action.__class__.__name__
-                    )
-                    self.dprint(f"  Applying semantic action {action_name}")
+        def action(node: ParseTreeNode, children: SemanticActionResults) -> Any:
+            """
+            Calls first_pass for registered semantic actions and creates the
+            list of objects that need to be called in the second pass.
+            """
+            rule_name = node.rule_name
+            entry = dispatch.get(rule_name)
+            if entry is None:
+                entry = dispatch[rule_name] = resolve(rule_name)
+            first_pass, second = entry
+            retval = first_pass(self, node, children)
+            if second:
+                for_second_pass.append((rule_name, retval))
+            return retval
 
+        def debug_action(node: ParseTreeNode, children: SemanticActionResults) -> Any:
+            """
+            The same as `action` with debug output.
+            """
+            self.dprint(
+                f"Processing {node.name} = '{node}'  "
+                f"type:{type(node).__name__} "
+                f"len:{len(node) if isinstance(node, list) else 0}"
+            )
+            for i, a in enumerate(children):
+                self.dprint(f"  {i + 1}:{a} type:{type(a).__name__}")
+
+            if node.rule_name in sem_actions:
+                sem_action = sem_actions[node.rule_name]
+                retval = action(node, children)
+                action_name = (
+                    sem_action.__name__
+                    if hasattr(sem_action, "__name__")
+                    else sem_action.__class__.__name__
+                )
+                self.dprint(f"  Applying semantic action {action_name}")
             else:
                 if defaults:
-                    # If no rule is present use some sane defaults
-                    if self.debug:
-                        self.dprint("  Applying default semantic action.")
-
-                    retval = SemanticAction().first_pass(self, node, children)
+                    self.dprint("  Applying default semantic action.")
+                retval = action(node, children)
 
-                else:
-                    retval = node
-
-            if self.debug:
-                if retval is None:
-                    self.dprint("  Suppressed.")
-                else:
-                    self.dprint(f"  Resolved to = {retval}  type:{type(retval).__name__}")
+            if retval is None:
+                self.dprint("  Suppressed.")
+            else:
+                self.dprint(f"  Resolved to = {retval}  type:{type(retval).__name__}")
             return retval
 
         if self.debug:
             self.dprint("ASG: First pass")
-        asg = tree_walk(self.parse_tree)
+        # Walk the parse tree iteratively so that the depth of the tree is
+        # not limited by the Python recursion limit.
+        if self.debug:
+            asg = _visit_post_order(self.parse_tree, debug_action, enter)
+        else:
+            asg = _visit_post_order(self.parse_tree, action)
 
         # Second pass
         if self.debug:
@@ -1881,31 +2873,28 @@ class Parser(DebugPrinter):
 
         return asg
 
+    @property
+    def line_index(self) -> LineIndex:
+        """
+        Line index of the current input.
+        """
+        if self._line_index is None:
+            self._line_index = LineIndex(self.input)
+        return self._line_index
+
+    @property
+    def line_ends(self) -> list[int]:
+        """
+        Positions of the "\\n" characters of the current input. Kept for
+        backward compatibility, use `line_index` instead.
+        """
+        return self.line_index.line_ends
+
     def pos_to_linecol(self, pos: int) -> tuple[int, int]:
         """
         Calculate (line, column) tuple for the given position in the stream.
         """
-        if not self.line_ends:
-            try:
-                # TODO: Check this implementation on Windows.
-                self.line_ends.append(self.input.index("\n"))
-                while True:
-                    try:
-                        self.line_ends.append(
-                            self.input.index("\n", self.line_ends[-1] + 1)
-                        )
-                    except ValueError:
-                        break
-            except ValueError:
-                pass
-
-        line = bisect.bisect_left(self.line_ends, pos)
-        col = pos
-        if line > 0:
-            col -= self.line_ends[line - 1]
-            if self.input[self.line_ends[line - 1]] in "\n\r":
-                col -= 1
-        return line + 1, col + 1
+        return self.line_index.linecol(pos)
 
     def context(self, length: int | None = None, position: int | None = None) -> str:
         """
@@ -1916,7 +2905,7 @@ class Parser(DebugPrinter):
                 from the current position.
             position(int): The position in the input stream.
         """
-        if not position:
+        if position is None:
             position = self.position
         if length:
             retval = (
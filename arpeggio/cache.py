@@ -0,0 +1,503 @@
+#######################################################################
+# Name: cache.py
+# Purpose: Caching of visitor results for unchanged parse subtrees
+# License: MIT License
+#######################################################################
+
+from __future__ import annotations
+
+import hashlib
+import pickle
+import sqlite3
+from collections.abc import Iterator
+from typing import Any, cast
+
+from arpeggio import (
+    NonTerminal,
+    Parser,
+    ParseTreeNode,
+    PTNodeVisitor,
+    Terminal,
+    __version__,
+    _visit,
+)
+
+__all__ = [
+    "grammar_fingerprint",
+    "subtree_hashes",
+    "VisitCache",
+    "PersistentVisitCache",
+]
+
+
+def _model_children(expression: Any) -> list[Any]:
+    children = list(expression.nodes)
+    sep = getattr(expression, "sep", None)
+    if sep is not None:
+        children.append(sep)
+    return children
+
+
+def grammar_fingerprint(parser: Parser) -> str:
+    """
+    Calculates a hash of the parser model, the parser settings and the
+    Arpeggio version, i.e. of everything determining the parse trees.
+
+    Returns:
+        str: Hex digest which changes when the grammar changes.
+    """
+    fingerprint = hashlib.blake2b(digest_size=16)
+    fingerprint.update(
+        repr(
+            (
+                __version__,
+                parser.skipws,
+                parser.ws,
+                parser.reduce_tree,
+                parser.autokwd,
+                parser.ignore_case,
+            )
+        ).encode()
+    )
+
+    # Expressions are numbered in the depth-first order to describe
+    # references between them.
+    expressions: list[Any] = []
+    numbers: dict[int, int] = {}
+    stack = [m for m in (parser.comments_model, parser.parser_model) if m is not None]
+    while stack:
+        expression = stack.pop()
+        if id(expression) in numbers:
+            continue
+        numbers[id(expression)] = len(expressions)
+        expressions.append(expression)
+        stack.extend(reversed(_model_children(expression)))
+
+    for expression in expressions:
+        description = (
+            type(expression).__name__,
+            expression.rule_name,
+            expression.root,
+            expression.suppress,
+            getattr(expression, "to_match", None),
+            getattr(expression, "ignore_case", None),
+            getattr(expression, "ws", None),
+            getattr(expression, "skipws", None),
+            getattr(expression, "eolterm", None),
+            [numbers[id(c)] for c in _model_children(expression)],
+        )
+        fingerprint.update(repr(description).encode())
+    return fingerprint.hexdigest()
+
+
+def _terminal_key(node: Terminal) -> bytes:
+    rule_name = node.rule_name
+    value = node.value
+    return (
+        f"T{len(rule_name)}:{rule_name}{int(node.suppress)}{len(value)}:{value}".encode()
+    )
+
+
+def _hash_subtrees(parse_tree: ParseTreeNode) -> Iterator[tuple[NonTerminal, bytes]]:
+    """
+    Yields non-terminals of the tree in post-order with their Merkle hashes.
+    """
+    if not isinstance(parse_tree, NonTerminal):
+        return
+
+    blake2b = hashlib.blake2b
+
+    def new_hash(node: ParseTreeNode) -> Any:
+        rule_name = node.rule_name
+        return blake2b(f"N{len(rule_name)}:{rule_name}".encode(), digest_size=16)
+
+    stack = [(parse_tree, new_hash(parse_tree), iter(parse_tree))]
+    while stack:
+        node, node_hash, children = stack[-1]
+        for child in children:
+            if isinstance(child, NonTerminal):
+                stack.append((child, new_hash(child), iter(child)))
+                break
+            node_hash.update(_terminal_key(cast(Terminal, child)))
+        else:
+            stack.pop()
+            digest = node_hash.digest()
+            yield node, digest
+            if stack:
+                stack[-1][1].update(b"N" + digest)
+
+
+def subtree_hashes(parse_tree: ParseTreeNode) -> dict[int, bytes]:
+    """
+    Calculates Merkle hashes of all non-terminal subtrees in one pass.
+
+    The hash of a non-terminal is calculated from its rule name and the
+    hashes of its children. The hash of a terminal is calculated from its
+    rule name, value and suppress flag. Thus, equal subtrees have equal
+    hashes regardless of their position in the input.
+
+    Returns:
+        dict: Hashes (16 bytes) keyed by the id of the non-terminal.
+    """
+    return {id(node): digest for node, digest in _hash_subtrees(parse_tree)}
+
+
+class VisitCache:
+    """
+    Cache of the first pass visitor results for parse subtrees. Used with
+    `visit_parse_tree(..., cache=cache)` to visit new versions of a parse
+    tree (e.g. after the input has been edited and parsed again) without
+    visiting the subtrees which haven't changed.
+
+    Results are cached for non-terminals keyed by the subtree hash (see
+    `subtree_hashes`) and the number of the occurrence of the same subtree
+    in the tree. If a subtree is found in the cache its cached result is
+    used and the subtree is not visited. Thus, only changed subtrees and
+    their ancestors are visited. A cached result, or the results it is made
+    of, are used only once in a visit, so equal subtrees don't share
+    results. The results of the subtrees of a used result are kept in the
+    cache together with it.
+
+    Contract for visitors:
+
+    - first pass (`visit_<rule_name>`) methods must calculate the result
+      only from the node subtree, i.e. it must not depend on the node
+      position, the context of the node or the state of the visitor, nor
+      change the state of the visitor. The nodes given to the methods must
+      not be kept in the results as cached results outlive their trees.
+    - second pass (`second_<rule_name>`) methods are called for all the
+      results on each visit in the same order as without the cache,
+      including the cached results which were already given to them in
+      previous visits. Thus, they must be idempotent, e.g. resolve
+      references by assignment, and side effects collected in the visitor
+      must be reset before each visit.
+
+    Attributes:
+        rules (set of str): Names of the rules whose results are cached.
+            If None results of all non-terminals are cached.
+        max_generations (int): Results not used in this number of the last
+            visits are evicted after each visit.
+        hits (int): Number of cached results used in the last visit.
+        misses (int): Number of results calculated in the last visit.
+    """
+
+    def __init__(self, rules: Any = None, max_generations: int = 1) -> None:
+        self.rules: Any = rules
+        self.max_generations: int = max_generations
+        self.hits: int = 0
+        self.misses: int = 0
+        self._generation: int = 0
+        # (subtree hash, occurrence) -> [result, second pass entries list,
+        #   start, end, keys list, start, end, generation]
+        # Second pass entries and keys of the cached results of the subtree
+        # are slices of the lists of the visit that cached the result.
+        self._results: dict[tuple[bytes, int], list[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Ratio of cached results used in the last visit.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def _get(
+        self, key: tuple[bytes, int]
+    ) -> tuple[Any, list[tuple[str, Any]], list[tuple[bytes, int]]] | None:
+        """
+        Returns cached result, second pass entries of its subtree and the
+        keys of the cached results of its subtree.
+        """
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        result, entries, start, end, keys, keys_start, keys_end, _ = entry
+        return result, entries[start:end], keys[keys_start:keys_end]
+
+    def _put(
+        self,
+        key: tuple[bytes, int],
+        result: Any,
+        entries: list[tuple[str, Any]],
+        start: int,
+        keys: list[tuple[bytes, int]],
+        keys_start: int,
+    ) -> None:
+        """
+        Caches result. Second pass entries of the subtree are `entries` and
+        the keys of the cached results of the subtree are `keys` from the
+        given start to their current end. The lists are only appended to
+        during the visit and not changed after it.
+        """
+        self._results[key] = [
+            result,
+            entries,
+            start,
+            len(entries),
+            keys,
+            keys_start,
+            len(keys),
+            self._generation,
+        ]
+
+    def _evict(self, used: list[tuple[bytes, int]]) -> None:
+        """
+        Marks the results of the given keys as used in this visit and evicts
+        the results not used in the last `max_generations` visits.
+        """
+        generation = self._generation
+        results = self._results
+        for key in used:
+            entry = results.get(key)
+            if entry is not None:
+                entry[7] = generation
+        oldest = generation - self.max_generations
+        for key in [k for k, entry in results.items() if entry[7] <= oldest]:
+            del results[key]
+
+    def visit(self, parse_tree: ParseTreeNode, visitor: PTNodeVisitor) -> Any:
+        """
+        Runs the first pass of the visitor over the tree using and updating
+        the cache. Second pass entries are added to the visitor
+        `for_second_pass`. Use `visit_parse_tree` to run both passes.
+        """
+        self._generation += 1
+        self.hits = self.misses = 0
+        cached_visit = _CachedVisit(self, parse_tree)
+
+        visited = cached_visit.get(id(parse_tree))
+        if visited is not None:
+            result, entries = visited
+            cached_visit.entries.extend(entries)
+        else:
+            result = _visit(
+                parse_tree,
+                visitor,
+                done=cached_visit,
+                enter=cached_visit.enter,
+                leave=cached_visit.leave,
+                for_second_pass=cached_visit.entries,
+            )
+
+        self._evict(cached_visit.used)
+        visitor.for_second_pass.extend(cached_visit.entries)
+        return result
+
+
+class _CachedVisit:
+    """
+    State of a visit using `VisitCache`. Given to the visit walk as `done` to
+    look up the results of the subtrees in the cache, and as `enter` and
+    `leave` hooks to cache the results of the walked subtrees.
+
+    Keys of the subtrees are calculated for the whole tree before the walk,
+    numbering the occurrences of equal subtrees in post-order.
+    """
+
+    def __init__(self, cache: VisitCache, parse_tree: ParseTreeNode) -> None:
+        self.cache: VisitCache = cache
+        rules = cache.rules
+        occurrences: dict[bytes, int] = {}
+        self.keys: dict[int, tuple[bytes, int]] = {}
+        # Keep the nodes, e.g. views of compact trees, so their ids stay valid.
+        self.nodes: list[ParseTreeNode] = []
+        for node, digest in _hash_subtrees(parse_tree):
+            if rules is not None and node.rule_name not in rules:
+                continue
+            occurrence = occurrences.get(digest, 0)
+            occurrences[digest] = occurrence + 1
+            self.keys[id(node)] = (digest, occurrence)
+            self.nodes.append(node)
+
+        # Second pass entries of this visit.
+        self.entries: list[tuple[str, Any]] = []
+        # Keys of the cached results used in this visit in post-order,
+        # including the results the used results are made of.
+        self.used: list[tuple[bytes, int]] = []
+        self._used: set[tuple[bytes, int]] = set()
+        # Start positions in `entries` and `used` of the walked subtrees.
+        self._starts: list[tuple[int, int]] = []
+
+    def get(self, node_id: int) -> tuple[Any, list[tuple[str, Any]]] | None:
+        key = self.keys.get(node_id)
+        if key is None:
+            return None
+        cached = self.cache._get(key)
+        if cached is not None:
+            result, entries, keys = cached
+            used = self._used
+            if key not in used and used.isdisjoint(keys):
+                self.cache.hits += 1
+                self.used.extend(keys)
+                self.used.append(key)
+                used.update(keys)
+                used.add(key)
+                return result, entries
+        self.cache.misses += 1
+        return None
+
+    def enter(self, node: ParseTreeNode) -> None:
+        if id(node) in self.keys:
+            self._starts.append((len(self.entries), len(self.used)))
+
+    def leave(self, node: ParseTreeNode, result: Any) -> None:
+        key = self.keys.get(id(node))
+        if key is not None:
+            start, keys_start = self._starts.pop()
+            self.cache._put(key, result, self.entries, start, self.used, keys_start)
+            self.used.append(key)
+            self._used.add(key)
+
+
+class PersistentVisitCache(VisitCache):
+    """
+    `VisitCache` stored in a SQLite database, so the results of unchanged
+    subtrees are reused across runs, e.g. in consecutive builds.
+
+    Results, the second pass results of their subtrees and the keys of the
+    cached results of their subtrees are pickled and stored keyed by the
+    grammar fingerprint (see `grammar_fingerprint`), the visitor version and
+    the subtree hash. Change the version whenever the visitor changes.
+    Results which can't be pickled are not cached.
+
+    As the result of a node is pickled together with all the results it
+    contains, cache only the results of larger, mostly unchanged subtrees,
+    e.g. `rules={"function", "class"}`. Visitors must follow the contract
+    described in `VisitCache`.
+
+    Unlike `VisitCache` the size of the cache is limited by the number of
+    results. The least recently used results are evicted after each visit.
+    Call `close` when done or use the cache as a context manager.
+
+    Attributes:
+        path (str): The database file path.
+        max_entries (int): Maximal number of cached results.
+        total_hits (int): Number of cached results used in all the visits
+            with this database.
+        total_misses (int): Number of results calculated in all the visits
+            with this database.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        parser: Parser,
+        version: str = "",
+        rules: Any = None,
+        max_entries: int = 100000,
+    ) -> None:
+        super().__init__(rules)
+        self.path: str = path
+        self.max_entries: int = max_entries
+        self._prefix: bytes = hashlib.blake2b(
+            f"{grammar_fingerprint(parser)}:{version}".encode(), digest_size=16
+        ).digest()
+
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key BLOB PRIMARY KEY, value BLOB NOT NULL, used INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)"
+        )
+        self._db.commit()
+
+        # Visits are counted across runs to find least recently used results.
+        (self._generation,) = self._db.execute(
+            "SELECT COALESCE(MAX(used), 0) FROM results"
+        ).fetchone()
+        stats = dict(self._db.execute("SELECT name, value FROM stats"))
+        self.total_hits: int = stats.get("hits", 0)
+        self.total_misses: int = stats.get("misses", 0)
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __enter__(self) -> PersistentVisitCache:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    @property
+    def total_hit_rate(self) -> float:
+        """
+        Ratio of cached results used in all the visits with this database.
+        """
+        total = self.total_hits + self.total_misses
+        return self.total_hits / total if total else 0.0
+
+    def close(self) -> None:
+        self._db.close()
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM results")
+        self._db.execute("DELETE FROM stats")
+        self._db.commit()
+        self.total_hits = self.total_misses = 0
+
+    def _key(self, key: tuple[bytes, int]) -> bytes:
+        digest, occurrence = key
+        return self._prefix + digest + str(occurrence).encode()
+
+    def _get(
+        self, key: tuple[bytes, int]
+    ) -> tuple[Any, list[tuple[str, Any]], list[tuple[bytes, int]]] | None:
+        row = self._db.execute(
+            "SELECT value FROM results WHERE key = ?", (self._key(key),)
+        ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def _put(
+        self,
+        key: tuple[bytes, int],
+        result: Any,
+        entries: list[tuple[str, Any]],
+        start: int,
+        keys: list[tuple[bytes, int]],
+        keys_start: int,
+    ) -> None:
+        try:
+            value = pickle.dumps(
+                (result, entries[start:], keys[keys_start:]),
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+            (self._key(key), value, self._generation),
+        )
+
+    def _evict(self, used: list[tuple[bytes, int]]) -> None:
+        db = self._db
+        db.executemany(
+            "UPDATE results SET used = ? WHERE key = ?",
+            [(self._generation, self._key(key)) for key in used],
+        )
+
+        self.total_hits += self.hits
+        self.total_misses += self.misses
+        db.executemany(
+            "INSERT OR REPLACE INTO stats VALUES (?, ?)",
+            [("hits", self.total_hits), ("misses", self.total_misses)],
+        )
+
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            db.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY used LIMIT ?)",
+                (excess,),
+            )
+        db.commit()
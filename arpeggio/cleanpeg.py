@@ -17,7 +17,6 @@ from arpeggio import (
     Not,
     OneOrMore,
     Optional,
-    ParserPython,
     ZeroOrMore,
     visit_parse_tree,
 )
@@ -37,6 +36,7 @@ OPTIONAL = "?"
 UNORDERED_GROUP = "#"
 AND = "&"
 NOT = "!"
+LAZY = "~"
 OPEN = "("
 CLOSE = ")"
 
@@ -59,7 +59,7 @@ def sequence():
 
 
 def prefix():
-    return Optional([AND, NOT]), sufix
+    return Optional([AND, NOT, LAZY]), sufix
 
 
 def sufix():
@@ -101,9 +101,7 @@ def comment():
 
 class ParserPEG(ParserPEGOrig):
     def _from_peg(self, language_def: str) -> Any:
-        parser = ParserPython(peggrammar, comment, reduce_tree=False, debug=self.debug)
-        parser.root_rule_name = self.root_rule_name
-        parse_tree = parser.parse(language_def)
+        parse_tree = self._parse_peg(language_def, peggrammar, comment)
 
         return visit_parse_tree(
             parse_tree,
@@ -0,0 +1,278 @@
+#######################################################################
+# Name: compact.py
+# Purpose: Compact, array-backed parse tree representation
+# License: MIT License
+#######################################################################
+
+from __future__ import annotations
+
+import weakref
+from array import array
+from collections.abc import Iterator
+from typing import Any
+
+from arpeggio import LineIndex, NonTerminal, ParseTreeNode, Terminal
+
+__all__ = ["CompactTree", "CompactNonTerminal", "CompactTerminal"]
+
+# Node flags
+NON_TERMINAL = 1
+SUPPRESS = 2
+ERROR = 4
+
+
+class CompactTree:
+    """
+    Parse tree stored as parallel arrays indexed by node number plus the
+    input string. Nodes are numbered in document (pre-)order so the root
+    is node 0.
+
+    Node objects are not kept. Lightweight views implementing `Terminal`
+    and `NonTerminal` API are created on demand (see `node`) so navigation,
+    `tree_str` and visitors work as with the regular parse tree. A view is
+    reused while it is referenced, so a node has a single view at a time.
+
+    Attributes:
+        input (str): The parsed input.
+        rules (list of ParsingExpression): Rules that created nodes indexed
+            by the rule id.
+        rule_ids (array): Rule id of each node.
+        starts (array): Start position of each node.
+        ends (array): End position of each node.
+        parents (array): Parent node of each node or -1 for the root.
+        first_children (array): First child of each node or -1 for leafs.
+        next_siblings (array): Next sibling of each node or -1.
+        flags (array): NON_TERMINAL, SUPPRESS and ERROR flags of each node.
+        values (dict): Values of terminals that differ from the input slice
+            given by their span (e.g. case insensitive matches) keyed by node.
+    """
+
+    def __init__(self, _input: str) -> None:
+        self.input: str = _input
+        self.rules: list[Any] = []
+        self.rule_ids: array[int] = array("i")
+        self.starts: array[int] = array("q")
+        self.ends: array[int] = array("q")
+        self.parents: array[int] = array("i")
+        self.first_children: array[int] = array("i")
+        self.next_siblings: array[int] = array("i")
+        self.flags: array[int] = array("b")
+        self.values: dict[int, str] = {}
+        self._line_index: LineIndex | None = None
+        self._views: weakref.WeakValueDictionary[
+            int, CompactTerminal | CompactNonTerminal
+        ] = weakref.WeakValueDictionary()
+
+    @classmethod
+    def from_parse_tree(cls, parse_tree: ParseTreeNode, _input: str) -> CompactTree:
+        """
+        Builds compact tree from the regular parse tree of the given input.
+        """
+        tree = cls(_input)
+        rules = tree.rules
+        rule_ids = tree.rule_ids
+        starts = tree.starts
+        ends = tree.ends
+        parents = tree.parents
+        first_children = tree.first_children
+        next_siblings = tree.next_siblings
+        flags = tree.flags
+        values = tree.values
+        rule_map: dict[int, int] = {}
+        last_children: list[int] = []
+
+        stack: list[tuple[ParseTreeNode, int]] = [(parse_tree, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = len(starts)
+
+            rule_id = rule_map.get(id(node.rule))
+            if rule_id is None:
+                rule_id = rule_map[id(node.rule)] = len(rules)
+                rules.append(node.rule)
+            rule_ids.append(rule_id)
+            starts.append(node.position)
+            parents.append(parent)
+            first_children.append(-1)
+            next_siblings.append(-1)
+            last_children.append(-1)
+
+            if parent >= 0:
+                prev = last_children[parent]
+                if prev < 0:
+                    first_children[parent] = index
+                else:
+                    next_siblings[prev] = index
+                last_children[parent] = index
+
+            node_flags = ERROR if node.error else 0
+            if isinstance(node, NonTerminal):
+                node_flags |= NON_TERMINAL
+                # End is resolved from the last child below.
+                ends.append(node.position)
+                stack.extend((child, index) for child in reversed(node))
+            else:
+                end = node.position_end
+                ends.append(end)
+                assert isinstance(node, Terminal)
+                if node.suppress:
+                    node_flags |= SUPPRESS
+                if _input[node.position : end] != node.value:
+                    values[index] = node.value
+            flags.append(node_flags)
+
+        # Children are numbered after their parents so resolve ends of
+        # non-terminals backwards.
+        for index in range(len(starts) - 1, -1, -1):
+            last_child = last_children[index]
+            if last_child >= 0:
+                ends[index] = ends[last_child]
+
+        return tree
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def root(self) -> CompactTerminal | CompactNonTerminal:
+        return self.node(0)
+
+    @property
+    def line_index(self) -> LineIndex:
+        if self._line_index is None:
+            self._line_index = LineIndex(self.input)
+        return self._line_index
+
+    def node(self, index: int) -> CompactTerminal | CompactNonTerminal:
+        """
+        Returns a view of the node with the given number.
+        """
+        view = self._views.get(index)
+        if view is None:
+            if self.flags[index] & NON_TERMINAL:
+                view = CompactNonTerminal(self, index)
+            else:
+                view = CompactTerminal(self, index)
+            self._views[index] = view
+        return view
+
+    def parent(
+        self, node: CompactTerminal | CompactNonTerminal
+    ) -> CompactTerminal | CompactNonTerminal | None:
+        """
+        Returns a view of the parent of the given node view or None for the
+        root node.
+        """
+        parent = self.parents[node._index]
+        return self.node(parent) if parent >= 0 else None
+
+
+class CompactNonTerminal(NonTerminal):
+    """
+    A view of a non-terminal node of the `CompactTree`. Views of the children
+    are created on each access and are not kept by the view.
+    """
+
+    __slots__ = ["_tree", "_index"]
+
+    def __init__(self, tree: CompactTree, index: int) -> None:
+        self._tree: CompactTree = tree
+        self._index: int = index
+        self.rule = tree.rules[tree.rule_ids[index]]
+        self.rule_name = self.rule.rule_name
+        self.position = tree.starts[index]
+        self.error = bool(tree.flags[index] & ERROR)
+        self.comments = None
+        self._filtered = False
+
+    def _child_indexes(self) -> list[int]:
+        next_siblings = self._tree.next_siblings
+        indexes = []
+        child = self._tree.first_children[self._index]
+        while child >= 0:
+            indexes.append(child)
+            child = next_siblings[child]
+        return indexes
+
+    def __len__(self) -> int:
+        return len(self._child_indexes())
+
+    def __bool__(self) -> bool:
+        return self._tree.first_children[self._index] >= 0
+
+    def __iter__(self) -> Iterator[CompactTerminal | CompactNonTerminal]:
+        node = self._tree.node
+        next_siblings = self._tree.next_siblings
+        child = self._tree.first_children[self._index]
+        while child >= 0:
+            yield node(child)
+            child = next_siblings[child]
+
+    def __reversed__(self) -> Iterator[CompactTerminal | CompactNonTerminal]:
+        node = self._tree.node
+        for child in reversed(self._child_indexes()):
+            yield node(child)
+
+    def __getitem__(self, key: Any) -> Any:
+        indexes = self._child_indexes()
+        if isinstance(key, slice):
+            return [self._tree.node(child) for child in indexes[key]]
+        return self._tree.node(indexes[key])
+
+    def __contains__(self, item: object) -> bool:
+        return any(child is item or child == item for child in self)
+
+    # The list of a view is empty so compare the children.
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    @property
+    def compact_tree(self) -> CompactTree:
+        return self._tree
+
+    @property
+    def position_end(self) -> int:
+        return self._tree.ends[self._index]
+
+
+class CompactTerminal(Terminal):
+    """
+    A view of a terminal node of the `CompactTree`. The value is sliced from
+    the input on access.
+    """
+
+    __slots__ = ["_tree", "_index"]
+
+    def __init__(self, tree: CompactTree, index: int) -> None:
+        self._tree: CompactTree = tree
+        self._index: int = index
+        self.rule = tree.rules[tree.rule_ids[index]]
+        self.rule_name = self.rule.rule_name
+        self.position = tree.starts[index]
+        node_flags = tree.flags[index]
+        self.error = bool(node_flags & ERROR)
+        self.suppress = bool(node_flags & SUPPRESS)
+        self.comments = None
+        self.extra_info = None
+
+    @property
+    def compact_tree(self) -> CompactTree:
+        return self._tree
+
+    @property
+    def value(self) -> str:  # type: ignore[override]
+        tree = self._tree
+        index = self._index
+        value = tree.values.get(index)
+        if value is None:
+            value = tree.input[tree.starts[index] : tree.ends[index]]
+        return value
+
+    @property
+    def position_end(self) -> int:
+        return self._tree.ends[self._index]
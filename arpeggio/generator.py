@@ -0,0 +1,511 @@
+#######################################################################
+# Name: generator.py
+# Purpose: Random input generation from the parser model
+# License: MIT License
+#######################################################################
+
+from __future__ import annotations
+
+import functools
+import random as _random
+import string
+import warnings
+from typing import Any
+
+from arpeggio import (
+    And,
+    Combine,
+    Decorator,
+    EndOfFile,
+    GrammarError,
+    NoMatch,
+    Not,
+    OneOrMore,
+    Optional,
+    OrderedChoice,
+    Parser,
+    ParseTreeNode,
+    ParsingExpression,
+    RegExMatch,
+    Repetition,
+    Sequence,
+    StrMatch,
+    SyntaxPredicate,
+    UnorderedGroup,
+    ZeroOrMore,
+)
+
+# The regular expressions are sampled from the parse of the CPython `re`
+# module, which is not a public API. It is `re._parser` since Python 3.11 and
+# the deprecated `sre_parse` module before.
+try:
+    from re import _parser as _sre_parse  # type: ignore[attr-defined]
+except ImportError:
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            import sre_parse as _sre_parse  # type: ignore[no-redef]
+    except ImportError:
+        _sre_parse = None
+
+__all__ = ["InputGenerator", "generate", "sample_regex"]
+
+
+# Characters sampled for the regex wildcards and negated sets. Whitespace is
+# not sampled unless explicitly matched as it is skipped by the parsers. The
+# backslash is not sampled either as it usually escapes the next character in
+# string literals, which would then match past the sampled text.
+_PUNCTUATION = string.punctuation.replace("\\", "")
+_ALPHABET = string.ascii_letters + string.digits + _PUNCTUATION
+
+_CATEGORIES = {
+    "CATEGORY_DIGIT": string.digits,
+    "CATEGORY_NOT_DIGIT": string.ascii_letters + _PUNCTUATION,
+    "CATEGORY_SPACE": " ",
+    "CATEGORY_NOT_SPACE": _ALPHABET,
+    "CATEGORY_WORD": string.ascii_letters + string.digits + "_",
+    "CATEGORY_NOT_WORD": _PUNCTUATION.replace("_", ""),
+    "CATEGORY_LINEBREAK": "\n",
+    "CATEGORY_NOT_LINEBREAK": _ALPHABET,
+}
+
+
+@functools.cache
+def _parse_regex(pattern: str, flags: int) -> Any:
+    if _sre_parse is None:
+        raise GrammarError(
+            f"Can't sample '{pattern}'. Regular expression sampling needs the "
+            "regular expression parser of CPython (re._parser) which is not "
+            "available."
+        )
+    return _sre_parse.parse(pattern, flags)
+
+
+def sample_regex(
+    pattern: str,
+    flags: int = 0,
+    rnd: _random.Random | None = None,
+    max_repeat: int = 3,
+) -> str:
+    """
+    Returns a random string matched by the regular expression. Unbounded
+    repetitions are repeated at most `max_repeat` times above their minimum.
+    Anchors and lookaround assertions are ignored so the result may not match
+    patterns which use them.
+
+    The pattern is parsed by the internal parser of the CPython `re` module,
+    so sampling raises `GrammarError` on Python implementations without it.
+
+    Args:
+        pattern (str): The regular expression.
+        flags (int): `re` flags the expression is compiled with.
+        rnd (random.Random): The random generator. The module generator is
+            used by default.
+        max_repeat (int): The maximal count of unbounded repetitions above
+            their minimum.
+    """
+    rnd = rnd or _random.Random()
+    groups: dict[int, str] = {}
+    output: list[str] = []
+
+    def char_set(items: list[tuple[Any, Any]]) -> str:
+        negate = False
+        explicit: list[str] = []
+        for op, value in items:
+            op = str(op)
+            if op == "NEGATE":
+                negate = True
+            elif op == "LITERAL":
+                explicit.append(chr(value))
+            elif op == "RANGE":
+                low, high = value
+                explicit.extend(chr(c) for c in range(low, min(high, low + 255) + 1))
+            elif op == "CATEGORY":
+                explicit.extend(_CATEGORIES.get(str(value), ""))
+        if negate:
+            excluded = set(explicit)
+            return "".join(c for c in _ALPHABET if c not in excluded)
+        return "".join(explicit)
+
+    def sample(items: Any) -> None:
+        for op, value in items:
+            op = str(op)
+            if op == "LITERAL":
+                output.append(chr(value))
+            elif op == "NOT_LITERAL":
+                output.append(rnd.choice(_ALPHABET.replace(chr(value), "")))
+            elif op == "ANY":
+                output.append(rnd.choice(_ALPHABET))
+            elif op == "IN":
+                chars = char_set(value)
+                if not chars:
+                    raise GrammarError(f"Can't sample character set of '{pattern}'.")
+                output.append(rnd.choice(chars))
+            elif op == "BRANCH":
+                sample(rnd.choice(value[1]))
+            elif op == "SUBPATTERN":
+                group, subpattern = value[0], value[-1]
+                start = len(output)
+                sample(subpattern)
+                if group is not None:
+                    groups[group] = "".join(output[start:])
+            elif op == "ATOMIC_GROUP":
+                sample(value)
+            elif op in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+                low, high, subpattern = value
+                high = min(high, low + max_repeat)
+                for _ in range(rnd.randint(low, high)):
+                    sample(subpattern)
+            elif op == "GROUPREF":
+                output.append(groups.get(value, ""))
+            elif op == "GROUPREF_EXISTS":
+                group, yes, no = value
+                sample(yes if group in groups else no or [])
+            # AT (anchors), ASSERT and ASSERT_NOT produce no text.
+
+    sample(_parse_regex(pattern, flags))
+    return "".join(output)
+
+
+class InputGenerator:
+    """
+    Generates random inputs of the language of a parser by walking its
+    parser model. Works for models of `ParserPython` and `ParserPEG`.
+
+    Alternatives and repetitions are chosen randomly but recursion into
+    the rules being generated is avoided unless the `depth` target is set.
+    Then each item of the outermost repetition, or the whole input if there
+    is none, descends along a single path until the target depth is reached.
+
+    The generated text is a sequence of tokens separated by a single
+    whitespace if the parser skips whitespace. Ordered choices may parse a
+    generated alternative with another alternative, so the items of the
+    outermost repetition are checked by parsing them and regenerated if they
+    don't parse. The rest of a sequence following a syntax predicate is
+    regenerated until it satisfies the predicate. Generated inputs are
+    validated by parsing and regenerated if invalid.
+
+    Args:
+        parser (Parser): The parser whose language is generated.
+        seed: The seed of the random generator.
+        size (int): The target input size in characters. The outermost
+            repetition is repeated until the input is at least this long.
+        depth (int): The target rule nesting depth. Until reached, the
+            alternatives and repetitions leading back to the rules being
+            generated are preferred.
+        max_depth (int): The rule nesting depth after which the alternatives
+            with the shallowest nesting are chosen and repetitions are
+            minimal. Guarantees that generation ends.
+        repeat (tuple): The minimal and maximal count of repetitions.
+        separator (str): Whitespace put between the tokens. By default a
+            space if the parser skips whitespace.
+        attempts (int): How many times an input, an item of the outermost
+            repetition or a part checked by a predicate is generated before
+            giving up if it is not valid.
+    """
+
+    def __init__(
+        self,
+        parser: Parser,
+        seed: Any = None,
+        size: int | None = None,
+        depth: int | None = None,
+        max_depth: int = 50,
+        repeat: tuple[int, int] = (0, 3),
+        separator: str | None = None,
+        attempts: int = 100,
+    ) -> None:
+        self.parser: Parser = parser
+        self.random: _random.Random = _random.Random(seed)
+        self.size: int | None = size
+        self.depth: int | None = depth
+        self.max_depth: int = max(max_depth, depth or 0)
+        self.repeat: tuple[int, int] = repeat
+        self.attempts: int = attempts
+        if separator is None:
+            separator = ""
+            if parser.skipws:
+                separator = " " if " " in parser.ws else parser.ws[:1]
+        self.separator: str = separator
+
+        # The shallowest rule nesting of each expression and the root rules
+        # reachable from each expression by the expression id as string
+        # matches compare equal to their strings.
+        self._min_depth: dict[int, float] = {}
+        self._reach: dict[int, frozenset[int]] = {}
+        self._init_model()
+
+        self._tokens: list[str] = []
+        self._length: int = 0
+        # Ids of the rules being generated.
+        self._stack: list[int] = []
+        self._repeating: bool = False
+        self._in_combine: bool = False
+        # If the current path should descend to the target depth.
+        self._deepening: bool = False
+
+    def _init_model(self) -> None:
+        nodes: list[ParsingExpression] = []
+        seen: set[int] = set()
+        stack = [self.parser.parser_model]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            nodes.append(node)
+            stack.extend(node.nodes)
+            if isinstance(node, Repetition) and node.sep is not None:
+                stack.append(node.sep)
+
+        min_depth = self._min_depth
+        min_depth.update((id(node), float("inf")) for node in nodes)
+        changed = True
+        while changed:
+            changed = False
+            for node in nodes:
+                children = [min_depth[id(child)] for child in node.nodes]
+                if isinstance(node, OrderedChoice):
+                    depth = min(children)
+                elif isinstance(node, (Optional, ZeroOrMore, SyntaxPredicate)):
+                    depth = 0
+                else:
+                    depth = max(children, default=0)
+                depth += 1 if node.root else 0
+                if depth < min_depth[id(node)]:
+                    min_depth[id(node)] = depth
+                    changed = True
+
+        for node in nodes:
+            reach: dict[int, ParsingExpression] = {}
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                for child in current.nodes:
+                    if id(child) not in reach:
+                        reach[id(child)] = child
+                        stack.append(child)
+            self._reach[id(node)] = frozenset(i for i, n in reach.items() if n.root)
+
+    def generate(self, validate: bool = True) -> str:
+        """
+        Returns a random input.
+
+        Args:
+            validate (bool): If true, the input is parsed and a new one is
+                generated if it is not valid.
+
+        Raises:
+            GrammarError: If no valid input was generated in `attempts`
+                attempts.
+        """
+        error: NoMatch | None = None
+        for _ in range(self.attempts):
+            self._tokens = []
+            self._length = 0
+            self._stack = []
+            self._repeating = False
+            self._in_combine = False
+            self._deepening = self.depth is not None
+            self._generate(self.parser.parser_model)
+            text = self.separator.join(self._tokens)
+            if not validate:
+                return text
+            try:
+                self.parser.parse(text)
+            except NoMatch as e:
+                error = e
+                continue
+            return text
+        raise GrammarError(
+            f"No valid input generated in {self.attempts} attempts. Last error: {error}"
+        )
+
+    def _emit(self, token: str) -> None:
+        if token:
+            if self._tokens:
+                self._length += len(self.separator)
+            self._tokens.append(token)
+            self._length += len(token)
+
+    def _text(self, start: int) -> str:
+        separator = "" if self._in_combine else self.separator
+        return separator.join(self._tokens[start:])
+
+    def _parses(
+        self, expression: ParsingExpression, text: str, full: bool = True
+    ) -> bool:
+        """
+        Tells if the expression matches at the start of the text and, if
+        `full` is set, consumes all of it.
+        """
+        try:
+            # Like `parse`, the state of a parse in progress is kept.
+            result = self.parser._parse_reentrant(text, None, expression)
+        except NoMatch:
+            return False
+        if not full:
+            return True
+        end = 0
+        stack = [result]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ParseTreeNode):
+                end = max(end, node.position_end)
+            elif isinstance(node, list):
+                stack.extend(node)
+        return end == len(text)
+
+    def _retry(self, generate: Any, check: Any) -> None:
+        """
+        Calls `generate` until the text it emits passes `check`. The text of
+        the last attempt is kept if none passes.
+        """
+        start, length, deepening = len(self._tokens), self._length, self._deepening
+        for _ in range(self.attempts - 1):
+            generate()
+            if check(self._text(start)):
+                return
+            del self._tokens[start:]
+            self._length, self._deepening = length, deepening
+        generate()
+
+    def _shallow(self) -> bool:
+        return len(self._stack) >= self.max_depth
+
+    def _recursive(self, node: ParsingExpression) -> bool:
+        """
+        Tells if the expression leads back to a rule being generated.
+        """
+        return not self._reach[id(node)].isdisjoint(self._stack)
+
+    def _generate(self, node: ParsingExpression) -> None:
+        if node.root:
+            self._stack.append(id(node))
+            if self.depth is not None and len(self._stack) >= self.depth:
+                self._deepening = False
+        try:
+            self._generate_node(node)
+        finally:
+            if node.root:
+                self._stack.pop()
+
+    def _generate_node(self, node: ParsingExpression) -> None:
+        rnd = self.random
+        if isinstance(node, EndOfFile):
+            pass
+        elif isinstance(node, StrMatch):
+            self._emit(node.to_match)
+        elif isinstance(node, RegExMatch):
+            self._emit(
+                sample_regex(node.regex.pattern, node.regex.flags, rnd, self.repeat[1])
+            )
+        elif isinstance(node, SyntaxPredicate):
+            # Predicates and `Empty` produce no text.
+            pass
+        elif isinstance(node, OrderedChoice):
+            self._generate(self._choose(node.nodes))
+        elif isinstance(node, Combine):
+            state = self._tokens, self._length, self._in_combine
+            self._tokens, self._length, self._in_combine = [], 0, True
+            try:
+                self._generate_sequence(node.nodes)
+                token = "".join(self._tokens)
+            finally:
+                self._tokens, self._length, self._in_combine = state
+            self._emit(token)
+        elif isinstance(node, UnorderedGroup):
+            children = list(node.nodes)
+            rnd.shuffle(children)
+            for index, child in enumerate(children):
+                if index and node.sep is not None:
+                    self._generate(node.sep)
+                self._generate(child)
+        elif isinstance(node, Repetition):
+            self._generate_repetition(node)
+        elif isinstance(node, (Sequence, Decorator)):
+            self._generate_sequence(node.nodes)
+        else:
+            raise GrammarError(f"Can't generate input for {node.name}.")
+
+    def _generate_sequence(self, nodes: list[ParsingExpression]) -> None:
+        for index, node in enumerate(nodes):
+            if isinstance(node, (And, Not)) and index + 1 < len(nodes):
+                rest = nodes[index + 1 :]
+                self._retry(
+                    lambda rest=rest: self._generate_sequence(rest),
+                    lambda text, node=node: self._parses(node, text, full=False),
+                )
+                return
+            self._generate(node)
+
+    def _choose(self, alternatives: list[ParsingExpression]) -> ParsingExpression:
+        if self._shallow():
+            alternatives = self._shallowest(alternatives)
+        else:
+            if self._deepening:
+                recursive = [alt for alt in alternatives if self._recursive(alt)]
+                alternatives = recursive or alternatives
+            else:
+                alternatives = [
+                    alt for alt in alternatives if not self._recursive(alt)
+                ] or self._shallowest(alternatives)
+        return self.random.choice(alternatives)
+
+    def _shallowest(
+        self, alternatives: list[ParsingExpression]
+    ) -> list[ParsingExpression]:
+        depth = min(self._min_depth[id(alt)] for alt in alternatives)
+        return [alt for alt in alternatives if self._min_depth[id(alt)] == depth]
+
+    def _generate_repetition(self, node: Repetition) -> None:
+        child = node.nodes[0]
+        low = 1 if isinstance(node, OneOrMore) else 0
+        if isinstance(node, Optional):
+            high = 1
+        else:
+            low, high = max(low, self.repeat[0]), max(low, self.repeat[1])
+        if self._shallow():
+            count = low
+        else:
+            count = self.random.randint(low, high)
+            if self._deepening and self._recursive(child):
+                count = max(count, 1)
+
+        # The outermost repetition grows the input to the target size and
+        # each of its items descends to the target depth.
+        outermost = not self._repeating and not isinstance(node, Optional)
+        # The target size if this repetition fills the input up to it.
+        fill = self.size if outermost else None
+        if not self._repeating and self.size is not None:
+            count = max(count, 1)
+        # Optional doesn't repeat so a repetition inside can be outermost.
+        repeating = self._repeating
+        self._repeating = repeating or not isinstance(node, Optional)
+        try:
+            index = 0
+            while index < count or fill is not None and self._length < fill:
+                if index and node.sep is not None:
+                    self._generate(node.sep)
+                length = self._length
+                if outermost:
+                    self._deepening = self.depth is not None
+                    self._retry(
+                        lambda: self._generate(child),
+                        lambda text: self._parses(child, text),
+                    )
+                else:
+                    self._generate(child)
+                index += 1
+                if fill is not None and index >= count and self._length == length:
+                    break
+        finally:
+            self._repeating = repeating
+
+
+def generate(parser: Parser, **kwargs: Any) -> str:
+    """
+    Returns a random valid input of the parser language. Keyword arguments
+    are passed to `InputGenerator`.
+    """
+    return InputGenerator(parser, **kwargs).generate()
@@ -0,0 +1,261 @@
+#######################################################################
+# Name: index.py
+# Purpose: Indexes over finished parse trees for fast queries
+# License: MIT License
+#######################################################################
+
+from __future__ import annotations
+
+import bisect
+from array import array
+
+from arpeggio import NonTerminal, ParseTreeNode
+
+__all__ = ["RuleIndex", "IntervalIndex"]
+
+
+def _preorder(parse_tree: ParseTreeNode) -> tuple[list[ParseTreeNode], array[int]]:
+    """
+    Collects the nodes of the tree in document (pre-)order together with the
+    number of the parent of each node (-1 for the root).
+    """
+    nodes: list[ParseTreeNode] = []
+    parents = array("i")
+    stack: list[tuple[ParseTreeNode, int]] = [(parse_tree, -1)]
+    while stack:
+        node, parent = stack.pop()
+        index = len(nodes)
+        nodes.append(node)
+        parents.append(parent)
+        if isinstance(node, NonTerminal):
+            stack.extend((child, index) for child in reversed(node))
+    return nodes, parents
+
+
+class _NodeIndex:
+    """
+    Base class for indexes over a finished parse tree. Nodes are numbered in
+    document (pre-)order and identified by the object identity so the index
+    is valid as long as the tree is not modified.
+    """
+
+    def __init__(self, parse_tree: ParseTreeNode) -> None:
+        nodes, parents = _preorder(parse_tree)
+        self._nodes: list[ParseTreeNode] = nodes
+        self._parents: array[int] = parents
+        self._numbers: dict[int, int] = {id(node): i for i, node in enumerate(nodes)}
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: object) -> bool:
+        return id(node) in self._numbers
+
+    @property
+    def root(self) -> ParseTreeNode:
+        return self._nodes[0]
+
+    def _number(self, node: ParseTreeNode) -> int:
+        try:
+            return self._numbers[id(node)]
+        except KeyError:
+            raise ValueError(f"Node {node.name} is not in the index.") from None
+
+    def parent(self, node: ParseTreeNode) -> ParseTreeNode | None:
+        """
+        Returns the parent of the given node or None for the root node.
+        """
+        parent = self._parents[self._number(node)]
+        return self._nodes[parent] if parent >= 0 else None
+
+    def ancestors(self, node: ParseTreeNode) -> list[ParseTreeNode]:
+        """
+        Returns ancestors of the given node starting from its parent up to
+        the root node.
+        """
+        return self._ancestors(self._parents[self._number(node)])
+
+    def _ancestors(self, index: int) -> list[ParseTreeNode]:
+        """
+        Returns the node with the given number and all its ancestors.
+        """
+        nodes = self._nodes
+        parents = self._parents
+        result = []
+        while index >= 0:
+            result.append(nodes[index])
+            index = parents[index]
+        return result
+
+
+class RuleIndex(_NodeIndex):
+    """
+    Index of parse tree nodes by the rule name.
+
+    The index is built in one pass over a finished parse tree. The nodes of
+    a subtree form a contiguous range of node numbers so queries are
+    answered from the index without traversing the tree.
+
+    Nodes created by parsing expressions which are not rules (i.e. have an
+    empty rule name) are numbered but not indexed by the rule name.
+    """
+
+    def __init__(self, parse_tree: ParseTreeNode) -> None:
+        super().__init__(parse_tree)
+        nodes = self._nodes
+        parents = self._parents
+
+        # One past the last node of the subtree of each node.
+        subtree_ends = array("i", range(1, len(nodes) + 1))
+        for index in range(len(nodes) - 1, 0, -1):
+            parent = parents[index]
+            if subtree_ends[parent] < subtree_ends[index]:
+                subtree_ends[parent] = subtree_ends[index]
+        self._subtree_ends: array[int] = subtree_ends
+
+        by_rule: dict[str, array[int]] = {}
+        for index, node in enumerate(nodes):
+            rule_name = node.rule_name
+            if rule_name:
+                numbers = by_rule.get(rule_name)
+                if numbers is None:
+                    numbers = by_rule[rule_name] = array("i")
+                numbers.append(index)
+        self._by_rule: dict[str, array[int]] = by_rule
+
+    @property
+    def rule_names(self) -> list[str]:
+        """
+        Names of all the rules that have nodes in the tree.
+        """
+        return list(self._by_rule)
+
+    def nodes(self, rule_name: str) -> list[ParseTreeNode]:
+        """
+        Returns all nodes of the given rule in document order.
+        """
+        nodes = self._nodes
+        return [nodes[i] for i in self._by_rule.get(rule_name, ())]
+
+    def count(self, rule_name: str) -> int:
+        """
+        Returns the number of nodes of the given rule.
+        """
+        return len(self._by_rule.get(rule_name, ()))
+
+    def descendants(
+        self, node: ParseTreeNode, rule_name: str | None = None
+    ) -> list[ParseTreeNode]:
+        """
+        Returns descendants of the given node in document order. If rule name
+        is given only descendants of that rule are returned.
+        """
+        start = self._number(node) + 1
+        end = self._subtree_ends[start - 1]
+        nodes = self._nodes
+        if rule_name is None:
+            return nodes[start:end]
+        numbers = self._by_rule.get(rule_name)
+        if not numbers:
+            return []
+        return [
+            nodes[i]
+            for i in numbers[
+                bisect.bisect_left(numbers, start) : bisect.bisect_left(numbers, end)
+            ]
+        ]
+
+    def enclosing(self, node: ParseTreeNode, rule_name: str) -> ParseTreeNode | None:
+        """
+        Returns the nearest ancestor of the given node created by the given
+        rule or None if there is no such ancestor.
+        """
+        nodes = self._nodes
+        parents = self._parents
+        index = parents[self._number(node)]
+        while index >= 0:
+            if nodes[index].rule_name == rule_name:
+                return nodes[index]
+            index = parents[index]
+        return None
+
+    def is_ancestor(self, ancestor: ParseTreeNode, node: ParseTreeNode) -> bool:
+        """
+        Returns True if the first node is a proper ancestor of the second.
+        """
+        a = self._number(ancestor)
+        n = self._number(node)
+        return a < n < self._subtree_ends[a]
+
+
+class IntervalIndex(_NodeIndex):
+    """
+    Index of parse tree nodes by the span of the input they cover.
+
+    Start and end positions of all nodes are stored in one pass over a
+    finished parse tree so `position_end` of non-terminals, which is
+    resolved from the last child on each access, is not used for queries.
+    A node covers the offsets from its start up to, but not including, its
+    end, thus empty nodes don't cover any offset.
+
+    Node starts never decrease in document order so the last node starting
+    at or before an offset is found by a binary search. The innermost node
+    covering the offset is that node or its nearest ancestor which ends
+    after the offset.
+
+    The index doesn't reference the parser so it stays valid for its tree
+    when the parser is used for other inputs.
+    """
+
+    def __init__(self, parse_tree: ParseTreeNode) -> None:
+        super().__init__(parse_tree)
+        nodes = self._nodes
+        parents = self._parents
+        self._starts: array[int] = array("q", [node.position for node in nodes])
+
+        # Children are numbered after their parents so resolve the ends
+        # backwards. The end of a non-terminal is the end of its last child
+        # which is the first of its children visited.
+        ends = array("q", bytes(8 * len(nodes)))
+        resolved = bytearray(len(nodes))
+        for index in range(len(nodes) - 1, -1, -1):
+            if not resolved[index]:
+                node = nodes[index]
+                ends[index] = (
+                    node.position if isinstance(node, NonTerminal) else node.position_end
+                )
+            parent = parents[index]
+            if parent >= 0 and not resolved[parent]:
+                ends[parent] = ends[index]
+                resolved[parent] = 1
+        self._ends: array[int] = ends
+
+    def span(self, node: ParseTreeNode) -> tuple[int, int]:
+        """
+        Returns (start, end) positions of the given node.
+        """
+        index = self._number(node)
+        return self._starts[index], self._ends[index]
+
+    def _innermost(self, offset: int) -> int:
+        ends = self._ends
+        parents = self._parents
+        index = bisect.bisect_right(self._starts, offset) - 1
+        while index >= 0 and ends[index] <= offset:
+            index = parents[index]
+        return index
+
+    def innermost(self, offset: int) -> ParseTreeNode | None:
+        """
+        Returns the innermost node covering the given offset or None if the
+        offset is outside of the tree.
+        """
+        index = self._innermost(offset)
+        return self._nodes[index] if index >= 0 else None
+
+    def enclosing(self, offset: int) -> list[ParseTreeNode]:
+        """
+        Returns all nodes covering the given offset starting from the
+        innermost up to the root node.
+        """
+        return self._ancestors(self._innermost(offset))
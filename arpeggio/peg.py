@@ -11,7 +11,8 @@ from __future__ import annotations
 import codecs
 import copy
 import re
-from typing import Any
+import threading
+from typing import Any, Callable
 
 from arpeggio import (
     EOF,
@@ -19,6 +20,8 @@ from arpeggio import (
     CrossRef,
     EndOfFile,
     GrammarError,
+    Lazy,
+    NoMatch,
     Not,
     OneOrMore,
     Optional,
@@ -47,6 +50,7 @@ OPTIONAL = "?"
 UNORDERED_GROUP = "#"
 AND = "&"
 NOT = "!"
+LAZY = "~"
 OPEN = "("
 CLOSE = ")"
 
@@ -69,7 +73,7 @@ def sequence():
 
 
 def prefix():
-    return Optional([AND, NOT]), sufix
+    return Optional([AND, NOT, LAZY]), sufix
 
 
 def sufix():
@@ -122,6 +126,33 @@ PEG_ESCAPE_SEQUENCES_RE = re.compile(
 )
 
 
+# Meta-parsers for the supported PEG syntaxes keyed by the root rule of the
+# syntax grammar. Each is built lazily on first use and shared by all
+# ParserPEG instances. The lock guards the parse state of the meta-parser.
+_meta_parsers: dict[Callable[..., Any], tuple[ParserPython, threading.Lock]] = {}
+_meta_parsers_lock = threading.Lock()
+
+
+def get_meta_parser(
+    grammar: Callable[..., Any], comment_def: Callable[..., Any]
+) -> tuple[ParserPython, threading.Lock]:
+    """
+    Returns the shared meta-parser for the PEG syntax given by its root rule
+    and comment rule together with the lock that must be held while the
+    meta-parser is used.
+    """
+    try:
+        return _meta_parsers[grammar]
+    except KeyError:
+        with _meta_parsers_lock:
+            if grammar not in _meta_parsers:
+                _meta_parsers[grammar] = (
+                    ParserPython(grammar, comment_def, reduce_tree=False),
+                    threading.Lock(),
+                )
+            return _meta_parsers[grammar]
+
+
 class PEGVisitor(PTNodeVisitor):
     """
     Visitor that transforms parse tree to a PEG parser for the given language.
@@ -228,7 +259,12 @@ class PEGVisitor(PTNodeVisitor):
 
     def visit_prefix(self, node, children):
         if len(children) == 2:
-            retval = Not() if children[0] == NOT else And()
+            if children[0] == NOT:
+                retval = Not()
+            elif children[0] == LAZY:
+                retval = Lazy()
+            else:
+                retval = And()
             if isinstance(children[1], list):
                 retval.nodes = children[1]
             else:
@@ -328,9 +364,7 @@ class ParserPEG(Parser):
         return self.parser_model.parse(self)
 
     def _from_peg(self, language_def: str):
-        parser = ParserPython(peggrammar, comment, reduce_tree=False, debug=self.debug)
-        parser.root_rule_name = self.root_rule_name
-        parse_tree = parser.parse(language_def)
+        parse_tree = self._parse_peg(language_def, peggrammar, comment)
 
         return visit_parse_tree(
             parse_tree,
@@ -341,3 +375,30 @@ class ParserPEG(Parser):
                 debug=self.debug,
             ),
         )
+
+    def _parse_peg(
+        self,
+        language_def: str,
+        grammar: Callable[..., Any],
+        comment_def: Callable[..., Any],
+    ) -> Any:
+        """
+        Parses textual grammar definition using the meta-parser for the PEG
+        syntax given by its root rule and comment rule.
+        """
+        if self.debug:
+            # Debug prints and dot exports belong to the meta-parser so use a
+            # private one in debug mode.
+            parser = ParserPython(grammar, comment_def, reduce_tree=False, debug=True)
+            parser.root_rule_name = self.root_rule_name
+            return parser.parse(language_def)
+
+        parser, lock = get_meta_parser(grammar, comment_def)
+        with lock:
+            try:
+                return parser.parse(language_def)
+            except NoMatch as e:
+                # The meta-parser will be reused for other grammars so detach
+                # the error from its parse state.
+                e.parser = copy.copy(parser)
+                raise
@@ -0,0 +1,501 @@
+#######################################################################
+# Name: profiler.py
+# Purpose: Per-rule profiling of parsing
+# License: MIT License
+#######################################################################
+
+from __future__ import annotations
+
+import copy
+import json
+import time
+from typing import Any, NamedTuple
+
+from arpeggio import Parser, ParsingExpression
+from arpeggio.trace import ParserTracer, _model_nodes
+
+__all__ = [
+    "RuleStats",
+    "RuleProfiler",
+    "HotSpot",
+    "LineHeat",
+    "BacktrackHeatmap",
+    "FlameGraph",
+]
+
+
+class RuleStats:
+    """
+    Profiling counters of a parsing expression.
+
+    Attributes:
+        name (str): The rule name or `<rule name>/<expression name>` for the
+            expressions inside rules.
+        calls (int): The number of parse attempts.
+        successes (int): The number of successful attempts.
+        failures (int): The number of failed attempts.
+        memo_hits (int): The number of attempts resolved by memoization.
+        self_time (float): Time in seconds spent in the expression excluding
+            the time of the nested expressions.
+        cumulative_time (float): Time in seconds spent in the expression
+            including the nested expressions. Recursive attempts are not
+            counted twice.
+        backtracked (int): The number of characters consumed by the nested
+            expressions and thrown away when this expression failed.
+    """
+
+    __slots__ = [
+        "name",
+        "calls",
+        "successes",
+        "failures",
+        "memo_hits",
+        "self_time",
+        "cumulative_time",
+        "backtracked",
+        "_active",
+    ]
+
+    fields = (
+        "name",
+        "calls",
+        "successes",
+        "failures",
+        "memo_hits",
+        "self_time",
+        "cumulative_time",
+        "backtracked",
+    )
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.calls: int = 0
+        self.successes: int = 0
+        self.failures: int = 0
+        self.memo_hits: int = 0
+        self.self_time: float = 0.0
+        self.cumulative_time: float = 0.0
+        self.backtracked: int = 0
+        # Number of attempts in progress. Used for recursion.
+        self._active: int = 0
+
+    def __repr__(self) -> str:
+        return f"<RuleStats {self.name} calls={self.calls}>"
+
+    def merge(self, other: RuleStats) -> None:
+        for field in self.fields[1:]:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self) -> dict[str, Any]:
+        return {field: getattr(self, field) for field in self.fields}
+
+
+class RuleProfiler(ParserTracer):
+    """
+    Collects `RuleStats` for each parser model node while enabled.
+
+    The profiler is set as the parser tracer when enabled and the previous
+    tracer is restored when disabled. Thus, parsing is not slowed down when
+    the profiler is not enabled. Use it as a context manager:
+
+        with RuleProfiler(parser) as profiler:
+            parser.parse(content)
+        print(profiler.report())
+
+    Counters accumulate over all the parses done while enabled.
+    """
+
+    def __init__(self, parser: Parser) -> None:
+        super().__init__(parser)
+        self._nodes: list[tuple[ParsingExpression, RuleStats]] = [
+            (node, RuleStats(name)) for node, name in _model_nodes(parser)
+        ]
+        self._stats: dict[int, RuleStats] = {
+            id(node): stats for node, stats in self._nodes
+        }
+        # Start and the time of the nested expressions of the attempts in
+        # progress.
+        self._starts: list[float] = []
+        self._child_times: list[float] = []
+        # End of the last successful attempt. Used to calculate the input
+        # thrown away by failed attempts.
+        self._last_end: int = 0
+
+    def reset(self) -> None:
+        for _, stats in self._nodes:
+            stats.__init__(stats.name)  # type: ignore[misc]
+
+    def enter(self, expression: ParsingExpression, parser: Parser) -> None:
+        stats = self._stats[id(expression)]
+        stats.calls += 1
+        stats._active += 1
+        self._child_times.append(0.0)
+        self._starts.append(time.perf_counter())
+
+    def memo_hit(self, expression: ParsingExpression, parser: Parser) -> None:
+        self._stats[id(expression)].memo_hits += 1
+
+    def match(
+        self, expression: ParsingExpression, parser: Parser, position: int, result: Any
+    ) -> None:
+        self._stats[id(expression)].successes += 1
+        self._last_end = parser.position
+
+    def fail(self, expression: ParsingExpression, parser: Parser, position: int) -> None:
+        stats = self._stats[id(expression)]
+        stats.failures += 1
+        if self._last_end > position:
+            stats.backtracked += self._last_end - position
+        self._last_end = position
+
+    def exit(self, expression: ParsingExpression, parser: Parser, position: int) -> None:
+        elapsed = time.perf_counter() - self._starts.pop()
+        stats = self._stats[id(expression)]
+        stats._active -= 1
+        child_times = self._child_times
+        stats.self_time += elapsed - child_times.pop()
+        if child_times:
+            child_times[-1] += elapsed
+        if not stats._active:
+            stats.cumulative_time += elapsed
+
+    def stats(self, rules_only: bool = False) -> list[RuleStats]:
+        """
+        Returns the stats of the expressions which were called. Stats of the
+        nodes with the same name (e.g. rules cloned by the PEG parser) are
+        merged.
+
+        Args:
+            rules_only(bool): Return only the stats of the rules.
+        """
+        merged: dict[str, RuleStats] = {}
+        for node, stats in self._nodes:
+            if not stats.calls or (rules_only and not node.root):
+                continue
+            if stats.name in merged:
+                merged[stats.name].merge(stats)
+            else:
+                merged[stats.name] = RuleStats(stats.name)
+                merged[stats.name].merge(stats)
+        return list(merged.values())
+
+    def _sorted(self, sort: str, limit: int | None, rules_only: bool) -> list[RuleStats]:
+        if sort not in RuleStats.fields:
+            raise ValueError(f'Unknown sort field "{sort}".')
+        # Numbers are sorted in descending, names in ascending order.
+        return sorted(
+            self.stats(rules_only),
+            key=lambda s: getattr(s, sort),
+            reverse=sort != "name",
+        )[:limit]
+
+    def report(
+        self,
+        sort: str = "self_time",
+        limit: int | None = None,
+        rules_only: bool = False,
+    ) -> str:
+        """
+        Returns the stats formatted as a table.
+
+        Args:
+            sort(str): `RuleStats` field to sort by. Default is "self_time".
+            limit(int): The maximal number of rows.
+            rules_only(bool): Report only the rules.
+        """
+        rows = self._sorted(sort, limit, rules_only)
+        width = max([len(s.name) for s in rows] + [4])
+        lines = [
+            f"{'rule':<{width}} {'calls':>9} {'success':>9} {'fail':>9} "
+            f"{'memo':>9} {'self ms':>10} {'cum ms':>10} {'backtracked':>11}"
+        ]
+        for s in rows:
+            lines.append(
+                f"{s.name:<{width}} {s.calls:>9} {s.successes:>9} {s.failures:>9} "
+                f"{s.memo_hits:>9} {s.self_time * 1000:>10.2f} "
+                f"{s.cumulative_time * 1000:>10.2f} {s.backtracked:>11}"
+            )
+        return "\n".join(lines)
+
+    def to_json(
+        self,
+        sort: str = "self_time",
+        limit: int | None = None,
+        rules_only: bool = False,
+        **kwargs: Any,
+    ) -> str:
+        """
+        Returns the stats as a JSON list of objects with `RuleStats` fields.
+        Times are in seconds. Arguments are the same as for `report`, extra
+        keyword arguments are passed to `json.dumps`.
+        """
+        return json.dumps(
+            [s.as_dict() for s in self._sorted(sort, limit, rules_only)], **kwargs
+        )
+
+
+class HotSpot(NamedTuple):
+    """
+    Input position where parsing was retried.
+    """
+
+    position: int
+    line: int
+    col: int
+    retries: int
+    # Retries by rule name.
+    rules: dict[str, int]
+    context: str
+
+
+class LineHeat(NamedTuple):
+    """
+    Parse attempts and retries at the positions of an input line.
+    """
+
+    line: int
+    attempts: int
+    retries: int
+    # Retries by rule name.
+    rules: dict[str, int]
+
+
+class BacktrackHeatmap(ParserTracer):
+    """
+    Counts parse attempts of the parser model nodes at each input position
+    while enabled. An attempt at a position which the parse has already
+    gone past is a retry caused by backtracking, i.e. the input from that
+    position is parsed again. Retries are attributed to the rules (the
+    enclosing rules for the expressions inside rules). Attempts resolved by
+    memoization are not counted.
+
+    Like `RuleProfiler` the heatmap is the parser tracer only while enabled.
+    Use it for a single parse:
+
+        with BacktrackHeatmap(parser) as heatmap:
+            parser.parse(content)
+        print(heatmap.report())
+    """
+
+    def __init__(self, parser: Parser) -> None:
+        super().__init__(parser)
+        # Node id -> rule name.
+        self._rules: dict[int, str] = {
+            id(node): name.split("/")[0] for node, name in _model_nodes(parser)
+        }
+        self._input: str | None = None
+        # The furthest position reached by the parse.
+        self._high: int = 0
+        # position -> attempts
+        self._attempts: dict[int, int] = {}
+        # position -> {rule name -> retries}
+        self._retries: dict[int, dict[str, int]] = {}
+        # Copy of the parser detached from later parses. Used for contexts
+        # and line/column calculation.
+        self._parser: Parser | None = None
+
+    def disable(self) -> None:
+        if self.enabled:
+            super().disable()
+            self._parser = copy.copy(self.parser)
+
+    def reset(self) -> None:
+        self._input = None
+        self._high = 0
+        self._attempts = {}
+        self._retries = {}
+
+    def enter(self, expression: ParsingExpression, parser: Parser) -> None:
+        position = parser.position
+        _input = parser.input
+        if _input is not self._input:
+            # New input.
+            self._input = _input
+            self._high = 0
+        if parser.memoization and position in expression._result_cache:
+            return
+        if parser.skipws and not parser.in_lex_rule:
+            # Count at the start of the token, not the whitespace.
+            ws = parser.ws
+            length = len(_input)
+            while position < length and _input[position] in ws:
+                position += 1
+        self._attempts[position] = self._attempts.get(position, 0) + 1
+        if position < self._high:
+            rules = self._retries.get(position)
+            if rules is None:
+                rules = self._retries[position] = {}
+            rule_name = self._rules[id(expression)]
+            rules[rule_name] = rules.get(rule_name, 0) + 1
+
+    def exit(self, expression: ParsingExpression, parser: Parser, position: int) -> None:
+        if parser.position > self._high:
+            self._high = parser.position
+
+    @property
+    def _observed(self) -> Parser:
+        return self._parser if self._parser is not None else self.parser
+
+    def attempts(self, position: int) -> int:
+        """
+        Returns the number of parse attempts at the given position.
+        """
+        return self._attempts.get(position, 0)
+
+    def retries(self, position: int) -> int:
+        """
+        Returns the number of parse retries at the given position.
+        """
+        return sum(self._retries.get(position, {}).values())
+
+    def hot_spots(self, limit: int = 10) -> list[HotSpot]:
+        """
+        Returns the positions with the most retries.
+        """
+        parser = self._observed
+        spots = sorted(
+            (-sum(rules.values()), position) for position, rules in self._retries.items()
+        )[:limit]
+        result = []
+        for retries, position in spots:
+            retries = -retries
+            line, col = parser.pos_to_linecol(position)
+            result.append(
+                HotSpot(
+                    position,
+                    line,
+                    col,
+                    retries,
+                    self._retries[position],
+                    parser.context(position=position),
+                )
+            )
+        return result
+
+    def lines(self) -> list[LineHeat]:
+        """
+        Returns attempts and retries aggregated by lines, in the line order.
+        Only lines with attempts are included.
+        """
+        positions = sorted(self._attempts)
+        lines, _ = self._observed.line_index.linecols(positions)
+        heat: dict[int, LineHeat] = {}
+        for line, position in zip(lines, positions):
+            line_heat = heat.get(line)
+            if line_heat is None:
+                line_heat = heat[line] = LineHeat(line, 0, 0, {})
+            retries = line_heat.retries
+            for rule, n in self._retries.get(position, {}).items():
+                retries += n
+                line_heat.rules[rule] = line_heat.rules.get(rule, 0) + n
+            heat[line] = line_heat._replace(
+                attempts=line_heat.attempts + self._attempts[position], retries=retries
+            )
+        return list(heat.values())
+
+    def report(self, limit: int = 10) -> str:
+        """
+        Returns the lines and the positions with the most retries formatted
+        as text.
+        """
+
+        def top_rules(rules: dict[str, int]) -> str:
+            top = sorted(rules.items(), key=lambda r: -r[1])[:3]
+            return ", ".join(f"{rule} ({n})" for rule, n in top)
+
+        lines = ["Lines with most retries:"]
+        lines.append(f"{'line':>7} {'attempts':>9} {'retries':>9}  rules")
+        for heat in sorted(self.lines(), key=lambda h: -h.retries)[:limit]:
+            if not heat.retries:
+                break
+            lines.append(
+                f"{heat.line:>7} {heat.attempts:>9} {heat.retries:>9}  "
+                f"{top_rules(heat.rules)}"
+            )
+        lines.append("")
+        lines.append("Hot spots:")
+        lines.append(f"{'position':>15} {'retries':>9}  rules")
+        for spot in self.hot_spots(limit):
+            lines.append(
+                f"{f'({spot.line}, {spot.col})':>15} {spot.retries:>9}  "
+                f"{top_rules(spot.rules)}"
+            )
+            lines.append(f"{'':>15} {'':>9}  => {spot.context!r}")
+        return "\n".join(lines)
+
+
+class FlameGraph(ParserTracer):
+    """
+    Attributes parse time to the stacks of the grammar rules being parsed
+    (e.g. `program;statement;expression;term`) while enabled. The time of
+    the expressions inside rules is the time of their rules. The result is
+    in the collapsed stack format read by flame graph tools like
+    `flamegraph.pl` and speedscope:
+
+        with FlameGraph(parser) as flame_graph:
+            parser.parse(content)
+        flame_graph.save("parse.folded")
+
+    Times accumulate over all the parses done while enabled.
+    """
+
+    def __init__(self, parser: Parser) -> None:
+        super().__init__(parser)
+        # Collapsed stacks of the rules in progress, their start times and
+        # the time of their nested rules.
+        self._stacks: list[str] = []
+        self._starts: list[float] = []
+        self._child_times: list[float] = []
+        # Collapsed stack -> self time in seconds.
+        self._times: dict[str, float] = {}
+
+    def reset(self) -> None:
+        self._times = {}
+
+    def enter(self, expression: ParsingExpression, parser: Parser) -> None:
+        if expression.root:
+            stacks = self._stacks
+            stacks.append(
+                f"{stacks[-1]};{expression.rule_name}" if stacks else expression.rule_name
+            )
+            self._child_times.append(0.0)
+            self._starts.append(time.perf_counter())
+
+    def exit(self, expression: ParsingExpression, parser: Parser, position: int) -> None:
+        if expression.root:
+            elapsed = time.perf_counter() - self._starts.pop()
+            stack = self._stacks.pop()
+            child_times = self._child_times
+            self._times[stack] = self._times.get(stack, 0.0) + elapsed - child_times.pop()
+            if child_times:
+                child_times[-1] += elapsed
+
+    def times(self) -> dict[str, float]:
+        """
+        Returns self times in seconds by the collapsed rule stacks.
+        """
+        return dict(self._times)
+
+    def collapsed(self, unit: float = 1e-6) -> str:
+        """
+        Returns the stacks in the collapsed stack format, one stack per line
+        followed by its self time in the given unit rounded to an integer.
+        The default unit is microsecond. Stacks with no time are left out.
+
+        Args:
+            unit(float): The time unit in seconds.
+        """
+        lines = []
+        for stack, self_time in sorted(self._times.items()):
+            value = round(self_time / unit)
+            if value > 0:
+                lines.append(f"{stack} {value}")
+        return "\n".join(lines)
+
+    def save(self, file_name: str, unit: float = 1e-6) -> None:
+        """
+        Writes the collapsed stacks to the file.
+        """
+        with open(file_name, "w", encoding="utf-8") as f:
+            f.write(self.collapsed(unit))
+            f.write("\n")
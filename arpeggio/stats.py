@@ -0,0 +1,515 @@
+#######################################################################
+# Name: stats.py
+# Purpose: Metrics of parsing
+# License: MIT License
+#######################################################################
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+from typing import Any, Callable, NamedTuple
+
+from arpeggio import (
+    LazyNonTerminal,
+    LazyTerminal,
+    Match,
+    NoMatch,
+    NonTerminal,
+    Parser,
+    ParseTreeNode,
+    ParsingExpression,
+    Terminal,
+)
+from arpeggio.trace import ParserTracer, Tracer, _model_nodes
+
+__all__ = [
+    "ParseStats",
+    "RuleMemory",
+    "TreeMemory",
+    "tree_memory",
+    "OperationCounts",
+    "OperationCounter",
+    "count_operations",
+    "assert_operation_budget",
+]
+
+
+class ParseStats:
+    """
+    Metrics of a single parse. Returned by `Parser.parse` called with
+    `stats=True` and kept as `parse_stats` attribute of the parser. The
+    engine metrics are counted by a tracer during the parse, so the wall time
+    includes the counting overhead.
+
+    Attributes:
+        file_name (str): The file name given to `parse`.
+        matched (bool): If the input was parsed successfully.
+        input_size (int): The number of input characters.
+        wall_time (float): Parse time in seconds.
+        throughput (float): Input characters parsed per second.
+        nodes (dict): Parse tree node counts by the node type name. Children
+            of `LazyNonTerminal` nodes are not counted.
+        attempts (int): The number of parse attempts of the parser model
+            nodes.
+        no_matches (int): The number of attempts which ended with `NoMatch`.
+        max_depth (int): The maximal nesting of rule attempts.
+        cache_hits (int): Memoization cache hits.
+        cache_misses (int): Memoization cache misses.
+        memo_entries (int): Memoization cache entries at the end of the parse
+            when the caches are at their largest.
+        memo_size (int): The size in bytes of the memoization caches at the
+            end of the parse, without the cached results.
+        comments (int): The number of comments parsed.
+    """
+
+    __slots__ = [
+        "file_name",
+        "matched",
+        "input_size",
+        "wall_time",
+        "throughput",
+        "nodes",
+        "attempts",
+        "no_matches",
+        "max_depth",
+        "cache_hits",
+        "cache_misses",
+        "memo_entries",
+        "memo_size",
+        "comments",
+    ]
+
+    fields = tuple(__slots__)
+
+    def __init__(self, file_name: str | None = None) -> None:
+        self.file_name: str | None = file_name
+        self.matched: bool = False
+        self.input_size: int = 0
+        self.wall_time: float = 0.0
+        self.throughput: float = 0.0
+        self.nodes: dict[str, int] = {}
+        self.attempts: int = 0
+        self.no_matches: int = 0
+        self.max_depth: int = 0
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        self.memo_entries: int = 0
+        self.memo_size: int = 0
+        self.comments: int = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"<ParseStats size={self.input_size} time={self.wall_time:.3f}s "
+            f"matched={self.matched}>"
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        return {field: getattr(self, field) for field in self.fields}
+
+    def to_json(self, **kwargs: Any) -> str:
+        """
+        Returns the stats as a JSON object. Keyword arguments are passed to
+        `json.dumps`.
+        """
+        return json.dumps(self.as_dict(), **kwargs)
+
+
+class _StatsTracer(Tracer):
+    """
+    Collects the engine metrics of `ParseStats`. The events are also reported
+    to the given tracer of the parser.
+    """
+
+    def __init__(self, stats: ParseStats, tracer: Tracer | None = None) -> None:
+        self.stats: ParseStats = stats
+        self.tracer: Tracer | None = tracer
+        self._depth: int = 0
+
+    def _traced_method(
+        self,
+        traced_parser: Parser,
+        expression: ParsingExpression,
+        attr: str,
+        method: Callable[[Parser], Any],
+    ) -> Callable[[Parser], Any] | None:
+        inner = None
+        if self.tracer is not None:
+            inner = self.tracer._traced_method(traced_parser, expression, attr, method)
+        if attr == "parse" and isinstance(expression, Match):
+            return inner
+        traced_method = inner or method
+        stats_tracer = self
+        stats = self.stats
+        rule = expression.root
+        model_root = expression is traced_parser.parser_model
+
+        def counted_parse(parser: Parser) -> Any:
+            if parser is not traced_parser:
+                return method(parser)
+            stats.attempts += 1
+            if rule:
+                depth = stats_tracer._depth + 1
+                stats_tracer._depth = depth
+                if depth > stats.max_depth:
+                    stats.max_depth = depth
+            try:
+                return traced_method(parser)
+            except NoMatch:
+                stats.no_matches += 1
+                raise
+            finally:
+                if rule:
+                    stats_tracer._depth -= 1
+                if model_root and parser.memoization:
+                    stats_tracer._count_memo(parser)
+
+        return counted_parse
+
+    def _count_memo(self, parser: Parser) -> None:
+        # Caches are cleared when the parse finishes.
+        for node, _ in _model_nodes(parser):
+            cache = node._result_cache
+            if cache:
+                self.stats.memo_entries += len(cache)
+                self.stats.memo_size += sys.getsizeof(cache) + sum(
+                    sys.getsizeof(entry) for entry in cache.values()
+                )
+
+
+def _count_nodes(tree: Any) -> dict[str, int]:
+    nodes: dict[str, int] = {}
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        name = type(node).__name__
+        nodes[name] = nodes.get(name, 0) + 1
+        if isinstance(node, NonTerminal):
+            if isinstance(node, LazyNonTerminal) and not node.expanded:
+                continue
+            stack.extend(node)
+    return nodes
+
+
+def _parse_with_stats(
+    parser: Parser, _input: str, file_name: str | None
+) -> tuple[Any, ParseStats]:
+    """
+    Parses the input collecting `ParseStats`. The stats are kept in
+    `parser.parse_stats` also if the parse fails.
+
+    The engine metrics are counted by a tracer on the instrumented engine,
+    which also reports to the tracer of the parser, and the same parse is
+    timed.
+    """
+    stats = parser.parse_stats = ParseStats(file_name)
+    stats.input_size = len(_input)
+    tracer = parser.tracer
+    parser.tracer = _StatsTracer(stats, parser._active_tracer())
+    comments = len(parser.comments)
+    tree = None
+    start = time.perf_counter()
+    try:
+        tree = parser.parse(_input, file_name)
+        stats.matched = True
+    finally:
+        stats.wall_time = time.perf_counter() - start
+        if stats.wall_time:
+            stats.throughput = stats.input_size / stats.wall_time
+        stats.comments = len(parser.comments) - comments
+        stats.cache_hits = parser.cache_hits
+        stats.cache_misses = parser.cache_misses
+        parser.tracer = tracer
+        # Switch back immediately also for a nested parse.
+        parser._select_engine()
+    stats.nodes = _count_nodes(tree)
+    return tree, stats
+
+
+class RuleMemory(NamedTuple):
+    """
+    Memory retained by the parse tree nodes of a grammar rule.
+    """
+
+    rule: str
+    nodes: int
+    size: int
+
+
+class TreeMemory:
+    """
+    Memory retained by a parse tree, returned by `tree_memory`. Sizes are in
+    bytes as reported by `sys.getsizeof`. Objects shared by several nodes are
+    counted once and the input string is not counted. The memoization caches
+    are cleared when the parse finishes and are measured by
+    `ParseStats.memo_size` instead.
+
+    Attributes:
+        nodes (int): The number of parse tree nodes, including comments.
+        node_size (int): The size of the node objects with their child lists.
+        value_size (int): The size of the terminal value strings.
+        extra_info_size (int): The size of the terminal `extra_info` objects,
+            i.e. `re.Match` objects or the tuples of their captured groups.
+        comment_size (int): The size of the parsed comment trees kept by the
+            parser in `comments`.
+        comment_positions_size (int): The size of the parser
+            `comment_positions` table.
+        rules (dict): `RuleMemory` by the rule name. Nodes of the non-root
+            expressions are attributed to the rule they are part of.
+    """
+
+    def __init__(self) -> None:
+        self.nodes: int = 0
+        self.node_size: int = 0
+        self.value_size: int = 0
+        self.extra_info_size: int = 0
+        self.comment_size: int = 0
+        self.comment_positions_size: int = 0
+        self.rules: dict[str, RuleMemory] = {}
+
+    @property
+    def size(self) -> int:
+        return (
+            self.node_size
+            + self.value_size
+            + self.extra_info_size
+            + self.comment_size
+            + self.comment_positions_size
+        )
+
+    def top(self, limit: int | None = None) -> list[RuleMemory]:
+        """
+        Returns rules by the retained size, the largest first.
+        """
+        return sorted(self.rules.values(), key=lambda r: r.size, reverse=True)[:limit]
+
+    def report(self, limit: int | None = 10) -> str:
+        lines = [
+            f"Parse tree: {self.nodes} nodes, {self.size} bytes",
+            f"  nodes {self.node_size}, values {self.value_size}, "
+            f"extra_info {self.extra_info_size}, comments {self.comment_size}, "
+            f"comment_positions {self.comment_positions_size}",
+            "",
+            f"{'rule':<30} {'nodes':>9} {'bytes':>11} {'%':>6}",
+        ]
+        for rule in self.top(limit):
+            percent = rule.size / self.size * 100 if self.size else 0.0
+            lines.append(
+                f"{rule.rule:<30} {rule.nodes:>9} {rule.size:>11} {percent:>6.1f}"
+            )
+        return "\n".join(lines)
+
+
+def tree_memory(tree: ParseTreeNode, parser: Parser | None = None) -> TreeMemory:
+    """
+    Measures the memory retained by the finished parse tree by grammar rule.
+    Children of not expanded `LazyNonTerminal` nodes are not measured.
+
+    Args:
+        tree (ParseTreeNode): The root of the parse tree.
+        parser (Parser): If given, the comments and the `comment_positions`
+            table kept by the parser after the parse are measured too.
+    """
+    memory = TreeMemory()
+    seen: set[int] = set()
+
+    def size_of(obj: Any) -> int:
+        if obj is None or id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        size = sys.getsizeof(obj)
+        if isinstance(obj, tuple):
+            size += sum(size_of(item) for item in obj)
+        return size
+
+    def measure(root: ParseTreeNode, comment: bool) -> None:
+        # Nodes with the rule they are attributed to.
+        stack: list[tuple[Any, str]] = [(root, root.rule_name)]
+        while stack:
+            node, rule = stack.pop()
+            rule = node.rule_name or rule
+            memory.nodes += 1
+            node_size = size_of(node)
+            value_size = extra_info_size = 0
+            if isinstance(node, Terminal):
+                if not isinstance(node, LazyTerminal):
+                    value_size = size_of(node.value)
+                extra_info_size = size_of(node.extra_info)
+            elif not (isinstance(node, LazyNonTerminal) and not node.expanded):
+                stack.extend((child, rule) for child in node)
+            size = node_size + value_size + extra_info_size
+            if comment:
+                memory.comment_size += size
+            else:
+                memory.node_size += node_size
+                memory.value_size += value_size
+                memory.extra_info_size += extra_info_size
+            _, nodes, total = memory.rules.get(rule, (rule, 0, 0))
+            memory.rules[rule] = RuleMemory(rule, nodes + 1, total + size)
+
+    measure(tree, False)
+    if parser is not None:
+        for comment in parser.comments:
+            measure(comment, True)
+        positions = parser.comment_positions
+        memory.comment_positions_size = size_of(positions) + sum(
+            size_of(k) + size_of(v) for k, v in positions.items()
+        )
+    return memory
+
+
+class OperationCounts:
+    """
+    Deterministic counts of the parsing engine operations, collected by
+    `OperationCounter`. Unlike times they don't depend on the machine, so
+    they can be checked against budgets in tests.
+
+    Attributes:
+        calls (dict): The number of `parse` calls by the parsing expression
+            type name.
+        no_matches (int): The number of `NoMatch` raises, counted once for
+            each parsing expression the failure propagates through.
+        memo_lookups (int): Memoization cache lookups.
+        memo_hits (int): Memoization cache lookups which found a result.
+        nodes (int): The number of parse tree nodes created.
+        scanned (int): The number of characters matched by terminal
+            expressions.
+        rescanned (int): The number of characters matched by terminal
+            expressions which were already matched before in the same input.
+    """
+
+    __slots__ = [
+        "calls",
+        "no_matches",
+        "memo_lookups",
+        "memo_hits",
+        "nodes",
+        "scanned",
+        "rescanned",
+    ]
+
+    fields = tuple(__slots__)
+
+    def __init__(self) -> None:
+        self.calls: dict[str, int] = {}
+        self.no_matches: int = 0
+        self.memo_lookups: int = 0
+        self.memo_hits: int = 0
+        self.nodes: int = 0
+        self.scanned: int = 0
+        self.rescanned: int = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"<OperationCounts calls={self.total_calls} "
+            f"no_matches={self.no_matches} rescanned={self.rescanned}>"
+        )
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def as_dict(self) -> dict[str, Any]:
+        return {field: getattr(self, field) for field in self.fields}
+
+
+class OperationCounter(ParserTracer):
+    """
+    Counts the parsing engine operations of all parses while enabled:
+
+        with OperationCounter(parser) as counter:
+            parser.parse(content)
+        print(counter.counts.as_dict())
+
+    Attributes:
+        counts (OperationCounts): The counts.
+    """
+
+    def __init__(self, parser: Parser) -> None:
+        super().__init__(parser)
+        self.counts: OperationCounts = OperationCounts()
+        # Characters matched in the current input.
+        self._input: str | None = None
+        self._scanned: bytearray = bytearray()
+        self._memo_hit: bool = False
+
+    def reset(self) -> None:
+        self.counts = OperationCounts()
+        self._input = None
+
+    def enter(self, expression: ParsingExpression, parser: Parser) -> None:
+        counts = self.counts
+        name = type(expression).__name__
+        counts.calls[name] = counts.calls.get(name, 0) + 1
+        if parser.memoization and not isinstance(expression, Match):
+            counts.memo_lookups += 1
+
+    def memo_hit(self, expression: ParsingExpression, parser: Parser) -> None:
+        self.counts.memo_hits += 1
+        self._memo_hit = True
+
+    def match(
+        self, expression: ParsingExpression, parser: Parser, position: int, result: Any
+    ) -> None:
+        if self._memo_hit:
+            # The cached result is reused.
+            self._memo_hit = False
+            return
+        counts = self.counts
+        if isinstance(result, ParseTreeNode) and result.rule is expression:
+            counts.nodes += 1
+        if isinstance(expression, Match) and parser.position > position:
+            if parser.input is not self._input:
+                self._input = parser.input
+                self._scanned = bytearray(len(parser.input))
+            scanned, end = self._scanned, parser.position
+            counts.scanned += end - position
+            counts.rescanned += scanned.count(1, position, end)
+            scanned[position:end] = b"\x01" * (end - position)
+
+    def fail(self, expression: ParsingExpression, parser: Parser, position: int) -> None:
+        self._memo_hit = False
+        self.counts.no_matches += 1
+
+
+def count_operations(
+    parser: Parser, _input: str, file_name: str | None = None
+) -> OperationCounts:
+    """
+    Parses the input and returns the counts of the engine operations. A
+    failed parse raises `NoMatch` as usual.
+    """
+    with OperationCounter(parser) as counter:
+        parser.parse(_input, file_name)
+    return counter.counts
+
+
+def assert_operation_budget(counts: OperationCounts, **budget: int) -> None:
+    """
+    Asserts that the operation counts are within the budget, e.g.:
+
+        counts = count_operations(parser, content)
+        assert_operation_budget(counts, calls=12000, no_matches=3000)
+
+    Budget keys are `OperationCounts` fields, `calls` being the total of the
+    calls. A call budget of an expression type is given as `calls_<type>`,
+    e.g. `calls_RegExMatch=500`.
+
+    Raises:
+        AssertionError: Listing all the counts over the budget.
+    """
+    exceeded = []
+    for key, limit in budget.items():
+        if key == "calls":
+            count = counts.total_calls
+        elif key.startswith("calls_"):
+            count = counts.calls.get(key[len("calls_") :], 0)
+        elif key in counts.fields:
+            count = getattr(counts, key)
+        else:
+            raise ValueError(f'Unknown operation count "{key}".')
+        if count > limit:
+            exceeded.append(f"{key} = {count} > {limit}")
+    if exceeded:
+        raise AssertionError("Operation budget exceeded: " + ", ".join(exceeded))
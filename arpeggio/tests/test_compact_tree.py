@@ -0,0 +1,164 @@
+#######################################################################
+# Name: test_compact_tree
+# Purpose: Test compact, array-backed parse tree representation.
+# License: MIT License
+#######################################################################
+import gc
+import weakref
+
+import pytest
+
+from arpeggio import (
+    EOF,
+    NonTerminal,
+    OneOrMore,
+    Optional,
+    ParserPython,
+    PTNodeVisitor,
+    Terminal,
+    ZeroOrMore,
+    visit_parse_tree,
+)
+from arpeggio import RegExMatch as _
+from arpeggio.compact import CompactNonTerminal, CompactTerminal, CompactTree
+
+
+def number():
+    return _(r"\d*\.\d*|\d+")
+
+
+def factor():
+    return Optional(["+", "-"]), [number, ("(", expression, ")")]
+
+
+def term():
+    return factor, ZeroOrMore(["*", "/"], factor)
+
+
+def expression():
+    return term, ZeroOrMore(["+", "-"], term)
+
+
+def calc():
+    return OneOrMore(expression), EOF
+
+
+class CalcVisitor(PTNodeVisitor):
+    def visit_number(self, node, children):
+        return float(node.value)
+
+    def visit_factor(self, node, children):
+        if len(children) == 1:
+            return children[0]
+        sign = -1 if children[0] == "-" else 1
+        return sign * children[-1]
+
+    def visit_term(self, node, children):
+        term = children[0]
+        for i in range(2, len(children), 2):
+            if children[i - 1] == "*":
+                term *= children[i]
+            else:
+                term /= children[i]
+        return term
+
+    def visit_expression(self, node, children):
+        expr = children[0]
+        for i in range(2, len(children), 2):
+            if children[i - 1] == "-":
+                expr -= children[i]
+            else:
+                expr += children[i]
+        return expr
+
+
+INPUT = "-(4-1)*5+(2+4.67)+5.89/(.2+7)"
+
+
+@pytest.mark.parametrize("reduce_tree", [False, True])
+def test_compact_tree_same_as_parse_tree(reduce_tree):
+    parse_tree = ParserPython(calc, reduce_tree=reduce_tree).parse(INPUT)
+    compact = ParserPython(calc, reduce_tree=reduce_tree, compact_tree=True).parse(INPUT)
+
+    assert isinstance(compact, CompactNonTerminal)
+    assert isinstance(compact, NonTerminal)
+    assert compact.tree_str() == parse_tree.tree_str()
+    assert repr(compact) == repr(parse_tree)
+    assert str(compact) == str(parse_tree)
+    assert compact.position_end == parse_tree.position_end == len(INPUT)
+
+
+def test_compact_tree_visit():
+    parse_tree = ParserPython(calc, compact_tree=True).parse(INPUT)
+
+    result = visit_parse_tree(parse_tree, CalcVisitor())
+
+    assert result == pytest.approx(-7.51194444444)
+
+
+def test_compact_tree_navigation():
+    root = ParserPython(calc, compact_tree=True).parse("2 * 3 + 4")
+
+    assert len(root.expression) == 1
+    assert [n.value for n in root.expression.term.factor.number] == ["2", "3", "4"]
+
+    number_view = root.expression.term[0].factor[0].number[0]
+    assert isinstance(number_view, CompactTerminal)
+    assert isinstance(number_view, Terminal)
+    assert (number_view.position, number_view.position_end) == (0, 1)
+
+    tree = root.compact_tree
+    assert isinstance(tree, CompactTree)
+    assert tree.parent(root) is None
+    assert tree.parent(number_view).rule_name == "factor"
+    assert tree.node(0).rule_name == "calc"
+    assert root.line_index.linecol(8) == (1, 9)
+
+
+def test_compact_tree_arrays():
+    parse_tree = ParserPython(calc).parse("1+2")
+
+    tree = CompactTree.from_parse_tree(parse_tree, "1+2")
+
+    # calc, expression, 2x(term, factor, number), '+' and EOF
+    assert len(tree) == 10
+    assert tree.parents[0] == -1
+    assert tree.next_siblings[0] == -1
+    assert tree.first_children[0] == 1
+    assert list(tree.starts) == [0, 0, 0, 0, 0, 1, 2, 2, 2, 3]
+    assert list(tree.ends) == [3, 3, 1, 1, 1, 2, 3, 3, 3, 3]
+    assert [tree.rules[r].rule_name for r in tree.rule_ids[:3]] == [
+        "calc",
+        "expression",
+        "term",
+    ]
+
+
+def test_compact_tree_keeps_terminal_values():
+    def grammar():
+        return "select", _(r"\w+"), EOF
+
+    parser = ParserPython(grammar, ignore_case=True, compact_tree=True)
+
+    root = parser.parse("SELECT abc")
+
+    # Case insensitive match has the grammar string as value.
+    assert root[0].value == "select"
+    assert root[1].value == "abc"
+    assert root.compact_tree.values == {1: "select"}
+
+
+def test_compact_tree_views_not_kept():
+    root = ParserPython(calc, compact_tree=True).parse(INPUT)
+
+    expression = root[0]
+    assert root[0] is expression
+    assert expression in root
+    assert [n.rule_name for n in reversed(root)] == ["EOF", "expression"]
+
+    view = weakref.ref(expression)
+    visit_parse_tree(root, CalcVisitor())
+    del expression
+    gc.collect()
+    assert view() is None
+    assert root[0] == ParserPython(calc).parse(INPUT)[0]
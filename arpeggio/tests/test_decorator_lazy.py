@@ -0,0 +1,216 @@
+#######################################################################
+# Name: test_decorator_lazy
+# Purpose: Test for Lazy decorator. Lazy decorator results in
+#           LazyNonTerminal parse tree node whose subtree is parsed on
+#           the first access.
+# License: MIT License
+#######################################################################
+
+import pytest
+
+from arpeggio import (
+    EOF,
+    GrammarError,
+    Lazy,
+    LazyNonTerminal,
+    NoMatch,
+    OneOrMore,
+    ParserPython,
+    PTNodeVisitor,
+    ZeroOrMore,
+    expand_lazy,
+    visit_parse_tree,
+)
+from arpeggio import RegExMatch as _
+from arpeggio.cleanpeg import ParserPEG
+
+
+def ident():
+    return _(r"[a-z]\w*")
+
+
+def string():
+    return _(r'"[^"]*"')
+
+
+def statement():
+    return ident, "=", [ident, string, block], ";"
+
+
+def block():
+    return "{", ZeroOrMore(statement), "}"
+
+
+def function():
+    return "def", ident, Lazy(block)
+
+
+def program():
+    return OneOrMore(function), EOF
+
+
+def eager_function():
+    return "def", ident, block
+
+
+def eager_program():
+    return OneOrMore(eager_function), EOF
+
+
+INPUT = """
+def f { a = b; c = "}"; }
+def g { x = { y = "{"; }; }
+"""
+
+
+@pytest.fixture
+def parser():
+    return ParserPython(program)
+
+
+def test_lazy_block_not_parsed(parser):
+    parse_tree = parser.parse(INPUT)
+
+    body = parse_tree[0][2]
+    assert isinstance(body, LazyNonTerminal)
+    assert not body.expanded
+    assert body.rule_name == "block"
+    assert body.position == INPUT.index("{")
+    # Braces in strings are skipped.
+    assert body.position_end == INPUT.index("\n", 1)
+    assert parse_tree[1].position_end == len(INPUT.rstrip())
+    assert not body.expanded
+
+
+def test_lazy_block_not_parsed_reduce_tree():
+    def body():
+        return Lazy(block)
+
+    def reduced_function():
+        return "def", ident, body
+
+    def reduced_program():
+        return OneOrMore(reduced_function), EOF
+
+    parse_tree = ParserPython(reduced_program, reduce_tree=True).parse(INPUT)
+
+    body_node = parse_tree[0][2]
+    assert isinstance(body_node, LazyNonTerminal)
+    assert not body_node.expanded
+    assert [n.value for n in body_node.statement.ident] == ["a", "b", "c"]
+
+
+def test_lazy_block_parsed_on_access(parser):
+    parse_tree = parser.parse(INPUT)
+
+    body = parse_tree[1][2]
+    assert [n.value for n in body.statement.ident] == ["x"]
+    assert body.expanded
+    assert not parse_tree[0][2].expanded
+
+    eager = ParserPython(eager_program).parse(INPUT)
+    expand_lazy(parse_tree)
+    assert parse_tree.tree_str() == eager.tree_str().replace("eager_", "")
+
+
+def test_lazy_block_visit(parser):
+    class Visitor(PTNodeVisitor):
+        def visit_statement(self, node, children):
+            return children[0]
+
+        def visit_block(self, node, children):
+            return list(children)
+
+        def visit_function(self, node, children):
+            return (children[0], children[1])
+
+        def visit_program(self, node, children):
+            return list(children)
+
+    result = visit_parse_tree(parser.parse(INPUT), Visitor())
+
+    assert result == [("f", ["a", "c"]), ("g", ["x"])]
+
+
+def test_lazy_block_errors(parser):
+    with pytest.raises(NoMatch) as e:
+        parser.parse("def f { a = b; ")
+    assert e.value.position == 15
+
+    parse_tree = parser.parse("def f { a = ; }\ndef g { }")
+    # Errors in the lazy block are reported on the first access.
+    with pytest.raises(NoMatch) as e:
+        parse_tree[0][2].expand()
+    assert (e.value.line, e.value.col) == (1, 13)
+    assert parse_tree[1][2].expanded is False
+
+
+def test_lazy_block_scanned_wrong():
+    def comment():
+        return _(r"//.*")
+
+    parser = ParserPython(program, comment)
+    # The apostrophe in the comment is scanned as a string start.
+    parse_tree = parser.parse("def f { a = b; // don't\n }\ndef g { c = \"it's\"; }")
+    assert len(parse_tree) == 2
+
+    with pytest.raises(GrammarError) as e:
+        parse_tree[0][2].expand()
+    assert "scanned block ends at (3, 22)" in str(e.value)
+    assert parse_tree[0][2].expanded is False
+
+
+def test_lazy_expansion_keeps_parser_state(parser):
+    parse_tree = parser.parse(INPUT)
+    other = parser.parse("\n\n\ndef h { }")
+
+    expand_lazy(parse_tree)
+
+    assert parser.input == "\n\n\ndef h { }"
+    assert parser.pos_to_linecol(other[0].position) == (4, 1)
+    assert parse_tree[0][2].statement[0].ident[0].value == "a"
+
+
+def test_lazy_explicit_delimiters():
+    def body():
+        return "begin", ZeroOrMore(statement), "end"
+
+    def procedure():
+        return "proc", ident, Lazy(body, open="begin", close="end")
+
+    def unit():
+        return OneOrMore(procedure), EOF
+
+    parser = ParserPython(unit)
+    parse_tree = parser.parse('proc p begin x = "end"; ending = y; end proc q begin end')
+
+    assert parse_tree[0][2].flat_str() == 'beginx="end";ending=y;end'
+    assert len(parse_tree[1][2]) == 2
+
+
+def test_lazy_delimiters_not_inferred():
+    def items():
+        return OneOrMore(ident)
+
+    def root():
+        return Lazy(items), EOF
+
+    with pytest.raises(GrammarError):
+        ParserPython(root).parse("a b")
+
+
+def test_lazy_peg():
+    grammar = r"""
+    ident = r'[a-z]\w*'
+    string = r'"[^"]*"'
+    statement = ident "=" (ident / string / block) ";"
+    block = "{" statement* "}"
+    function = "def" ident ~block
+    program = function+ EOF
+    """
+    parse_tree = ParserPEG(grammar, "program").parse(INPUT)
+
+    body = parse_tree[1][2]
+    assert isinstance(body, LazyNonTerminal)
+    assert not body.expanded
+    assert [n.value for n in body.statement.ident] == ["x"]
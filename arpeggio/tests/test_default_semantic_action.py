@@ -75,3 +75,17 @@ def test_default_action_disabled():
     assert not p_removed
     assert not number_str
     assert parse_tree_node
+
+
+@pytest.mark.parametrize("defaults", [True, False])
+def test_default_action_debug(defaults, capsys):
+    parser = ParserPython(grammar)
+    parser.parse("(-34) strmatch")
+    asg = parser.getASG(defaults=defaults)
+
+    parser.debug = True
+    assert repr(parser.getASG(defaults=defaults)) == repr(asg)
+
+    out = capsys.readouterr().out
+    assert "Applying semantic action ParenthesesSA" in out
+    assert ("Applying default semantic action." in out) == defaults
@@ -0,0 +1,175 @@
+#######################################################################
+# Name: test_generator
+# Purpose: Test random input generation from the parser model.
+# License: MIT License
+#######################################################################
+import random
+import re
+
+import pytest
+
+from arpeggio import (
+    EOF,
+    GrammarError,
+    Match,
+    Not,
+    OneOrMore,
+    Optional,
+    ParserPython,
+    ZeroOrMore,
+)
+from arpeggio import RegExMatch as _
+from arpeggio import generator as generator_module
+from arpeggio.cleanpeg import ParserPEG
+from arpeggio.generator import InputGenerator, generate, sample_regex
+from arpeggio.trace import Tracer
+
+
+def number():
+    return _(r"\d*\.\d+|\d+")
+
+
+def factor():
+    return Optional(["+", "-"]), [number, ("(", expression, ")")]
+
+
+def term():
+    return factor, ZeroOrMore(["*", "/"], factor)
+
+
+def expression():
+    return term, ZeroOrMore(["+", "-"], term)
+
+
+def calc():
+    return OneOrMore(expression), EOF
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        r"\d*\.\d+|\d+",
+        r"[a-zA-Z_]\w*",
+        r'"(\\"|[^"])*"',
+        r"[^,\n]+",
+        r"(ab|c){2,3}\1",
+        r"(?i)x[^\d\s]?.{0,4}",
+        r"[-+]?[0-9]+\b",
+    ],
+)
+def test_sample_regex(pattern):
+    rnd = random.Random(0)
+    for _i in range(100):
+        assert re.fullmatch(pattern, sample_regex(pattern, rnd=rnd))
+
+
+def test_sample_regex_without_regex_parser(monkeypatch):
+    monkeypatch.setattr(generator_module, "_sre_parse", None)
+    generator_module._parse_regex.cache_clear()
+
+    with pytest.raises(GrammarError, match="needs the regular expression parser"):
+        sample_regex(r"[a-z]+x")
+
+
+def test_generate_valid_input():
+    parser = ParserPython(calc)
+    text = generate(parser, seed=1)
+
+    assert parser.parse(text)
+    assert generate(parser, seed=1) == text
+
+
+def test_generate_size():
+    parser = ParserPython(calc)
+    text = InputGenerator(parser, seed=1, size=2000).generate()
+
+    assert len(text) >= 2000
+    assert parser.parse(text)
+
+
+def test_generate_depth():
+    parser = ParserPython(calc)
+    shallow = InputGenerator(parser, seed=1).generate()
+    deep = InputGenerator(parser, seed=1, depth=20).generate()
+
+    def nesting(text):
+        depth = max_depth = 0
+        for char in text:
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            max_depth = max(max_depth, depth)
+        return max_depth
+
+    assert nesting(shallow) == 0
+    # Each parenthesis nests expression, term and factor rules.
+    assert nesting(deep) >= 5
+
+
+def test_generate_not_predicate():
+    def keyword():
+        return ["if", "else"]
+
+    def name():
+        return Not(keyword), _(r"[a-z]+")
+
+    def names():
+        return OneOrMore(name), EOF
+
+    parser = ParserPython(names)
+    for seed in range(5):
+        generator = InputGenerator(parser, seed=seed, size=500, repeat=(1, 5))
+        assert parser.parse(generator.generate(validate=False))
+
+
+def test_generate_during_parse():
+    def keyword():
+        return ["if", "else"]
+
+    def name():
+        return Not(keyword), _(r"[a-z]+")
+
+    def names():
+        return OneOrMore(name), EOF
+
+    parser = ParserPython(names)
+    generated = []
+
+    class Generating(Tracer):
+        def enter(self, expression, parser):
+            if not generated:
+                generated.append(None)
+                # Predicates are checked by parsing with the same parser.
+                generated[0] = InputGenerator(parser, seed=1).generate(validate=False)
+
+    parser.tracer = Generating()
+    tree = parser.parse("ab cd")
+
+    assert tree.flat_str() == "abcd"
+    assert parser.input == "ab cd"
+    parser.tracer = None
+    assert parser.parse(generated[0])
+
+
+def test_generate_peg():
+    parser = ParserPEG(
+        """
+        document = list EOF
+        list = "[" (item ("," item)*)? "]"
+        item = r'[0-9]+' / list
+        """,
+        "document",
+    )
+    text = InputGenerator(parser, seed=2, depth=6).generate()
+    assert parser.parse(text)
+    assert text.count("[") > 1
+
+
+def test_generate_unknown_match():
+    class Custom(Match):
+        def _parse(self, parser):
+            return parser._nm_raise(self, parser.position, parser)
+
+    def custom():
+        return Custom("custom"), EOF
+
+    with pytest.raises(GrammarError, match="Can't generate input"):
+        generate(ParserPython(custom))
@@ -0,0 +1,139 @@
+#######################################################################
+# Name: test_index
+# Purpose: Test indexes over finished parse trees.
+# License: MIT License
+#######################################################################
+import pytest
+
+from arpeggio import EOF, NonTerminal, OneOrMore, ParserPython, ZeroOrMore
+from arpeggio import RegExMatch as _
+from arpeggio.index import IntervalIndex, RuleIndex
+
+
+def identifier():
+    return _(r"[a-zA-Z_]\w*")
+
+
+def field():
+    return identifier, ";"
+
+
+def method():
+    return identifier, "(", ZeroOrMore(identifier, sep=","), ")", "{", "}"
+
+
+def class_decl():
+    return "class", identifier, "{", ZeroOrMore([class_decl, method, field]), "}"
+
+
+def module():
+    return OneOrMore(class_decl), EOF
+
+
+INPUT = """
+class A {
+    x;
+    f(a, b) {}
+    class B {
+        y;
+    }
+}
+class C {
+    g() {}
+}
+"""
+
+
+def walk(node):
+    yield node
+    if isinstance(node, NonTerminal):
+        for child in node:
+            yield from walk(child)
+
+
+@pytest.fixture
+def parse_tree():
+    return ParserPython(module, rule_index=True).parse(INPUT)
+
+
+def test_rule_index_nodes(parse_tree):
+    index = parse_tree.rule_index
+
+    assert isinstance(index, RuleIndex)
+    assert index.root is parse_tree
+    assert len(index) == len(list(walk(parse_tree)))
+    for rule_name in ["class_decl", "identifier", "method", "field"]:
+        expected = [n for n in walk(parse_tree) if n.rule_name == rule_name]
+        assert index.nodes(rule_name) == expected
+        assert index.count(rule_name) == len(expected)
+    assert [n.identifier.value for n in index.nodes("class_decl")] == ["A", "B", "C"]
+    assert index.nodes("missing") == []
+
+
+def test_rule_index_descendants(parse_tree):
+    index = parse_tree.rule_index
+    class_a, class_b, class_c = index.nodes("class_decl")
+
+    assert [n.value for n in index.descendants(class_a, "identifier")] == [
+        "A",
+        "x",
+        "f",
+        "a",
+        "b",
+        "B",
+        "y",
+    ]
+    assert [n.value for n in index.descendants(class_c, "identifier")] == ["C", "g"]
+    assert index.descendants(class_b, "method") == []
+    assert index.descendants(class_b) == list(walk(class_b))[1:]
+
+
+def test_rule_index_ancestors(parse_tree):
+    index = parse_tree.rule_index
+    class_a, class_b, _ = index.nodes("class_decl")
+    y = index.descendants(class_b, "identifier")[1]
+
+    assert index.parent(parse_tree) is None
+    assert index.parent(y).rule_name == "field"
+    assert index.ancestors(y) == [index.parent(y), class_b, class_a, parse_tree]
+    assert index.enclosing(y, "class_decl") is class_b
+    assert index.enclosing(class_b, "class_decl") is class_a
+    assert index.enclosing(class_a, "class_decl") is None
+    assert index.is_ancestor(class_a, y)
+    assert not index.is_ancestor(y, class_a)
+    assert y in index
+
+    with pytest.raises(ValueError):
+        index.parent(ParserPython(module).parse(INPUT))
+
+
+def test_interval_index_innermost(parse_tree):
+    index = IntervalIndex(parse_tree)
+    nodes = list(walk(parse_tree))
+
+    for offset in range(len(INPUT) + 1):
+        covering = [n for n in nodes if n.position <= offset < n.position_end]
+        expected = covering[-1] if covering else None
+        assert index.innermost(offset) is expected
+        assert index.enclosing(offset) == list(reversed(covering))
+
+
+def test_interval_index_spans(parse_tree):
+    index = IntervalIndex(parse_tree)
+    offset = INPUT.index("b)")
+
+    b = index.innermost(offset)
+    assert b.rule_name == "identifier"
+    assert b.value == "b"
+    assert [n.rule_name for n in index.enclosing(offset)] == [
+        "identifier",
+        "method",
+        "class_decl",
+        "module",
+    ]
+    assert index.span(b) == (offset, offset + 1)
+    assert index.span(parse_tree) == (parse_tree.position, parse_tree.position_end)
+    # Whitespace between the nodes is covered only by the parents.
+    assert index.innermost(INPUT.index("{") + 1).rule_name == "class_decl"
+    assert index.innermost(0) is None
+    assert index.enclosing(len(INPUT)) == []
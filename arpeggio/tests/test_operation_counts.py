@@ -0,0 +1,197 @@
+#######################################################################
+# Name: test_operation_counts
+# Purpose: Test deterministic counts of parsing engine operations and
+#          keep the example grammars within operation budgets.
+# License: MIT License
+#######################################################################
+import importlib.util
+import os
+
+import pytest
+
+from arpeggio import EOF, OneOrMore, ParserPython
+from arpeggio import RegExMatch as _
+from arpeggio.stats import (
+    OperationCounter,
+    OperationCounts,
+    assert_operation_budget,
+    count_operations,
+)
+
+EXAMPLES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "examples"
+)
+
+
+def number():
+    return _(r"\d+")
+
+
+def call():
+    return number, "(", number, ")"
+
+
+def item():
+    return [call, number]
+
+
+def items():
+    return OneOrMore(item), EOF
+
+
+def nested():
+    # Without memoization each level parses the nested ones twice.
+    return [("(", nested, ")", "!"), ("(", nested, ")"), number]
+
+
+def test_operation_counts():
+    counts = count_operations(ParserPython(items), "12 3(4)")
+
+    assert counts.calls == {
+        "Sequence": 4,
+        "OneOrMore": 1,
+        "OrderedChoice": 3,
+        "RegExMatch": 6,
+        "StrMatch": 3,
+        "EndOfFile": 1,
+    }
+    assert counts.total_calls == 18
+    assert counts.no_matches == 6
+    assert counts.memo_lookups == 0
+    assert counts.nodes == 10
+    # `12` is matched by `call` and again by `number` after backtracking.
+    assert counts.scanned == 8
+    assert counts.rescanned == 2
+
+
+def test_operation_counts_memoization():
+    parser = ParserPython(nested, memoization=True)
+    with OperationCounter(parser) as counter:
+        parser.parse("((1))")
+        memo = counter.counts
+        counter.reset()
+        parser.memoization = False
+        parser.parse("((1))")
+
+    assert memo.memo_hits > 0
+    assert memo.memo_lookups == memo.calls["Sequence"] + memo.calls["OrderedChoice"]
+    assert counter.counts.memo_lookups == 0
+    assert counter.counts.total_calls > memo.total_calls
+    assert counter.counts.rescanned > memo.rescanned
+    assert isinstance(counter.counts, OperationCounts)
+
+
+def test_exponential_backtracking_caught():
+    def calls(depth, memoization):
+        parser = ParserPython(nested, memoization=memoization)
+        return count_operations(parser, "(" * depth + "1" + ")" * depth).total_calls
+
+    # The calls grow exponentially with the depth without memoization.
+    assert calls(10, False) > 20 * calls(5, False)
+    assert calls(10, True) < 3 * calls(5, True)
+
+    counts = count_operations(ParserPython(nested), "(" * 12 + "1" + ")" * 12)
+    with pytest.raises(AssertionError, match="calls = [0-9]+ > 1000"):
+        assert_operation_budget(counts, calls=1000)
+
+
+def test_assert_operation_budget():
+    counts = count_operations(ParserPython(items), "12 3(4)")
+
+    assert_operation_budget(counts, calls=18, calls_StrMatch=3, rescanned=2)
+    with pytest.raises(AssertionError) as e:
+        assert_operation_budget(counts, calls_RegExMatch=5, no_matches=5, nodes=10)
+    assert str(e.value) == (
+        "Operation budget exceeded: calls_RegExMatch = 6 > 5, no_matches = 6 > 5"
+    )
+    with pytest.raises(ValueError, match='Unknown operation count "time"'):
+        assert_operation_budget(counts, time=1)
+
+
+def load_example(example, module):
+    spec = importlib.util.spec_from_file_location(
+        f"example_{module}", os.path.join(EXAMPLES, example, f"{module}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_example(example, file_name):
+    with open(os.path.join(EXAMPLES, example, file_name), encoding="utf-8") as f:
+        return f.read()
+
+
+def calc_parser():
+    return ParserPython(load_example("calc", "calc").calc)
+
+
+def calc_peg_parser():
+    from arpeggio.cleanpeg import ParserPEG
+
+    return ParserPEG(read_example("calc", "calc_clean.peg"), "calc")
+
+
+def json_parser():
+    return ParserPython(load_example("json", "json").jsonFile)
+
+
+def csv_parser():
+    return ParserPython(load_example("csv", "csvlang").csvfile, ws="\t ")
+
+
+def bibtex_parser():
+    return ParserPython(load_example("bibtex", "bibtex").bibfile)
+
+
+def robot_parser():
+    return ParserPython(load_example("robot", "robot").robot)
+
+
+def simple_parser():
+    simple = load_example("simple", "simple")
+    return ParserPython(simple.simpleLanguage, simple.comment)
+
+
+def peg_parser():
+    from arpeggio import peg
+
+    return ParserPython(peg.peggrammar, peg.comment)
+
+
+# Budgets are the counts of the current engine with about 10% headroom.
+# Example inputs are parsed without rescanning any characters.
+BUDGETS = {
+    "calc": dict(calls=220, no_matches=110, nodes=52, rescanned=0),
+    "json": dict(calls=430, no_matches=103, nodes=288, rescanned=0),
+    "csv": dict(calls=158, no_matches=57, nodes=75, rescanned=0),
+    "bibtex": dict(calls=666, no_matches=139, nodes=468, rescanned=0),
+    "robot": dict(calls=29, no_matches=13, nodes=15, rescanned=0),
+    "simple": dict(calls=217, no_matches=141, nodes=64, rescanned=0),
+    "peg_peg": dict(calls=1655, no_matches=1110, nodes=368, rescanned=0),
+}
+
+
+@pytest.mark.parametrize(
+    "make_parser, example, file_name",
+    [
+        (calc_parser, "calc", None),
+        (calc_peg_parser, "calc", None),
+        (json_parser, "json", "test.json"),
+        (csv_parser, "csv", "test_data.csv"),
+        (bibtex_parser, "bibtex", "bibtex_example.bib"),
+        (robot_parser, "robot", "program.rbt"),
+        (simple_parser, "simple", "program.simple"),
+        (peg_parser, "peg_peg", "peg.peg"),
+    ],
+)
+def test_example_budgets(make_parser, example, file_name):
+    if not os.path.exists(EXAMPLES):
+        pytest.skip("Examples not found.")
+    if file_name is None:
+        content = "-(4-1)*5+(2+4.67)+5.89/(.2+7)"
+    else:
+        content = read_example(example, file_name)
+
+    counts = count_operations(make_parser(), content)
+    assert_operation_budget(counts, **BUDGETS[example])
@@ -0,0 +1,161 @@
+#######################################################################
+# Name: test_parse_stats
+# Purpose: Test metrics collected for a single parse.
+# License: MIT License
+#######################################################################
+import io
+import json
+
+import pytest
+
+from arpeggio import EOF, Lazy, NoMatch, OneOrMore, ParserPython, ZeroOrMore
+from arpeggio import RegExMatch as _
+from arpeggio.stats import ParseStats, tree_memory
+from arpeggio.trace import Tracer
+
+
+def number():
+    return _(r"\d+")
+
+
+def group():
+    return "(", ZeroOrMore(value), ")"
+
+
+def value():
+    return [number, group]
+
+
+def values():
+    return OneOrMore(value), EOF
+
+
+def comment():
+    return _(r"#.*")
+
+
+def test_parse_stats():
+    parser = ParserPython(values, comment, memoization=True)
+    tree, stats = parser.parse("1 (2 # two\n (3)) # end", stats=True)
+
+    assert isinstance(stats, ParseStats)
+    assert parser.parse_stats is stats
+    assert tree.flat_str() == "1(2(3))"
+    assert stats.matched
+    assert stats.input_size == 22
+    assert stats.wall_time > 0
+    assert stats.throughput == stats.input_size / stats.wall_time
+    assert stats.nodes == {"NonTerminal": 8, "Terminal": 8}
+    # values > value > group > value > group > value > number
+    assert stats.max_depth == 7
+    assert stats.attempts > stats.no_matches > 0
+    assert stats.cache_misses > 0
+    assert stats.memo_entries == stats.cache_misses
+    assert stats.memo_size > 0
+    assert stats.comments == 2
+
+    data = json.loads(stats.to_json())
+    assert data["nodes"] == stats.nodes
+    assert list(data) == list(ParseStats.fields)
+
+
+def test_parse_stats_failed_parse():
+    parser = ParserPython(values)
+    with pytest.raises(NoMatch):
+        parser.parse("1 (2", stats=True)
+
+    stats = parser.parse_stats
+    assert not stats.matched
+    assert stats.nodes == {}
+    assert stats.no_matches > 0
+    assert stats.memo_entries == 0
+
+
+def test_parse_stats_lazy_not_expanded():
+    def lazy_values():
+        return OneOrMore(Lazy(group)), EOF
+
+    parser = ParserPython(lazy_values)
+    tree, stats = parser.parse("(1 2) (3)", stats=True)
+
+    assert stats.nodes == {"NonTerminal": 1, "LazyNonTerminal": 2, "Terminal": 1}
+    assert not tree[0].expanded
+
+
+def test_parse_stats_keeps_tracer():
+    class Counter(Tracer):
+        attempts = 0
+
+        def enter(self, expression, parser):
+            self.attempts += 1
+
+    counter = Counter()
+    parser = ParserPython(values, tracer=counter)
+    _, stats = parser.parse("1 2", stats=True)
+
+    assert counter.attempts == stats.attempts
+    assert parser.tracer is counter
+    assert parser.parse("1 2")
+    assert counter.attempts == 2 * stats.attempts
+
+
+def test_parse_stats_single_parse(monkeypatch):
+    parser = ParserPython(values)
+    parses = []
+    parse = parser._parse
+
+    def counted_parse():
+        parses.append(parser._engine_tracer)
+        return parse()
+
+    monkeypatch.setattr(parser, "_parse", counted_parse)
+    _, stats = parser.parse("1 2", stats=True)
+
+    assert stats.attempts > 0
+    # The counted parse is the timed one.
+    assert len(parses) == 1
+    assert parses[0] is not None
+    assert parser._engine_tracer is None
+
+
+def test_parse_stats_debug_output():
+    output = io.StringIO()
+    parser = ParserPython(values, debug=True, file=output)
+    output.seek(0)
+    output.truncate()
+    _, stats = parser.parse("1 2", stats=True)
+
+    lines = output.getvalue().splitlines()
+    assert stats.attempts > 0
+    assert lines[0].startswith(">> Matching rule values=Sequence at position 0")
+
+
+def test_tree_memory():
+    parser = ParserPython(values, comment)
+    tree = parser.parse("1 (2 # two\n (3)) # end")
+    memory = tree_memory(tree, parser)
+
+    assert memory.nodes == 18
+    assert memory.size == (
+        memory.node_size
+        + memory.value_size
+        + memory.extra_info_size
+        + memory.comment_size
+        + memory.comment_positions_size
+    )
+    assert memory.extra_info_size > 0
+    assert memory.comment_size > 0
+    assert memory.comment_positions_size > 0
+    # Parenthesis terminals are attributed to `group`.
+    assert memory.rules["group"].nodes == 6
+    assert memory.rules["comment"].nodes == 2
+    assert sum(rule.size for rule in memory.rules.values()) == (
+        memory.size - memory.comment_positions_size
+    )
+    assert memory.top(1)[0].size == max(rule.size for rule in memory.rules.values())
+    assert memory.report().startswith(f"Parse tree: 18 nodes, {memory.size} bytes")
+
+    # Without the parser the comments are not measured.
+    assert tree_memory(tree).size == memory.size - (
+        memory.comment_size + memory.comment_positions_size
+    )
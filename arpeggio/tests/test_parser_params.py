@@ -10,7 +10,8 @@ import sys
 
 import pytest
 
-from arpeggio import NoMatch, ParserPython
+from arpeggio import LazyTerminal, NoMatch, ParserPython
+from arpeggio import RegExMatch as _
 
 
 def test_autokwd():
@@ -108,3 +109,49 @@ def test_file(capsys):
     out, err = capsys.readouterr()
     assert out == ""
     assert err == "this is stderr\n"
+
+
+def test_lazy_terminals():
+    """
+    lazy_terminals will produce terminals which keep only their span and
+    captured groups instead of re.Match object.
+    """
+
+    def grammar():
+        return "let", name, "=", value
+
+    def name():
+        return _(r"\w+")
+
+    def value():
+        return _(r"(\d+)\.(\d+)")
+
+    input_str = "let pi = 3.14"
+
+    parser = ParserPython(grammar, lazy_terminals=True)
+    result = parser.parse(input_str)
+
+    name_node, value_node = result[1], result[3]
+    assert isinstance(name_node, LazyTerminal)
+    assert name_node.value == "pi"
+    assert (name_node.position, name_node.position_end) == (4, 6)
+    assert name_node.extra_info is None
+    assert value_node.value == str(value_node) == "3.14"
+    assert value_node.extra_info == ("3", "14")
+    # String matches are not affected
+    assert not isinstance(result[0], LazyTerminal)
+    assert str(result) == str(ParserPython(grammar).parse(input_str))
+
+
+def test_lazy_terminals_keep_match():
+    """
+    Match objects can be kept for particular regex rules.
+    """
+
+    def grammar():
+        return _(r"(\d+)-(\d+)", keep_match=True), _(r"\w+")
+
+    result = ParserPython(grammar, lazy_terminals=True).parse("1-2 a")
+
+    assert result[0].extra_info.group(2) == "2"
+    assert result[1].extra_info is None
@@ -0,0 +1,113 @@
+#######################################################################
+# Name: test_parser_reentrancy
+# Purpose: Test reentrant parsing and the shared PEG meta-parser.
+# License: MIT License
+#######################################################################
+import threading
+
+import pytest
+
+from arpeggio import EOF, Match, NoMatch, OneOrMore, ParserPython, Terminal, cleanpeg, peg
+from arpeggio import RegExMatch as _
+
+nested_errors = []
+
+
+class Embedded(Match):
+    """
+    Matches a bracketed fragment and parses its content with the same parser.
+    """
+
+    def _parse(self, parser):
+        c_pos = parser.position
+        end = parser.input.find("]", c_pos)
+        if not parser.input.startswith("[", c_pos) or end < 0:
+            parser._nm_raise(self, c_pos, parser)
+        try:
+            inner = parser.parse(parser.input[c_pos + 1 : end])
+        except NoMatch as e:
+            nested_errors.append(e)
+            parser._nm_raise(self, c_pos, parser)
+        parser.position = end + 1
+        t = Terminal(self, c_pos, parser.input[c_pos : end + 1])
+        t.extra_info = inner
+        return t
+
+
+def item():
+    return [Embedded(rule_name="embedded"), number]
+
+
+def number():
+    return _(r"\d+")
+
+
+def items():
+    return OneOrMore(item), EOF
+
+
+@pytest.mark.parametrize("memoization", [False, True])
+def test_reentrant_parse(memoization):
+    parser = ParserPython(items, memoization=memoization)
+
+    result = parser.parse("1 [2 3] 4 [5]")
+
+    assert parser.input == "1 [2 3] 4 [5]"
+    assert parser.parse_tree is result
+    assert [n.value for n in result] == ["1", "[2 3]", "4", "[5]", ""]
+    assert str(result[1][0].extra_info) == "2 | 3 | "
+    assert result[3][0].position == 10
+
+
+def test_reentrant_parse_error_refers_to_nested_input():
+    parser = ParserPython(items)
+    del nested_errors[:]
+
+    with pytest.raises(NoMatch) as e:
+        parser.parse("1\n[2 x]")
+
+    assert (e.value.line, e.value.col) == (2, 1)
+    assert parser.input == "1\n[2 x]"
+    nested = nested_errors[0]
+    assert "=> '2 *x'" in str(nested)
+    assert (nested.line, nested.col) == (1, 3)
+
+
+def test_meta_parser_is_shared():
+    peg.ParserPEG("a <- 'a'* EOF;", "a")
+    peg.ParserPEG("b <- 'b'+ EOF;", "b")
+    cleanpeg.ParserPEG("a = 'a'* EOF", "a")
+
+    assert len(peg._meta_parsers) == 2
+    assert peg._meta_parsers[peg.peggrammar] is peg.get_meta_parser(
+        peg.peggrammar, peg.comment
+    )
+
+
+def test_meta_parser_error_detached():
+    with pytest.raises(NoMatch) as e:
+        peg.ParserPEG("a <- 'a' EOF", "a")
+
+    peg.ParserPEG("b <- 'b'+ EOF;", "b")
+
+    assert "at position (1, 13) => '<- 'a' EOF*'" in str(e.value)
+
+
+def test_meta_parser_thread_safe():
+    errors = []
+
+    def build(i):
+        try:
+            for _ in range(20):
+                parser = cleanpeg.ParserPEG(f"r{i} = 'x{i}'+ EOF", f"r{i}")
+                assert parser.parse(f"x{i} x{i}")[0].value == f"x{i}"
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=build, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
@@ -7,7 +7,7 @@
 #######################################################################
 import pytest
 
-from arpeggio import ParserPython
+from arpeggio import LineIndex, ParserPython
 
 
 @pytest.fixture
@@ -48,3 +48,61 @@ def test_pos_to_linecol():
     assert parser.pos_to_linecol(b_pos) == (4, 2)
     c_pos = parse_tree[2].position
     assert parser.pos_to_linecol(c_pos) == (5, 1)
+    # Kept for backward compatibility.
+    assert parser.line_ends == [1, 2, 3, 6]
+    assert parser.line_ends is parser.line_index.line_ends
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+def test_pos_to_linecol_newlines(newline):
+    def grammar():
+        return ("a", "b", "c")
+
+    parser = ParserPython(grammar)
+
+    parse_tree = parser.parse(newline.join(["a", "", " b", "c"]))
+
+    assert parser.pos_to_linecol(parse_tree[0].position) == (1, 1)
+    assert parser.pos_to_linecol(parse_tree[1].position) == (3, 2)
+    assert parser.pos_to_linecol(parse_tree[2].position) == (4, 1)
+    # Line terminator belongs to the line it terminates.
+    assert parser.pos_to_linecol(1) == (1, 2)
+
+
+def test_line_index_attached_to_tree():
+    def grammar():
+        return ("a", "b", "c")
+
+    parse_tree = ParserPython(grammar).parse("a\n\n\n b\nc")
+
+    line_index = parse_tree.line_index
+    assert isinstance(line_index, LineIndex)
+    assert line_index.line_count == 5
+    assert line_index.linecol(parse_tree[1].position) == (4, 2)
+
+    lines, cols = line_index.linecols([n.position for n in parse_tree])
+    assert lines == [1, 4, 5]
+    assert cols == [1, 2, 1]
+
+    lines, cols = line_index.linecols(n.position for n in parse_tree)
+    assert lines == [1, 4, 5]
+    assert cols == [1, 2, 1]
+
+
+def test_line_index_line_ends():
+    line_index = LineIndex("a\r\n\r\n b\rc\n")
+
+    assert line_index.line_ends == [2, 4, 9]
+    assert line_index.line_ends is line_index.line_ends
+
+
+def test_line_index_numpy():
+    numpy = pytest.importorskip("numpy")
+
+    line_index = LineIndex("a\r\n\r\n b\rc")
+
+    lines, cols = line_index.linecols(numpy.array([0, 1, 6, 8]))
+
+    assert isinstance(lines, numpy.ndarray)
+    assert lines.tolist() == [1, 1, 3, 4]
+    assert cols.tolist() == [1, 2, 2, 1]
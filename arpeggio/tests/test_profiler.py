@@ -0,0 +1,195 @@
+#######################################################################
+# Name: test_profiler
+# Purpose: Test per-rule profiling counters.
+# License: MIT License
+#######################################################################
+import json
+import re
+
+import pytest
+
+from arpeggio import EOF, NoMatch, OneOrMore, Optional, ParserPython
+from arpeggio import RegExMatch as _
+from arpeggio.profiler import BacktrackHeatmap, FlameGraph, RuleProfiler
+
+
+def number():
+    return _(r"\d+")
+
+
+def name():
+    # Not a match rule as those are not memoized.
+    return "f", Optional(number)
+
+
+def call():
+    return name, "(", number, ")"
+
+
+def index():
+    return name, "[", number, "]"
+
+
+def item():
+    return [call, index, number]
+
+
+def items():
+    return OneOrMore(item, sep=","), Optional(";"), EOF
+
+
+@pytest.fixture
+def parser():
+    return ParserPython(items)
+
+
+def by_name(profiler, **kwargs):
+    return {s.name: s for s in profiler.stats(**kwargs)}
+
+
+def test_rule_profiler(parser):
+    with RuleProfiler(parser) as profiler:
+        parser.parse("f(1), f[2], 3")
+
+    stats = by_name(profiler)
+    assert stats["item"].calls == 3
+    assert stats["item"].successes == 3
+    assert (stats["call"].calls, stats["call"].failures) == (3, 2)
+    assert (stats["index"].calls, stats["index"].failures) == (2, 1)
+    assert stats["number"].calls == 6
+    assert stats["name"].calls == 5
+    assert stats["name"].memo_hits == 0
+    assert stats["items/Optional"].calls == 1
+    # " f" is thrown away when `call` fails on " f[2]".
+    assert stats["call"].backtracked == 2
+    assert stats["index"].backtracked == 0
+    assert stats["items"].cumulative_time >= stats["item"].cumulative_time
+    assert all(s.self_time <= s.cumulative_time + 1e-9 for s in stats.values())
+    assert set(by_name(profiler, rules_only=True)) == {
+        "items",
+        "item",
+        "call",
+        "index",
+        "number",
+        "name",
+        "EOF",
+    }
+
+
+def test_rule_profiler_disabled(parser):
+    profiler = RuleProfiler(parser)
+    with profiler:
+        parser.parse("1")
+    assert not profiler.enabled
+    assert "parse" not in vars(parser.parser_model)
+
+    parser.parse("f(1)")
+    assert by_name(profiler)["item"].calls == 1
+
+    profiler.reset()
+    assert profiler.stats() == []
+
+
+def test_rule_profiler_failure_and_memo_hits():
+    parser = ParserPython(items, memoization=True)
+    with RuleProfiler(parser) as profiler, pytest.raises(NoMatch):
+        parser.parse("f[1], f(")
+
+    stats = by_name(profiler)
+    # `index` tries `name` at the positions where `call` already did.
+    assert stats["name"].memo_hits == 2
+    assert stats["item"].failures == 1
+    assert stats["items"].failures == 1
+    assert stats["items"].successes == 0
+
+
+def test_rule_profiler_report(parser):
+    with RuleProfiler(parser) as profiler:
+        parser.parse("f(1), f[2], 3")
+
+    lines = profiler.report(sort="calls", limit=3).splitlines()
+    assert len(lines) == 4
+    assert lines[0].split()[:3] == ["rule", "calls", "success"]
+    calls = [int(line.split()[1]) for line in lines[1:]]
+    assert calls == sorted(calls, reverse=True)
+
+    data = json.loads(profiler.to_json(sort="name", rules_only=True))
+    assert [d["name"] for d in data] == sorted(d["name"] for d in data)
+    assert data[0]["name"] == "EOF"
+    assert set(data[0]) >= {"calls", "self_time", "backtracked", "memo_hits"}
+
+    with pytest.raises(ValueError):
+        profiler.report(sort="speed")
+
+
+def test_backtrack_heatmap(parser):
+    text = "f(1),\nf[2],\n f[3]"
+    with BacktrackHeatmap(parser) as heatmap:
+        parser.parse(text)
+    # Not counted.
+    parser.parse("1")
+    # Disabling again keeps the input of the profiled parse.
+    heatmap.disable()
+
+    second = text.index("f[")
+    third = text.rindex("f[")
+    # After `call` failed on "[", `index` retries at "f" and so does
+    # `name` with its "f" match.
+    assert heatmap.retries(second) == 3
+    assert heatmap.retries(text.index("f(")) == 0
+    assert heatmap.attempts(second) == 7
+
+    spots = heatmap.hot_spots()
+    assert [(s.line, s.col, s.retries) for s in spots] == [(2, 1, 3), (3, 2, 3)]
+    assert spots[0].position == second
+    assert spots[0].rules == {"index": 1, "name": 2}
+    assert spots[0].context == "f(1), *f[2],  f[3"
+    assert spots[1].position == third
+
+    assert [(h.line, h.retries) for h in heatmap.lines()] == [(1, 0), (2, 3), (3, 3)]
+    assert heatmap.lines()[1].rules == {"index": 1, "name": 2}
+
+    report = heatmap.report(limit=1)
+    assert "name (2), index (1)" in report
+    assert "(2, 1)" in report
+    assert "(3, 2)" not in report
+
+    heatmap.reset()
+    assert heatmap.hot_spots() == []
+
+
+def test_flame_graph(parser, tmp_path):
+    with RuleProfiler(parser) as profiler:
+        with FlameGraph(parser) as flame_graph:
+            parser.parse("f(1), f[2], 3")
+        assert parser.tracer is profiler
+
+    times = flame_graph.times()
+    assert set(times) == {
+        "items",
+        "items;item",
+        "items;item;call",
+        "items;item;call;name",
+        "items;item;call;name;number",
+        "items;item;call;number",
+        "items;item;index",
+        "items;item;index;name",
+        "items;item;index;name;number",
+        "items;item;index;number",
+        "items;item;number",
+        "items;EOF",
+    }
+    assert sum(times.values()) > 0
+    assert all(t >= 0 for t in times.values())
+
+    collapsed = flame_graph.collapsed(unit=1e-9).splitlines()
+    assert all(re.fullmatch(r"[\w;]+ \d+", line) for line in collapsed)
+    assert collapsed[0].startswith("items ")
+
+    file_name = str(tmp_path / "parse.folded")
+    flame_graph.save(file_name, unit=1e-9)
+    with open(file_name) as f:
+        assert f.read() == "\n".join(collapsed) + "\n"
+
+    flame_graph.reset()
+    assert flame_graph.collapsed() == ""
@@ -81,3 +81,26 @@ def test_lookup_single():
     # Test that accessing an invalid rule name raises AttributeError
     with pytest.raises(AttributeError):
         result.unexisting  # noqa
+
+
+def test_lookup_index():
+    parser = ParserPython(foo, reduce_tree=False)
+
+    result = parser.parse("a bum d c b d bla bum d c")
+
+    # Navigation index is created only for navigated nodes.
+    with pytest.raises(AttributeError):
+        result._expr_cache  # noqa
+    bar = result.bar
+    assert set(result._expr_cache) == {"bar", "baz", "bar2"}
+    assert result.bar is bar
+    with pytest.raises(AttributeError):
+        result.bar[0]._expr_cache  # noqa
+
+    # Filtered NT groups children of its children.
+    assert bar._filtered
+    assert hasattr(bar, "bum")
+    assert set(bar._expr_cache) == {"bum", "baz"}
+    assert [n.position for n in bar.baz] == [6, 22]
+    assert bar.baz.rule_name == "baz"
+    assert bar.baz.position == 6
@@ -6,19 +6,22 @@
 # License: MIT License
 #######################################################################
 
+import copy
+import pickle
+
 import pytest  # noqa
 
 # Grammar
 from arpeggio import (
-    ZeroOrMore,
     OneOrMore,
     ParserPython,
-    SemanticActionResults,
     PTNodeVisitor,
+    SemanticActionResults,
+    ZeroOrMore,
     visit_parse_tree,
 )
-from arpeggio.export import PTDOTExporter
 from arpeggio import RegExMatch as _
+from arpeggio.export import PTDOTExporter
 
 
 def grammar():
@@ -76,3 +79,34 @@ def test_semantic_action_results():
     assert isinstance(first_sar, SemanticActionResults)
     assert len(first_sar.third) == 3
     assert third_sar.third_str[0] == "3"
+
+
+def test_semantic_action_results_by_name():
+    results = SemanticActionResults()
+    results.append_result("a", 1)
+    results.append_result("", 2)
+    results.append_result("b", 3)
+
+    assert results == [1, 2, 3]
+    assert results.a == [1]
+    assert results.missing == []
+    assert results.results == {"a": [1], "b": [3]}
+
+    # Mapping is kept up to date once built.
+    results.append_result("a", 4)
+    assert results.a == [1, 4]
+
+
+@pytest.mark.parametrize("by_name", [False, True])
+def test_semantic_action_results_pickle(by_name):
+    results = SemanticActionResults()
+    results.append_result("a", 1)
+    results.append_result("b", 2)
+    if by_name:
+        assert results.a == [1]
+
+    for copied in (pickle.loads(pickle.dumps(results)), copy.copy(results)):
+        assert isinstance(copied, SemanticActionResults)
+        assert copied == [1, 2]
+        assert copied.b == [2]
+        assert copied.results == {"a": [1], "b": [2]}
@@ -0,0 +1,319 @@
+#######################################################################
+# Name: test_trace
+# Purpose: Test tracing of parsing engine events.
+# License: MIT License
+#######################################################################
+import io
+
+import pytest
+
+from arpeggio import EOF, Match, NoMatch, OneOrMore, ParserPython
+from arpeggio import RegExMatch as _
+from arpeggio.profiler import RuleProfiler
+from arpeggio.trace import DebugTracer, FlightRecorder, RecordedEvent, Tracer
+
+
+def number():
+    return _(r"\d+")
+
+
+def call():
+    return "f", "(", number, ")"
+
+
+def item():
+    return [call, number]
+
+
+def items():
+    return OneOrMore(item), EOF
+
+
+class RecordingTracer(Tracer):
+    def __init__(self):
+        self.events = []
+
+    def enter(self, expression, parser):
+        self.events.append(("enter", expression.name, parser.position))
+
+    def memo_hit(self, expression, parser):
+        self.events.append(("memo_hit", expression.name, parser.position))
+
+    def match(self, expression, parser, position, result):
+        self.events.append(("match", expression.name, position, parser.position))
+
+    def fail(self, expression, parser, position):
+        self.events.append(("fail", expression.name, position))
+
+    def exit(self, expression, parser, position):
+        self.events.append(("exit", expression.name, position))
+
+
+def instrumented(parser):
+    return [
+        node
+        for node in (parser.parser_model, *parser.parser_model.nodes)
+        if {"parse", "_parse"} & vars(node).keys()
+    ]
+
+
+def test_tracer_events():
+    tracer = RecordingTracer()
+    parser = ParserPython(items, tracer=tracer)
+    parser.parse(" 1")
+
+    assert tracer.events == [
+        ("enter", "items=Sequence", 0),
+        ("enter", "OneOrMore", 0),
+        ("enter", "item=OrderedChoice", 0),
+        ("enter", "call=Sequence", 0),
+        # Matches are reported at the token position.
+        ("enter", "StrMatch(f)", 1),
+        ("fail", "StrMatch(f)", 1),
+        ("exit", "StrMatch(f)", 1),
+        ("fail", "call=Sequence", 0),
+        ("exit", "call=Sequence", 0),
+        ("enter", "number=RegExMatch(\\d+)", 1),
+        ("match", "number=RegExMatch(\\d+)", 1, 2),
+        ("exit", "number=RegExMatch(\\d+)", 1),
+        ("match", "item=OrderedChoice", 0, 2),
+        ("exit", "item=OrderedChoice", 0),
+        ("enter", "item=OrderedChoice", 2),
+        ("enter", "call=Sequence", 2),
+        ("enter", "StrMatch(f)", 2),
+        ("fail", "StrMatch(f)", 2),
+        ("exit", "StrMatch(f)", 2),
+        ("fail", "call=Sequence", 2),
+        ("exit", "call=Sequence", 2),
+        ("enter", "number=RegExMatch(\\d+)", 2),
+        ("fail", "number=RegExMatch(\\d+)", 2),
+        ("exit", "number=RegExMatch(\\d+)", 2),
+        ("fail", "item=OrderedChoice", 2),
+        ("exit", "item=OrderedChoice", 2),
+        ("match", "OneOrMore", 0, 2),
+        ("exit", "OneOrMore", 0),
+        ("enter", "EOF", 2),
+        ("match", "EOF", 2, 2),
+        ("exit", "EOF", 2),
+        ("match", "items=Sequence", 0, 2),
+        ("exit", "items=Sequence", 0),
+    ]
+
+
+def test_tracer_memo_hit():
+    def value():
+        return [(call, "!"), call]
+
+    tracer = RecordingTracer()
+    parser = ParserPython(value, memoization=True, tracer=tracer)
+    parser.parse("f(1)")
+
+    assert ("memo_hit", "call=Sequence", 0) in tracer.events
+    assert parser.cache_hits == 1
+
+
+def test_default_engine_not_instrumented():
+    parser = ParserPython(items)
+    parser.parse("1")
+    assert not instrumented(parser)
+
+    parser.tracer = Tracer()
+    assert len(instrumented(parser)) == 3
+    # Only `_parse` of matches is instrumented.
+    assert all(isinstance(n, Match) for n in instrumented(parser) if "_parse" in vars(n))
+
+    parser.tracer = None
+    assert not instrumented(parser)
+    assert parser.parse("1 f(2)")
+
+
+def test_debug_tracer_sink():
+    messages = []
+    parser = ParserPython(items, tracer=DebugTracer(sink=messages.append))
+    with pytest.raises(NoMatch):
+        parser.parse("f(x)")
+
+    assert messages[:3] == [
+        ">> Matching rule items=Sequence at position 0 => *f(x)",
+        "   >> Matching rule OneOrMore in items at position 0 => *f(x)",
+        "      >> Matching rule item=OrderedChoice in items at position 0 => *f(x)",
+    ]
+    assert "            ++ Match '(' at 1 => 'f*(*x)'" in messages
+    assert "            -- NoMatch at 2" in messages
+    assert messages[-1] == (
+        "<<- Not matched rule items=Sequence in items at position 0 => *f(x)"
+    )
+
+
+def test_debug_mode_uses_debug_tracer():
+    output = io.StringIO()
+    parser = ParserPython(items, debug=True, file=output)
+    parser.parse("1")
+    assert ">> Matching rule items=Sequence at position 0 => *1" in output.getvalue()
+
+    # An explicit tracer takes precedence.
+    messages = []
+    parser.tracer = DebugTracer(sink=messages.append)
+    output.truncate(0)
+    parser.parse("1")
+    assert "Matching rule" not in output.getvalue()
+    assert messages[0] == ">> Matching rule items=Sequence at position 0 => *1"
+
+
+def test_debug_mode_output():
+    def value():
+        return [(call, "!"), call]
+
+    output = io.StringIO()
+    parser = ParserPython(value, memoization=True, debug=True, file=output)
+    output.seek(0)
+    output.truncate()
+    parser.parse("f(1)")
+
+    assert output.getvalue().splitlines() == [
+        ">> Matching rule value=OrderedChoice at position 0 => *f(1)",
+        "   >> Matching rule Sequence in value at position 0 => *f(1)",
+        "      >> Matching rule call=Sequence in value at position 0 => *f(1)",
+        "         ?? Try match rule StrMatch(f) in call at position 0 => *f(1)",
+        "         ++ Match 'f' at 0 => '*f*(1)'",
+        "         ?? Try match rule StrMatch(() in call at position 1 => f*(1)",
+        "         ++ Match '(' at 1 => 'f*(*1)'",
+        "         ?? Try match rule number=RegExMatch(\\d+) in call"
+        " at position 2 => f(*1)",
+        "         ++ Match '1' at 2 => 'f(*1*)'",
+        "         ?? Try match rule StrMatch()) in call at position 3 => f(1*)",
+        "         ++ Match ')' at 3 => 'f(1*)*'",
+        "      <<+ Matched rule call=Sequence in call at position 4 => f(1)*",
+        "      ?? Try match rule StrMatch(!) in value at position 4 => f(1)*",
+        "      -- No match '!' at 4 => 'f(1)**'",
+        "   <<- Not matched rule Sequence in value at position 0 => *f(1)",
+        "   >> Matching rule call=Sequence in value at position 0 => *f(1)",
+        "      ** Cache hit for [call=Sequence, 0] = 'f | ( | 1 | )' : new_pos=4",
+        "   <<+ Matched rule call=Sequence at position 4",
+        "<<+ Matched rule value=OrderedChoice in value at position 4 => f(1)*",
+    ]
+
+
+def test_debug_mode_output_comments():
+    def comment():
+        return _(r"#.*")
+
+    output = io.StringIO()
+    parser = ParserPython(items, comment, debug=True, file=output)
+    output.seek(0)
+    output.truncate()
+    parser.parse("1 # c\n f(2)")
+
+    # The match attempt is reported before the comments are skipped.
+    assert output.getvalue().splitlines()[13:20] == [
+        "         >> Matching rule call=Sequence in item at position 1 => 1* # c  f(2)",
+        "            ?? Try match rule StrMatch(f) in call at position 2 => 1 *# c  f(2)",
+        "            ?? Try match rule comment=RegExMatch(#.*) in call"
+        " at position 2 => 1 *# c  f(2)",
+        "            ++ Match '# c' at 2 => '1 *# c*  f(2)'",
+        "            ?? Try match rule comment=RegExMatch(#.*) in call"
+        " at position 7 => 1 # c  *f(2)",
+        "            -- NoMatch at 7",
+        "            ++ Match 'f' at 7 => '1 # c  *f*(2)'",
+    ]
+
+
+def test_tracer_of_shared_model():
+    tracer = RecordingTracer()
+    parser = ParserPython(items, tracer=tracer)
+    other = ParserPython(items)
+    other.parser_model = parser.parser_model
+
+    other.parse("1")
+    assert not tracer.events
+    parser.parse("1")
+    assert tracer.events
+
+    # Each parser reports to its own tracer.
+    other_tracer = RecordingTracer()
+    other.tracer = other_tracer
+    tracer.events.clear()
+    other.parse("1 2")
+    assert not tracer.events
+    parser.parse("1")
+    assert len(other_tracer.events) > len(tracer.events) > 0
+
+    # The nodes stay instrumented while any parser traces them.
+    other.tracer = Tracer()
+    parser.tracer = None
+    assert len(instrumented(parser)) == 3
+    other.tracer = None
+    assert not instrumented(parser)
+    assert other.parse("1 f(2)")
+
+
+def test_profiler_restores_tracer():
+    tracer = RecordingTracer()
+    parser = ParserPython(items, tracer=tracer)
+
+    with RuleProfiler(parser) as profiler:
+        assert parser.tracer is profiler
+        parser.parse("1")
+    assert parser.tracer is tracer
+    assert not tracer.events
+
+
+def test_flight_recorder_dump_on_failure():
+    dumps = []
+    parser = ParserPython(items)
+    recorder = FlightRecorder(parser, size=4, sink=dumps.append)
+
+    with recorder:
+        parser.parse("1 2")
+        assert recorder.count == 15
+        assert recorder.events()[-1] == RecordedEvent("items", 0, 3)
+        assert not dumps
+
+        with pytest.raises(NoMatch):
+            parser.parse("1\nf(x)")
+
+    assert recorder.events() == [
+        RecordedEvent("item", 1, -1),
+        RecordedEvent("items/OneOrMore", 0, 1),
+        RecordedEvent("EOF", 2, -1),
+        RecordedEvent("items", 0, -1),
+    ]
+    assert dumps == [recorder.last_dump]
+    assert dumps[0].splitlines() == [
+        "Flight recorder: Parse failed at (2, 3).",
+        "Last 4 of 28 parse events:",
+        "       position outcome             end  rule",
+        "         (1, 2)    fail                  item",
+        "         (1, 1)   match          (1, 2)  items/OneOrMore",
+        "         (2, 1)    fail                  EOF",
+        "         (1, 1)    fail                  items",
+    ]
+
+
+def test_flight_recorder_budget():
+    dumps = []
+    parser = ParserPython(items)
+    recorder = FlightRecorder(parser, budget=0, sink=dumps.append)
+    recorder.check_interval = 2
+
+    with recorder:
+        parser.parse("1 2 3")
+        # Dumped once per parse.
+        assert len(dumps) == 1
+        assert dumps[0].startswith("Flight recorder: Parse time budget of 0 s exceeded.")
+        parser.parse("1 2 3")
+        assert len(dumps) == 2
+
+
+def test_flight_recorder_budget_timed_from_parse_start():
+    dumps = []
+    parser = ParserPython(items)
+    recorder = FlightRecorder(parser, budget=0, sink=dumps.append)
+    # Parses of 19 events are not aligned to the checks.
+    recorder.check_interval = 16
+
+    with recorder:
+        for _ in range(3):
+            parser.parse("1 2 3")
+        # Each parse is checked from its first event.
+        assert len(dumps) == 3
@@ -0,0 +1,297 @@
+#######################################################################
+# Name: test_visit_cache
+# Purpose: Test reusing visitor results of unchanged subtrees.
+# License: MIT License
+#######################################################################
+import pytest
+
+from arpeggio import (
+    EOF,
+    OneOrMore,
+    ParserPython,
+    PTNodeVisitor,
+    ZeroOrMore,
+    visit_parse_tree,
+)
+from arpeggio import RegExMatch as _
+from arpeggio.cache import (
+    PersistentVisitCache,
+    VisitCache,
+    grammar_fingerprint,
+    subtree_hashes,
+)
+
+
+def name():
+    return _(r"[a-z]\w*")
+
+
+def number():
+    return _(r"\d+")
+
+
+def assignment():
+    return name, "=", [number, name], ";"
+
+
+def module():
+    return "module", name, "{", ZeroOrMore(assignment), "}"
+
+
+def model():
+    return OneOrMore(module), EOF
+
+
+INPUT = """
+module a { x = 1; y = x; }
+module b { }
+module c { z = 3; w = z; }
+"""
+
+CHANGED = """
+module a { x = 1; y = x; }
+module b { t = 2; }
+module c { z = 3;    w = z; }
+"""
+
+
+class Assignment:
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+        self.module = None
+
+    def __eq__(self, other):
+        return vars(self) == vars(other)
+
+
+class ModelVisitor(PTNodeVisitor):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.visited = []
+
+    def visit_number(self, node, children):
+        return int(node.value)
+
+    def visit_assignment(self, node, children):
+        self.visited.append(children[0])
+        return Assignment(children[0], children[1])
+
+    def visit_module(self, node, children):
+        self.visited.append(children[0])
+        return (children[0], list(children.assignment))
+
+    def second_module(self, module):
+        # Idempotent as required for cached results.
+        for assignment in module[1]:
+            assignment.module = module[0]
+
+    def visit_model(self, node, children):
+        return dict(list(children))
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return ParserPython(model)
+
+
+def test_subtree_hashes(parser):
+    tree = parser.parse(INPUT)
+    changed = parser.parse(CHANGED)
+
+    hashes = subtree_hashes(tree)
+    changed_hashes = subtree_hashes(changed)
+
+    modules = [id(m) for m in tree[:3]]
+    changed_modules = [id(m) for m in changed[:3]]
+    assert len(hashes) == len(changed_hashes) - 1
+    # Positions and whitespace are not hashed.
+    assert hashes[modules[0]] == changed_hashes[changed_modules[0]]
+    assert hashes[modules[2]] == changed_hashes[changed_modules[2]]
+    assert hashes[modules[1]] != changed_hashes[changed_modules[1]]
+    assert hashes[id(tree)] != changed_hashes[id(changed)]
+
+
+def test_cached_visit(parser):
+    cache = VisitCache()
+
+    visitor = ModelVisitor()
+    result = visit_parse_tree(parser.parse(INPUT), visitor, cache=cache)
+    assert cache.hits == 0
+    assert visitor.visited == ["x", "y", "a", "b", "z", "w", "c"]
+    assert [a.module for a in result["c"]] == ["c", "c"]
+
+    visitor = ModelVisitor()
+    changed = visit_parse_tree(parser.parse(CHANGED), visitor, cache=cache)
+    # Only the changed module and the root are visited.
+    assert visitor.visited == ["t", "b"]
+    assert cache.hits == 2
+    assert cache.misses == 3
+    assert cache.hit_rate == 0.4
+    assert changed["a"] is result["a"]
+    assert [(a.name, a.value, a.module) for a in changed["b"]] == [("t", 2, "b")]
+    assert changed["c"] is result["c"]
+
+    assert changed == visit_parse_tree(parser.parse(CHANGED), ModelVisitor())
+
+
+def test_cached_visit_equal_subtrees(parser):
+    cache = VisitCache(rules={"assignment"})
+    tree = parser.parse("module a { x = 1; } module b { x = 1; }")
+
+    first = visit_parse_tree(tree, ModelVisitor(), cache=cache)
+    visitor = ModelVisitor()
+    second = visit_parse_tree(tree, visitor, cache=cache)
+
+    # Equal subtrees don't share results.
+    assert first["a"][0] is not first["b"][0]
+    assert second["a"][0] is first["a"][0]
+    assert second["b"][0] is first["b"][0]
+    assert visitor.visited == ["a", "b"]
+    assert len(cache) == 2
+
+
+def item():
+    return "(", number, ")"
+
+
+def block():
+    return "{", ZeroOrMore([block, item]), "}"
+
+
+def items():
+    return ZeroOrMore([block, item]), EOF
+
+
+class ItemsVisitor(PTNodeVisitor):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.visited = []
+
+    def visit_item(self, node, children):
+        self.visited.append(int(children[0]))
+        return [int(children[0])]
+
+    def visit_block(self, node, children):
+        return list(children)
+
+    def visit_items(self, node, children):
+        return list(children)
+
+
+def test_cached_visit_after_edits():
+    parser = ParserPython(items)
+    cache = VisitCache()
+
+    visit_parse_tree(parser.parse("{ (7) (8) } (9)"), ItemsVisitor(), cache=cache)
+    visit_parse_tree(parser.parse("{ (7) (8) } (10)"), ItemsVisitor(), cache=cache)
+
+    # Results in the reused block are kept for the next edit.
+    visitor = ItemsVisitor()
+    result = visit_parse_tree(parser.parse("{ (7) (8) (1) } (10)"), visitor, cache=cache)
+    assert result == [[[7], [8], [1]], [10]]
+    assert visitor.visited == [1]
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+@pytest.mark.parametrize("text", ["{ (1) } (1)", "(1) { (1) }"])
+def test_cached_visit_equal_subtrees_moved(text):
+    parser = ParserPython(items)
+    cache = VisitCache()
+
+    visit_parse_tree(parser.parse("{ (1) }"), ItemsVisitor(), cache=cache)
+    result = visit_parse_tree(parser.parse(text), ItemsVisitor(), cache=cache)
+
+    if text.startswith("{"):
+        block_item, item = result[0][0], result[1]
+    else:
+        item, block_item = result[0], result[1][0]
+    assert block_item == item == [1]
+    assert block_item is not item
+
+
+def test_cache_eviction(parser):
+    cache = VisitCache(rules={"module"}, max_generations=2)
+
+    visit_parse_tree(parser.parse(INPUT), ModelVisitor(), cache=cache)
+    assert len(cache) == 3
+    visit_parse_tree(parser.parse("module d { }"), ModelVisitor(), cache=cache)
+    assert len(cache) == 4
+    visit_parse_tree(parser.parse("module d { }"), ModelVisitor(), cache=cache)
+    assert len(cache) == 1
+    assert cache.hit_rate == 1
+
+
+def test_cached_visit_parallel(parser):
+    tree = parser.parse(INPUT)
+    with pytest.raises(ValueError):
+        visit_parse_tree(tree, ModelVisitor(), parallel=2, cache=VisitCache())
+
+
+def test_grammar_fingerprint(parser):
+    def other_module():
+        return "module", name, "{", OneOrMore(assignment), "}"
+
+    def other_model():
+        return OneOrMore(other_module), EOF
+
+    assert grammar_fingerprint(parser) == grammar_fingerprint(ParserPython(model))
+    assert grammar_fingerprint(parser) != grammar_fingerprint(ParserPython(other_model))
+    assert grammar_fingerprint(parser) != grammar_fingerprint(
+        ParserPython(model, skipws=False)
+    )
+
+
+def test_persistent_cache(parser, tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    with PersistentVisitCache(path, parser, version="1", rules={"module"}) as cache:
+        expected = visit_parse_tree(parser.parse(INPUT), ModelVisitor(), cache=cache)
+        assert len(cache) == 3
+        assert cache.hits == 0
+
+    # Next run.
+    with PersistentVisitCache(path, parser, version="1", rules={"module"}) as cache:
+        visitor = ModelVisitor()
+        result = visit_parse_tree(parser.parse(CHANGED), visitor, cache=cache)
+        assert visitor.visited == ["t", "b"]
+        assert (cache.hits, cache.misses) == (2, 1)
+        assert (cache.total_hits, cache.total_misses) == (2, 4)
+        assert cache.total_hit_rate == 2 / 6
+        # Results are unpickled copies with the second pass run again.
+        assert result["c"] == expected["c"]
+        assert result["c"] is not expected["c"]
+        assert [a.module for a in result["c"]] == ["c", "c"]
+
+    # Visitor version is a part of the key.
+    with PersistentVisitCache(path, parser, version="2", rules={"module"}) as cache:
+        visit_parse_tree(parser.parse(INPUT), ModelVisitor(), cache=cache)
+        assert cache.hits == 0
+
+
+def test_persistent_cache_eviction(parser, tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    with PersistentVisitCache(path, parser, rules={"module"}, max_entries=3) as cache:
+        visit_parse_tree(parser.parse(INPUT), ModelVisitor(), cache=cache)
+        visit_parse_tree(parser.parse("module d { }"), ModelVisitor(), cache=cache)
+        assert len(cache) == 3
+        # The least recently used module a is evicted.
+        visitor = ModelVisitor()
+        visit_parse_tree(parser.parse(INPUT), visitor, cache=cache)
+        assert visitor.visited == ["x", "y", "a"]
+
+
+def test_persistent_cache_unpicklable_results(parser, tmp_path):
+    class LocalVisitor(PTNodeVisitor):
+        def visit_module(self, node, children):
+            return lambda: children[0]
+
+        def visit_model(self, node, children):
+            return [module() for module in children]
+
+    with PersistentVisitCache(str(tmp_path / "cache.db"), parser) as cache:
+        result = visit_parse_tree(parser.parse(INPUT), LocalVisitor(), cache=cache)
+        assert result == ["a", "b", "c"]
+        # Modules are not cached, assignments and the model are.
+        assert len(cache) == 5
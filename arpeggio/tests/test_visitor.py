@@ -6,19 +6,24 @@
 # License: MIT License
 #######################################################################
 
+import sys
+
 import pytest  # noqa
 
 # Grammar
 from arpeggio import (
-    ZeroOrMore,
+    NonTerminal,
     OneOrMore,
     ParserPython,
     PTNodeVisitor,
-    visit_parse_tree,
     SemanticActionResults,
+    StrMatch,
+    Terminal,
+    ZeroOrMore,
+    visit_parse_tree,
 )
-from arpeggio.export import PTDOTExporter
 from arpeggio import RegExMatch as _
+from arpeggio.export import PTDOTExporter
 
 
 def grammar():
@@ -76,3 +81,58 @@ def test_semantic_action_results():
     assert isinstance(first_sar, SemanticActionResults)
     assert len(first_sar.third) == 3
     assert third_sar.third_str[0] == "3"
+
+
+def nested():
+    return [("(", nested, ")"), "x"]
+
+
+def test_visit_deep_tree():
+    """
+    Test that visiting is not limited by the Python recursion limit.
+    """
+    depth = sys.getrecursionlimit() * 2
+    parser = ParserPython(nested)
+    # Parsing such an input is recursive so build the tree directly.
+    tree = Terminal(StrMatch("x"), 0, "x")
+    for _i in range(depth):
+        tree = NonTerminal(
+            parser.parser_model,
+            [Terminal(StrMatch("("), 0, "("), tree, Terminal(StrMatch(")"), 0, ")")],
+        )
+    second_pass = []
+
+    def nesting(children):
+        return children[1] + 1 if isinstance(children[1], int) else 1
+
+    class DepthVisitor(PTNodeVisitor):
+        def visit_nested(self, node, children):
+            return nesting(children)
+
+        def second_nested(self, result):
+            second_pass.append(result)
+
+    assert visit_parse_tree(tree, DepthVisitor()) == depth
+    assert second_pass == list(range(1, depth + 1))
+
+    parser.parse_tree = tree
+    assert parser.getASG({"nested": lambda p, n, children: nesting(children)}) == depth
+
+
+def test_visit_methods_resolved_once():
+    lookups = []
+
+    class CountingVisitor(Visitor):
+        def __getattribute__(self, name):
+            if name.startswith(("visit_", "second_")):
+                lookups.append(name)
+            return super().__getattribute__(name)
+
+    result = ParserPython(grammar).parse("4 3 3 3 a 3 3 b")
+
+    visit_parse_tree(result, CountingVisitor(defaults=True))
+
+    visit_lookups = [n for n in lookups if n != "visit__default__"]
+    assert len(visit_lookups) == len(set(visit_lookups))
+    assert "visit_third" in visit_lookups
+    assert "second_third" in visit_lookups
@@ -0,0 +1,129 @@
+#######################################################################
+# Name: test_visitor_batch
+# Purpose: Test batch visit methods called with all nodes of a rule.
+# License: MIT License
+#######################################################################
+from array import array
+
+import pytest
+
+from arpeggio import (
+    EOF,
+    NodeBatch,
+    OneOrMore,
+    ParserPython,
+    PTNodeVisitor,
+    SemanticError,
+    visit_parse_tree,
+)
+from arpeggio import RegExMatch as _
+
+
+def number():
+    return _(r"\d+(\.\d+)?")
+
+
+def row():
+    return "[", OneOrMore(number, sep=","), "]"
+
+
+def table():
+    return OneOrMore(row), EOF
+
+
+INPUT = "[1, 2.5, 3] [4] [5.25, 6]"
+
+
+class RowVisitor(PTNodeVisitor):
+    def visit_row(self, node, children):
+        return children.number
+
+    def visit_table(self, node, children):
+        return list(children)
+
+
+class NumberVisitor(RowVisitor):
+    def visit_number(self, node, children):
+        return float(node.value)
+
+
+class BatchVisitor(RowVisitor):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def visit_batch_number(self, batch):
+        self.batches.append(batch)
+        return array("d", map(float, batch.values))
+
+
+@pytest.fixture(scope="module")
+def parse_tree():
+    return ParserPython(table).parse(INPUT)
+
+
+def test_batch_visit(parse_tree):
+    visitor = BatchVisitor()
+
+    result = visit_parse_tree(parse_tree, visitor)
+
+    assert result == visit_parse_tree(parse_tree, NumberVisitor())
+    assert result == [[1, 2.5, 3], [4], [5.25, 6]]
+    (batch,) = visitor.batches
+    assert isinstance(batch, NodeBatch)
+    assert batch.rule_name == "number"
+    assert len(batch) == 6
+    assert batch.values == ["1", "2.5", "3", "4", "5.25", "6"]
+    assert list(batch.positions) == [INPUT.index(v) for v in batch.values]
+    assert list(batch.ends) == [p + len(v) for p, v in zip(batch.positions, batch.values)]
+
+
+def test_batch_visit_numpy(parse_tree):
+    numpy = pytest.importorskip("numpy")
+
+    class NumpyVisitor(RowVisitor):
+        def visit_batch_number(self, batch):
+            return numpy.array(batch.values, dtype=float)
+
+    result = visit_parse_tree(parse_tree, NumpyVisitor())
+
+    assert result == [[1, 2.5, 3], [4], [5.25, 6]]
+
+
+def test_batch_visit_non_terminals_and_second_pass(parse_tree):
+    second = []
+
+    class RowBatchVisitor(RowVisitor):
+        def visit_batch_row(self, batch):
+            return [len(n.number) if len(n.number) > 1 else None for n in batch.nodes]
+
+        def second_row(self, result):
+            second.append(result)
+
+    result = visit_parse_tree(parse_tree, RowBatchVisitor())
+
+    # None results are suppressed.
+    assert result == [3, 2]
+    assert second == [3, None, 2]
+
+
+def test_batch_visit_wrong_number_of_results(parse_tree):
+    class WrongVisitor(PTNodeVisitor):
+        def visit_batch_number(self, batch):
+            return batch.values[1:]
+
+    with pytest.raises(SemanticError):
+        visit_parse_tree(parse_tree, WrongVisitor())
+
+
+def test_batch_visit_parallel(parse_tree):
+    class ParallelBatchVisitor(BatchVisitor):
+        independent_rules = {"row"}
+
+    visitor = ParallelBatchVisitor()
+
+    result = visit_parse_tree(parse_tree, visitor, parallel=2, executor="thread")
+
+    assert result == [[1, 2.5, 3], [4], [5.25, 6]]
+    # Numbers in independent subtrees are batched by the workers.
+    assert sum(len(batch) for batch in visitor.batches) == 6
@@ -0,0 +1,142 @@
+#######################################################################
+# Name: test_visitor_parallel
+# Purpose: Test visiting independent subtrees in parallel.
+# License: MIT License
+#######################################################################
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from arpeggio import (
+    EOF,
+    OneOrMore,
+    ParserPython,
+    PTNodeVisitor,
+    ZeroOrMore,
+    visit_parse_tree,
+)
+from arpeggio import RegExMatch as _
+
+
+def name():
+    return _(r"[a-z]\w*")
+
+
+def number():
+    return _(r"\d+")
+
+
+def assignment():
+    return name, "=", [number, name], ";"
+
+
+def module():
+    return "module", name, "{", ZeroOrMore(assignment), "}"
+
+
+def model():
+    return OneOrMore(module), EOF
+
+
+INPUT = """
+module a { x = 1; y = x; }
+module b { }
+module c { z = 3; w = z; v = 4; }
+module d { u = 5; }
+"""
+
+
+class ModelVisitor(PTNodeVisitor):
+    independent_rules = {"module"}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.second = []
+
+    def visit_number(self, node, children):
+        return int(node.value)
+
+    def visit_assignment(self, node, children):
+        return (children[0], children[1])
+
+    def visit_module(self, node, children):
+        return (children[0], dict(children.assignment))
+
+    def second_module(self, module):
+        self.second.append(module[0])
+
+    def second_assignment(self, assignment):
+        self.second.append(assignment[0])
+
+    def visit_model(self, node, children):
+        return dict(list(children))
+
+
+@pytest.fixture(scope="module")
+def parse_tree():
+    # Regex match objects kept in terminals by default can't be pickled if
+    # process workers can't be forked.
+    return ParserPython(model, lazy_terminals=True).parse(INPUT)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_visit_same_as_sequential(parse_tree, executor):
+    sequential = ModelVisitor()
+    expected = visit_parse_tree(parse_tree, sequential)
+
+    visitor = ModelVisitor()
+    result = visit_parse_tree(parse_tree, visitor, parallel=2, executor=executor)
+
+    assert result == expected
+    assert result["c"] == {"z": 3, "w": "z", "v": 4}
+    # Second pass runs in the main process in the document order.
+    assert visitor.second == sequential.second
+    assert visitor.second[:3] == ["x", "y", "a"]
+
+
+def test_parallel_visit_executor_instance(parse_tree):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        result = visit_parse_tree(parse_tree, ModelVisitor(), parallel=2, executor=pool)
+        # Given executor is not shut down.
+        assert pool.submit(int, "1").result() == 1
+
+    assert list(result) == ["a", "b", "c", "d"]
+
+
+def test_parallel_visit_invalid_executor(parse_tree):
+    with pytest.raises(ValueError):
+        visit_parse_tree(parse_tree, ModelVisitor(), parallel=2, executor="cluster")
+
+
+def test_concurrent_parallel_visits():
+    parser = ParserPython(model, lazy_terminals=True)
+    trees = [
+        parser.parse(f"module m{i} {{ x = {i}; }} module n{i} {{ }}") for i in range(4)
+    ]
+
+    def visit(tree):
+        return visit_parse_tree(tree, ModelVisitor(), parallel=2)
+
+    # Process pools of visits started from different threads don't mix up
+    # their subtrees.
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(visit, trees))
+
+    assert results == [{f"m{i}": {"x": i}, f"n{i}": {}} for i in range(4)]
+
+
+def test_parallel_process_visit_returns_children(parse_tree):
+    class ChildrenVisitor(ModelVisitor):
+        def visit_module(self, node, children):
+            return children
+
+        def visit_model(self, node, children):
+            return [(module[0], module.assignment) for module in children]
+
+    expected = visit_parse_tree(parse_tree, ChildrenVisitor())
+    result = visit_parse_tree(
+        parse_tree, ChildrenVisitor(), parallel=2, executor="process"
+    )
+
+    assert result == expected
+    assert result[0] == ("a", [("x", 1), ("y", "x")])
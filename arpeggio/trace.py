@@ -0,0 +1,639 @@
+#######################################################################
+# Name: trace.py
+# Purpose: Tracing of parsing engine events
+# License: MIT License
+#######################################################################
+
+from __future__ import annotations
+
+import sys
+import time
+from array import array
+from typing import Any, Callable, NamedTuple
+
+from arpeggio import (
+    EndOfFile,
+    Match,
+    NoMatch,
+    Parser,
+    ParsingExpression,
+    RegExMatch,
+    StrMatch,
+)
+
+__all__ = ["Tracer", "ParserTracer", "DebugTracer", "FlightRecorder"]
+
+
+def _model_nodes(parser: Parser) -> list[tuple[ParsingExpression, str]]:
+    """
+    Returns all the parser model nodes (including the comments model) with
+    their names. Rules are named by the rule name, other expressions by the
+    name of the enclosing rule and the expression name (e.g.
+    `block/StrMatch({)`).
+    """
+    nodes: list[tuple[ParsingExpression, str]] = []
+    visited: set[int] = set()
+    stack = [
+        (model, "") for model in (parser.comments_model, parser.parser_model) if model
+    ]
+    while stack:
+        node, rule_name = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        if node.root:
+            rule_name = name = node.rule_name
+        else:
+            name = f"{rule_name}/{node.name}"
+        nodes.append((node, name))
+        children = list(node.nodes)
+        sep = getattr(node, "sep", None)
+        if sep is not None:
+            children.append(sep)
+        stack.extend((child, rule_name) for child in reversed(children))
+    return nodes
+
+
+class Tracer:
+    """
+    Base class for parse tracers. A tracer set as the parser `tracer` is
+    notified of the parsing engine events. Override the events of interest,
+    events which are not overridden are not reported at all.
+
+    For each parse attempt of a parser model node `enter` is called first,
+    then `memo_hit` if the result is taken from the memoization cache, then
+    `match` or `fail` and finally `exit`. Attempts of `Match` expressions
+    are reported after whitespace and comments are skipped, i.e. at the
+    position of the token.
+    """
+
+    def enter(self, expression: ParsingExpression, parser: Parser) -> None:
+        """
+        The expression is tried at `parser.position`.
+        """
+
+    def memo_hit(self, expression: ParsingExpression, parser: Parser) -> None:
+        """
+        The result of the expression at `parser.position` is taken from the
+        memoization cache.
+        """
+
+    def match(
+        self, expression: ParsingExpression, parser: Parser, position: int, result: Any
+    ) -> None:
+        """
+        The expression matched the input from the position to
+        `parser.position`.
+        """
+
+    def fail(self, expression: ParsingExpression, parser: Parser, position: int) -> None:
+        """
+        The expression didn't match at the position.
+        """
+
+    def exit(self, expression: ParsingExpression, parser: Parser, position: int) -> None:
+        """
+        The attempt of the expression at the position is finished.
+        """
+
+    def _traced_method(
+        self,
+        traced_parser: Parser,
+        expression: ParsingExpression,
+        attr: str,
+        method: Callable[[Parser], Any],
+    ) -> Callable[[Parser], Any] | None:
+        """
+        Returns the traced variant of the `attr` parse method of the
+        expression, or None if the method is not traced. By default the
+        overridden events are reported around `parse`, or `_parse` for `Match`
+        expressions. Tracers override it to record the events directly in the
+        returned function.
+
+        The returned function may be called by other parsers sharing the
+        parser model and must call the untraced `method` for them.
+        """
+        if attr == "parse" and isinstance(expression, Match):
+            return None
+        events = {}
+        for event in ("enter", "memo_hit", "match", "fail", "exit"):
+            overridden = getattr(type(self), event) is not getattr(Tracer, event)
+            events[event] = getattr(self, event) if overridden else None
+        return _traced(traced_parser, method, expression, **events)
+
+
+class ParserTracer(Tracer):
+    """
+    Tracer of a single parser which is set as the parser tracer while
+    enabled. The previous tracer of the parser is restored when disabled.
+    Use it as a context manager:
+
+        with SomeTracer(parser) as tracer:
+            parser.parse(content)
+
+    Attributes:
+        parser (Parser): The traced parser.
+    """
+
+    def __init__(self, parser: Parser) -> None:
+        self.parser: Parser = parser
+        self._enabled: bool = False
+        self._previous: Tracer | None = None
+
+    def __enter__(self) -> Any:
+        self.enable()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.disable()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def enable(self) -> None:
+        if self._enabled:
+            return
+        self._previous = self.parser.tracer
+        self.parser.tracer = self
+        self._enabled = True
+
+    def disable(self) -> None:
+        if not self._enabled:
+            return
+        if self.parser.tracer is self:
+            self.parser.tracer = self._previous
+        self._enabled = False
+
+
+def _traced_attrs(node: ParsingExpression) -> tuple[str, ...]:
+    # Matches skip whitespace and comments in `parse` before `_parse`.
+    return ("parse", "_parse") if isinstance(node, Match) else ("parse",)
+
+
+def _trace_key(node: ParsingExpression, attr: str) -> int:
+    # The keys of `parse` and `_parse` of a node must differ. The complement
+    # of an id is negative so it is not an id of another node.
+    return id(node) if attr == "parse" else ~id(node)
+
+
+def _instrument_model(parser: Parser, tracer: Tracer | None) -> None:
+    """
+    Switches the parser to the instrumented engine reporting to the tracer
+    or back to the default engine if the tracer is None.
+
+    The traced parse methods of the model nodes are kept by the parser in
+    `_traced` and installed as instance attributes shadowing the node
+    methods. Model nodes may be shared between parsers (e.g. the PEG
+    meta-parser). The traced methods run the original method for other
+    parsers, and a node traced by several parsers gets a dispatcher calling
+    the traced method of the parser it is called with. The shadowing
+    attributes are removed when no parser traces the node, so the default
+    engine doesn't pay for tracing.
+    """
+    traced_nodes = parser._traced_nodes or ()
+    parser._traced = None
+    parser._traced_nodes = None
+    for node, attr in traced_nodes:
+        vars(node)["_trace_users"][attr].remove(parser)
+        _install(node, attr)
+    if tracer is None:
+        return
+
+    traced: dict[int, Callable[[Parser], Any]] = {}
+    parser._traced = traced
+    parser._traced_nodes = []
+    for node, _ in _model_nodes(parser):
+        for attr in _traced_attrs(node):
+            method = getattr(type(node), attr).__get__(node)
+            traced_method = tracer._traced_method(parser, node, attr, method)
+            if traced_method is None:
+                continue
+            traced[_trace_key(node, attr)] = traced_method
+            users = vars(node).setdefault("_trace_users", {})
+            users.setdefault(attr, []).append(parser)
+            _install(node, attr)
+            parser._traced_nodes.append((node, attr))
+
+
+def _install(node: ParsingExpression, attr: str) -> None:
+    """
+    Installs the parse method of the node for the parsers tracing it.
+    """
+    users = vars(node)["_trace_users"]
+    parsers = users[attr]
+    if len(parsers) == 1:
+        # The traced method runs the original one for the other parsers.
+        setattr(node, attr, parsers[0]._traced[_trace_key(node, attr)])
+    elif parsers:
+        method = getattr(type(node), attr).__get__(node)
+        setattr(node, attr, _dispatcher(node, attr, method))
+    else:
+        del users[attr]
+        del vars(node)[attr]
+        if not users:
+            del vars(node)["_trace_users"]
+
+
+def _dispatcher(
+    node: ParsingExpression, attr: str, method: Callable[[Parser], Any]
+) -> Callable[[Parser], Any]:
+    key = _trace_key(node, attr)
+
+    def dispatch(parser: Parser) -> Any:
+        traced = parser._traced
+        if traced is not None:
+            traced_method = traced.get(key)
+            if traced_method is not None:
+                return traced_method(parser)
+        return method(parser)
+
+    return dispatch
+
+
+def _traced(
+    traced_parser: Parser,
+    method: Callable[[Parser], Any],
+    node: ParsingExpression,
+    enter: Any,
+    memo_hit: Any,
+    match: Any,
+    fail: Any,
+    exit: Any,
+) -> Callable[[Parser], Any]:
+    # Match expressions are not memoized.
+    if isinstance(node, Match):
+        memo_hit = None
+
+    def traced_parse(parser: Parser) -> Any:
+        if parser is not traced_parser:
+            return method(parser)
+        position = parser.position
+        if enter is not None:
+            enter(node, parser)
+        if memo_hit is not None and parser.memoization and position in node._result_cache:
+            memo_hit(node, parser)
+        try:
+            try:
+                result = method(parser)
+            except NoMatch:
+                if fail is not None:
+                    fail(node, parser, position)
+                raise
+            if match is not None:
+                match(node, parser, position, result)
+            return result
+        finally:
+            if exit is not None:
+                exit(node, parser, position)
+
+    return traced_parse
+
+
+class DebugTracer(Tracer):
+    """
+    Prints the parsing trace of the parser debug mode. Used by the parser in
+    debug mode if no other tracer is set. Messages are indented by the
+    nesting of the expressions and printed by the parser `dprint`, i.e. to
+    the `file` of the parser.
+
+    Args:
+        sink(callable): If given, called with each message instead of
+            printing. Use it to route the trace to e.g. logging.
+    """
+
+    def __init__(self, sink: Callable[[str], Any] | None = None) -> None:
+        self.sink: Callable[[str], Any] | None = sink
+        self._indent: int = 0
+
+    def _print(self, parser: Parser, message: str, indent_change: int = 0) -> None:
+        if self.sink is None:
+            parser.dprint(message, indent_change)
+            return
+        if indent_change < 0:
+            self._indent += indent_change
+        self.sink("   " * self._indent + message)
+        if indent_change > 0:
+            self._indent += indent_change
+
+    def _traced_method(
+        self,
+        traced_parser: Parser,
+        expression: ParsingExpression,
+        attr: str,
+        method: Callable[[Parser], Any],
+    ) -> Callable[[Parser], Any] | None:
+        if not isinstance(expression, Match):
+            return self._traced_expression(traced_parser, expression, method)
+        if attr == "parse":
+            return self._traced_match_start(traced_parser, expression, method)
+        return self._traced_match(traced_parser, expression, method)
+
+    def _traced_expression(
+        self,
+        traced_parser: Parser,
+        expression: ParsingExpression,
+        method: Callable[[Parser], Any],
+    ) -> Callable[[Parser], Any]:
+        debug_print = self._print
+        name = expression.name
+        if name.startswith("__asgn"):
+            name = f"{name}[{expression._attr_name}]"
+
+        def traced_parse(parser: Parser) -> Any:
+            if parser is not traced_parser:
+                return method(parser)
+            in_rule = f" in {parser.in_rule}" if parser.in_rule else ""
+            debug_print(
+                parser,
+                f">> Matching rule {name}{in_rule} at position {parser.position} "
+                f"=> {parser.context()}",
+                1,
+            )
+            c_pos = parser.position
+            if parser.memoization and c_pos in expression._result_cache:
+                result, new_pos = expression._result_cache[c_pos]
+                debug_print(
+                    parser,
+                    f"** Cache hit for [{name}, {c_pos}] = '{result}' "
+                    f": new_pos={new_pos}",
+                )
+                debug_print(parser, f"<<+ Matched rule {name} at position {new_pos}", -1)
+                return method(parser)
+            try:
+                return method(parser)
+            finally:
+                # The rule being left is still current.
+                rule_name = expression.rule_name or parser.in_rule
+                in_rule = f" in {rule_name}" if rule_name else ""
+                # The position is restored on failure.
+                outcome = "- Not matched" if parser.position is c_pos else "+ Matched"
+                debug_print(
+                    parser,
+                    f"<<{outcome} rule {name}{in_rule} at position {parser.position} "
+                    f"=> {parser.context()}",
+                    -1,
+                )
+
+        return traced_parse
+
+    def _traced_match_start(
+        self,
+        traced_parser: Parser,
+        expression: Match,
+        method: Callable[[Parser], Any],
+    ) -> Callable[[Parser], Any]:
+        debug_print = self._print
+
+        def traced_parse(parser: Parser) -> Any:
+            if parser is not traced_parser:
+                return method(parser)
+            if parser.skipws and not parser.in_lex_rule:
+                # Whitespace is skipped as in `Match.parse` so that the attempt
+                # is reported before the comments are parsed.
+                pos = parser.position
+                ws = parser.ws
+                i = parser.input
+                length = len(i)
+                while pos < length and i[pos] in ws:
+                    pos += 1
+                parser.position = pos
+            in_rule = f" in {parser.in_rule}" if parser.in_rule else ""
+            debug_print(
+                parser,
+                f"?? Try match rule {expression.name}{in_rule} at position "
+                f"{parser.position} => {parser.context()}",
+            )
+            return method(parser)
+
+        return traced_parse
+
+    def _traced_match(
+        self,
+        traced_parser: Parser,
+        expression: Match,
+        method: Callable[[Parser], Any],
+    ) -> Callable[[Parser], Any]:
+        debug_print = self._print
+
+        def traced_parse(parser: Parser) -> Any:
+            if parser is not traced_parser:
+                return method(parser)
+            c_pos = parser.position
+            try:
+                result = method(parser)
+            except NoMatch:
+                if isinstance(expression, EndOfFile):
+                    debug_print(parser, "!! EOF not matched.")
+                elif isinstance(expression, StrMatch):
+                    to_match = expression.to_match
+                    debug_print(
+                        parser,
+                        f"-- No match '{to_match}' at {c_pos} => "
+                        f"'{parser.context(len(to_match), c_pos)}'",
+                    )
+                elif isinstance(expression, RegExMatch):
+                    debug_print(parser, f"-- NoMatch at {c_pos}")
+                raise
+            if isinstance(expression, StrMatch):
+                matched = expression.to_match
+            elif isinstance(expression, RegExMatch):
+                matched = parser.input[c_pos : parser.position]
+            else:
+                return result
+            debug_print(
+                parser,
+                f"++ Match '{matched}' at {c_pos} => "
+                f"'{parser.context(len(matched), c_pos)}'",
+            )
+            return result
+
+        return traced_parse
+
+
+class RecordedEvent(NamedTuple):
+    """
+    A parse attempt kept by `FlightRecorder`.
+    """
+
+    rule: str
+    position: int
+    # The end of the match or -1 if the attempt failed.
+    end: int
+
+
+class FlightRecorder(ParserTracer):
+    """
+    Keeps the outcomes of the last parse attempts in a ring buffer of
+    preallocated arrays. The recorded events are dumped in readable form
+    when the parse fails or when it takes longer than the time budget:
+
+        recorder = FlightRecorder(parser, size=1000, budget=5)
+        recorder.enable()
+
+    Recording runs the parser on the instrumented engine which writes each
+    parse attempt into the arrays, so it is not free: the Rhapsody model of
+    the performance tests takes about 25-40% longer to parse while the
+    recorder is enabled.
+
+    Args:
+        parser(Parser): The recorded parser.
+        size(int): The number of the kept events. Default is 1000.
+        budget(float): Parse time in seconds after which the events are
+            dumped. The time is measured from the first event of the parse
+            and checked every 1024 events. Default is None, i.e. no budget.
+        sink(callable): Called with the dump text. By default the dump is
+            printed to stderr.
+
+    Attributes:
+        count (int): The number of events recorded since the last reset.
+        last_dump (str): The text of the last dump.
+    """
+
+    # The number of events between time budget checks.
+    check_interval = 1024
+
+    def __init__(
+        self,
+        parser: Parser,
+        size: int = 1000,
+        budget: float | None = None,
+        sink: Callable[[str], Any] | None = None,
+    ) -> None:
+        super().__init__(parser)
+        self.size: int = size
+        self.budget: float | None = budget
+        self.sink: Callable[[str], Any] | None = sink
+        nodes = _model_nodes(parser)
+        self._names: list[str] = [name for _, name in nodes]
+        # Node id -> index in `_names`.
+        self._ids: dict[int, int] = {id(node): i for i, (node, _) in enumerate(nodes)}
+        self._root: ParsingExpression = parser.parser_model
+        self._rules: array[int] = array("l", [0]) * size
+        self._positions: array[int] = array("l", [0]) * size
+        self._ends: array[int] = array("l", [0]) * size
+        self.count: int = 0
+        self.last_dump: str | None = None
+        # Input and start time of the parse checked against the budget.
+        self._input: str | None = None
+        self._start: float = 0.0
+        self._over_budget: bool = False
+        # The count at which the time budget is checked next.
+        self._next_check: int = 0
+
+    def reset(self) -> None:
+        self.count = 0
+        self._input = None
+        self._next_check = 0
+
+    def _traced_method(
+        self,
+        traced_parser: Parser,
+        expression: ParsingExpression,
+        attr: str,
+        method: Callable[[Parser], Any],
+    ) -> Callable[[Parser], Any] | None:
+        # The outcome is written straight into the ring arrays, with no event
+        # method calls per parse attempt.
+        if attr == "parse" and isinstance(expression, Match):
+            return None
+        recorder = self
+        rule = self._ids[id(expression)]
+        root = expression is self._root
+        size = self.size
+        rules = self._rules
+        positions = self._positions
+        ends = self._ends
+
+        def recorded_parse(parser: Parser) -> Any:
+            if parser is not traced_parser:
+                return method(parser)
+            position = parser.position
+            end = -1
+            try:
+                result = method(parser)
+                end = parser.position
+                return result
+            finally:
+                count = recorder.count
+                i = count % size
+                rules[i] = rule
+                positions[i] = position
+                ends[i] = end
+                recorder.count = count + 1
+                if count >= recorder._next_check:
+                    recorder._check_budget(count)
+                if root:
+                    recorder._parse_done(parser, position, end)
+
+        return recorded_parse
+
+    def _parse_done(self, parser: Parser, position: int, end: int) -> None:
+        # The next parse is timed from its first event.
+        self._input = None
+        self._next_check = self.count
+        if end < 0:
+            if parser.nm is not None:
+                position = parser.nm.position
+            self.dump(f"Parse failed at {parser.pos_to_linecol(position)}.")
+
+    def _check_budget(self, count: int) -> None:
+        self._next_check = count + self.check_interval
+        budget = self.budget
+        if budget is None:
+            return
+        parser = self.parser
+        if parser.input is not self._input:
+            self._input = parser.input
+            self._start = time.perf_counter()
+            self._over_budget = False
+        elif not self._over_budget and time.perf_counter() - self._start > budget:
+            # Dump only once per parse.
+            self._over_budget = True
+            self.dump(f"Parse time budget of {budget} s exceeded.")
+
+    def events(self) -> list[RecordedEvent]:
+        """
+        Returns the kept events, the oldest first.
+        """
+        start = max(self.count - self.size, 0)
+        events = []
+        for n in range(start, self.count):
+            i = n % self.size
+            events.append(
+                RecordedEvent(
+                    self._names[self._rules[i]], self._positions[i], self._ends[i]
+                )
+            )
+        return events
+
+    def report(self, reason: str = "") -> str:
+        """
+        Returns the kept events formatted as text with the positions as
+        (line, column) of the current parser input.
+        """
+        events = self.events()
+        linecol = self.parser.pos_to_linecol
+        lines = [f"Flight recorder: {reason}" if reason else "Flight recorder:"]
+        lines.append(f"Last {len(events)} of {self.count} parse events:")
+        lines.append(f"{'position':>15} {'outcome':>7} {'end':>15}  rule")
+        for event in events:
+            if event.end < 0:
+                outcome, end = "fail", ""
+            else:
+                outcome, end = "match", str(linecol(event.end))
+            lines.append(
+                f"{str(linecol(event.position)):>15} {outcome:>7} {end:>15}  {event.rule}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, reason: str = "") -> str:
+        """
+        Formats the kept events and passes them to the sink.
+        """
+        self.last_dump = self.report(reason)
+        if self.sink is None:
+            print(self.last_dump, file=sys.stderr)
+        else:
+            self.sink(self.last_dump)
+        return self.last_dump
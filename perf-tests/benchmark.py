@@ -0,0 +1,484 @@
+#######################################################################
+# Benchmark suite. Grammar construction, parsing and visiting are timed
+# for the example grammars on scaled inputs and for the Rhapsody perf
+# input, with and without memoization, for ParserPython and ParserPEG.
+# Each benchmark is run repeatedly after warmup runs and the statistics
+# of the runs are written as JSON. Two result files are compared with
+# the `compare` command, which fails if there are regressions. The
+# `scaling` command parses inputs generated from the grammars with growing
+# size and nesting depth and flags nonlinear parse times.
+#
+#   python benchmark.py run --output reports/results.json
+#   python benchmark.py compare reports/old.json reports/results.json
+#   python benchmark.py scaling --output reports/scaling.json
+#
+# License: MIT License
+#######################################################################
+
+import argparse
+import gc
+import importlib.util
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from os.path import dirname, join
+from typing import Any, Callable, NamedTuple
+
+from grammar import rhapsody
+
+from arpeggio import (
+    EOF,
+    OneOrMore,
+    Parser,
+    ParserPython,
+    PTNodeVisitor,
+    __version__,
+    visit_parse_tree,
+)
+from arpeggio import GrammarError, cleanpeg, peg
+from arpeggio.generator import InputGenerator
+
+HERE = dirname(__file__)
+EXAMPLES = join(HERE, "..", "examples")
+
+
+def read(*path: str) -> str:
+    with open(join(*path), encoding="utf-8") as f:
+        return f.read()
+
+
+def load_example(example: str, module: str) -> Any:
+    """
+    Loads an example module by its path. Example module names can't be
+    used for import as e.g. `json` is shadowed by the standard library.
+    """
+    spec = importlib.util.spec_from_file_location(
+        f"example_{module}", join(EXAMPLES, example, f"{module}.py")
+    )
+    assert spec is not None and spec.loader is not None
+    module_obj = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module_obj)
+    return module_obj
+
+
+class Case(NamedTuple):
+    """
+    A grammar with an input which can be scaled.
+    """
+
+    name: str
+    # "python", "peg" or "cleanpeg".
+    parser_type: str
+    make_parser: Callable[[bool], Parser]
+    # Returns the input of the given scale or None if it can't be scaled.
+    make_input: Callable[[int], "str | None"]
+    make_visitor: Callable[[], PTNodeVisitor]
+    # Token separator of the generated inputs if a space doesn't work.
+    separator: "str | None" = None
+
+
+def repeated(content: str, separator: str = "") -> Callable[[int], str]:
+    return lambda scale: separator.join([content] * scale)
+
+
+def cases() -> list[Case]:
+    calc = load_example("calc", "calc")
+    csv = load_example("csv", "csvlang")
+    bibtex = load_example("bibtex", "bibtex")
+    robot = load_example("robot", "robot")
+    json_example = load_example("json", "json")
+    simple = load_example("simple", "simple")
+
+    calc_input = repeated("-(4-1)*5+(2+4.67)+5.89/(.2+7)", "\n")
+    csv_input = repeated(read(EXAMPLES, "csv", "test_data.csv").rstrip("\n") + "\n")
+    robot_body = read(EXAMPLES, "robot", "program.rbt").split("\n", 1)[1]
+    robot_body = robot_body.rsplit("end", 1)[0]
+
+    def robot_input(scale: int) -> str:
+        return f"begin\n{robot_body * scale}end\n"
+
+    json_object = read(EXAMPLES, "json", "test.json")
+
+    def json_input(scale: int) -> str:
+        members = ", ".join(f'"item{i}": {json_object}' for i in range(scale))
+        return f"{{{members}}}"
+
+    def simple_program() -> Any:
+        # The example root rule parses a single function without EOF.
+        return OneOrMore(simple.simpleLanguage), EOF
+
+    peg_grammar = read(EXAMPLES, "peg_peg", "peg.peg")
+
+    def peg_visitor() -> PTNodeVisitor:
+        return peg.PEGVisitor("peggrammar", None, False)
+
+    def rhapsody_input(scale: int) -> "str | None":
+        if scale != 1:
+            return None
+        return read(HERE, "test_inputs", "LightSwitch.rpy")
+
+    def python(grammar: Any, *args: Any, **kwargs: Any) -> Callable[[bool], Parser]:
+        return lambda memo: ParserPython(grammar, *args, memoization=memo, **kwargs)
+
+    def from_peg(module: Any, *path: str, **kwargs: Any) -> Callable[[bool], Parser]:
+        grammar = read(EXAMPLES, *path)
+        return lambda memo: module.ParserPEG(grammar, memoization=memo, **kwargs)
+
+    return [
+        Case("calc", "python", python(calc.calc), calc_input, calc.CalcVisitor),
+        Case(
+            "calc",
+            "peg",
+            from_peg(peg, "calc", "calc.peg", root_rule_name="calc"),
+            calc_input,
+            calc.CalcVisitor,
+        ),
+        Case(
+            "calc",
+            "cleanpeg",
+            from_peg(cleanpeg, "calc", "calc_clean.peg", root_rule_name="calc"),
+            calc_input,
+            calc.CalcVisitor,
+        ),
+        Case(
+            "csv",
+            "python",
+            python(csv.csvfile, ws="\t "),
+            csv_input,
+            csv.CSVVisitor,
+        ),
+        Case(
+            "csv",
+            "cleanpeg",
+            from_peg(cleanpeg, "csv", "csvlang.peg", root_rule_name="csvfile", ws="\t "),
+            csv_input,
+            csv.CSVVisitor,
+        ),
+        Case(
+            "bibtex",
+            "python",
+            python(bibtex.bibfile),
+            repeated(read(EXAMPLES, "bibtex", "bibtex_example.bib"), "\n"),
+            bibtex.BibtexVisitor,
+        ),
+        Case("robot", "python", python(robot.robot), robot_input, robot.RobotVisitor),
+        Case(
+            "robot",
+            "cleanpeg",
+            from_peg(cleanpeg, "robot", "robot.peg", root_rule_name="robot"),
+            robot_input,
+            robot.RobotVisitor,
+        ),
+        Case("json", "python", python(json_example.jsonFile), json_input, PTNodeVisitor),
+        Case(
+            "simple",
+            "python",
+            python(simple_program, simple.comment),
+            repeated(read(EXAMPLES, "simple", "program.simple"), "\n"),
+            PTNodeVisitor,
+        ),
+        Case(
+            "peg_peg",
+            "python",
+            python(peg.peggrammar, peg.comment),
+            repeated(peg_grammar, "\n"),
+            peg_visitor,
+        ),
+        Case(
+            "peg_peg",
+            "peg",
+            from_peg(
+                peg,
+                "peg_peg",
+                "peg.peg",
+                root_rule_name="peggrammar",
+                comment_rule_name="comment",
+            ),
+            repeated(peg_grammar, "\n"),
+            peg_visitor,
+        ),
+        Case(
+            "rhapsody",
+            "python",
+            python(rhapsody),
+            rhapsody_input,
+            PTNodeVisitor,
+            # The header rule matches the rest of the first line.
+            separator="\n",
+        ),
+    ]
+
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int) -> tuple[list[float], Any]:
+    """
+    Calls the function `warmup` times and then `repeat` times measuring
+    each call. Garbage collection is disabled during the measured calls.
+    Returns the times of the calls in seconds and the last result.
+    """
+    result = None
+    for _ in range(warmup):
+        result = func()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return times, result
+
+
+def summary(times: list[float]) -> dict[str, Any]:
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "runs": times,
+    }
+
+
+def run(args: argparse.Namespace) -> None:
+    scales = [int(s) for s in args.scales.split(",")]
+    memoizations = {"both": [False, True], "on": [True], "off": [False]}[args.memo]
+    results = []
+
+    print(f"{'benchmark':<42} {'median ms':>10} {'stdev ms':>9} {'KB/s':>9}")
+    for case in cases():
+        for memo in memoizations:
+            key = f"{case.name}/{case.parser_type}/{'memo' if memo else 'nomemo'}"
+            if args.filter and not re.search(args.filter, key):
+                continue
+
+            def record(name: str, times: list[float], **info: Any) -> None:
+                result = {"name": name, "case": case.name, **info, **summary(times)}
+                results.append(result)
+                size = info.get("input_size")
+                speed = f"{size / 1000 / result['median']:9.1f}" if size else ""
+                print(
+                    f"{name:<42} {result['median'] * 1000:10.2f} "
+                    f"{result['stdev'] * 1000:9.2f} {speed:>9}"
+                )
+
+            info = {"parser": case.parser_type, "memoization": memo}
+            times, parser = measure(
+                lambda: case.make_parser(memo), args.repeat, args.warmup
+            )
+            record(f"{key}/construct", times, phase="construct", **info)
+
+            for scale in scales:
+                content = case.make_input(scale)
+                if content is None:
+                    continue
+                info.update(scale=scale, input_size=len(content))
+                times, tree = measure(
+                    lambda: parser.parse(content), args.repeat, args.warmup
+                )
+                record(f"{key}/x{scale}/parse", times, phase="parse", **info)
+                times, _ = measure(
+                    lambda: visit_parse_tree(tree, case.make_visitor()),
+                    args.repeat,
+                    args.warmup,
+                )
+                record(f"{key}/x{scale}/visit", times, phase="visit", **info)
+
+    meta = {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "arpeggio": __version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+        "scales": scales,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=1)
+    if args.history:
+        # One line per run with the medians for tracking over time.
+        with open(args.history, "a", encoding="utf-8") as f:
+            medians = {r["name"]: r["median"] for r in results}
+            f.write(json.dumps({"meta": meta, "medians": medians}) + "\n")
+
+
+def compare(args: argparse.Namespace) -> int:
+    """
+    Compares the medians of the benchmarks in both files. A benchmark has
+    regressed if its median grew by more than the threshold and by more
+    than the noise, i.e. the sum of the standard deviations of both runs.
+    """
+
+    def load(file_name: str) -> dict[str, Any]:
+        with open(file_name, encoding="utf-8") as f:
+            return {r["name"]: r for r in json.load(f)["results"]}
+
+    old, new = load(args.old), load(args.new)
+    regressions = 0
+    print(f"{'benchmark':<42} {'old ms':>10} {'new ms':>10} {'change':>8}")
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        change = after["median"] / before["median"] - 1
+        noise = before["stdev"] + after["stdev"]
+        flag = ""
+        if abs(after["median"] - before["median"]) > noise:
+            if change > args.threshold:
+                flag = "REGRESSION"
+                regressions += 1
+            elif change < -args.threshold:
+                flag = "improved"
+        print(
+            f"{name:<42} {before['median'] * 1000:10.2f} "
+            f"{after['median'] * 1000:10.2f} {change:+8.1%} {flag}"
+        )
+    for name in sorted(old.keys() - new.keys()):
+        print(f"{name:<42} missing in {args.new}")
+    for name in sorted(new.keys() - old.keys()):
+        print(f"{name:<42} new in {args.new}")
+
+    print()
+    print(f"{regressions} regression(s) above {args.threshold:.0%}.")
+    return 1 if regressions else 0
+
+
+def scaling(args: argparse.Namespace) -> int:
+    """
+    Parses generated inputs of growing size, and of growing nesting depth
+    with a fixed size. Parsing is linear if the throughput is the same for
+    all inputs of a series. A series is flagged if the time per character
+    of its last input is more than `--tolerance` times the time per
+    character of its first input.
+    """
+    sizes = [int(s) for s in args.sizes.split(",")]
+    depths = [int(d) for d in args.depths.split(",")]
+    memoizations = {"both": [False, True], "on": [True], "off": [False]}[args.memo]
+    results = []
+    nonlinear = 0
+
+    print(f"{'benchmark':<42} {'input':>8} {'median ms':>10} {'KB/s':>9}")
+    for case in cases():
+        for memo in memoizations:
+            key = f"{case.name}/{case.parser_type}/{'memo' if memo else 'nomemo'}"
+            if args.filter and not re.search(args.filter, key):
+                continue
+            parser = case.make_parser(memo)
+            series = [("size", size, {"size": size}) for size in sizes]
+            series += [
+                ("depth", depth, {"size": args.depth_size, "depth": depth})
+                for depth in depths
+            ]
+            per_char: dict[str, list[float]] = {"size": [], "depth": []}
+            for kind, value, options in series:
+                name = f"{key}/{kind}{value}"
+                generator = InputGenerator(
+                    parser, seed=args.seed, separator=case.separator, **options
+                )
+                try:
+                    content = generator.generate()
+                except GrammarError as e:
+                    print(f"{name:<42} {e}")
+                    continue
+                times, _ = measure(lambda: parser.parse(content), args.repeat, 0)
+                result = {
+                    "name": name,
+                    "case": case.name,
+                    "parser": case.parser_type,
+                    "memoization": memo,
+                    "input_size": len(content),
+                    **options,
+                    **summary(times),
+                }
+                results.append(result)
+                per_char[kind].append(result["median"] / len(content))
+                print(
+                    f"{name:<42} {len(content):8} {result['median'] * 1000:10.2f} "
+                    f"{len(content) / 1000 / result['median']:9.1f}"
+                )
+            for kind, values in per_char.items():
+                if len(values) > 1 and values[-1] > values[0] * args.tolerance:
+                    nonlinear += 1
+                    print(
+                        f"{key}: NONLINEAR in {kind}, time per character grew "
+                        f"{values[-1] / values[0]:.1f} times"
+                    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=1)
+    print()
+    print(f"{nonlinear} nonlinear series.")
+    return 1 if nonlinear else 0
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", help="JSON results file")
+    run_parser.add_argument("--history", help="JSON lines file to append medians to")
+    run_parser.add_argument("--repeat", type=int, default=5, help="measured runs")
+    run_parser.add_argument("--warmup", type=int, default=1, help="warmup runs")
+    run_parser.add_argument(
+        "--scales", default="1,10,100", help="comma separated input scales"
+    )
+    run_parser.add_argument(
+        "--memo", choices=["both", "on", "off"], default="both", help="memoization"
+    )
+    run_parser.add_argument(
+        "--filter", help="regex for `case/parser/memo` of the benchmarks to run"
+    )
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.1, help="relative slowdown to flag"
+    )
+
+    scaling_parser = commands.add_parser(
+        "scaling", help="parse generated inputs of growing size and depth"
+    )
+    scaling_parser.add_argument("--output", help="JSON results file")
+    scaling_parser.add_argument(
+        "--sizes", default="1000,10000,100000", help="comma separated input sizes"
+    )
+    scaling_parser.add_argument(
+        "--depths", default="5,10,20,40", help="comma separated nesting depths"
+    )
+    scaling_parser.add_argument(
+        "--depth-size", type=int, default=10000, help="input size of the depth series"
+    )
+    scaling_parser.add_argument("--seed", type=int, default=0, help="generator seed")
+    scaling_parser.add_argument("--repeat", type=int, default=3, help="measured runs")
+    scaling_parser.add_argument(
+        "--memo", choices=["both", "on", "off"], default="both", help="memoization"
+    )
+    scaling_parser.add_argument(
+        "--filter", help="regex for `case/parser/memo` of the benchmarks to run"
+    )
+    scaling_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=2.0,
+        help="growth of the time per character to flag",
+    )
+
+    args = arg_parser.parse_args()
+    if args.command == "run":
+        run(args)
+        return 0
+    if args.command == "scaling":
+        return scaling(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
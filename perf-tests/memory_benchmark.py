@@ -0,0 +1,112 @@
+#######################################################################
+# Memory benchmark. Parses the inputs of the benchmark suite with
+# tracemalloc tracing and reports the memory retained after the parse,
+# the peak during the parse and how the retained memory splits into the
+# parse tree nodes, terminal values, `extra_info` objects, comments and
+# `comment_positions`, plus the size of the memoization caches. The rules
+# retaining the most memory are listed for the largest input of each case.
+#
+#   python memory_benchmark.py --output reports/memory.json
+#
+# License: MIT License
+#######################################################################
+
+import argparse
+import gc
+import json
+import re
+import sys
+import tracemalloc
+from typing import Any
+
+from benchmark import Case, cases
+
+from arpeggio.stats import tree_memory
+
+
+def measure(case: Case, memo: bool, content: str) -> dict[str, Any]:
+    # A fresh parser for each parse as the parser keeps the comments.
+    parser = case.make_parser(memo)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tree = parser.parse(content)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    memory = tree_memory(tree, parser)
+    _, stats = case.make_parser(memo).parse(content, stats=True)
+    return {
+        "input_size": len(content),
+        "retained": current - before,
+        "peak": peak - before,
+        "tree_nodes": memory.nodes,
+        "tree": memory.node_size,
+        "values": memory.value_size,
+        "extra_info": memory.extra_info_size,
+        "comments": memory.comment_size,
+        "comment_positions": memory.comment_positions_size,
+        "memo_entries": stats.memo_entries,
+        "memo": stats.memo_size,
+        "rules": [rule._asdict() for rule in memory.top()],
+    }
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--output", help="JSON results file")
+    arg_parser.add_argument(
+        "--scales", default="1,10,100", help="comma separated input scales"
+    )
+    arg_parser.add_argument(
+        "--memo", choices=["both", "on", "off"], default="both", help="memoization"
+    )
+    arg_parser.add_argument(
+        "--filter", help="regex for `case/parser/memo` of the benchmarks to run"
+    )
+    arg_parser.add_argument(
+        "--rules", type=int, default=5, help="rules listed for the largest input"
+    )
+    args = arg_parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",")]
+    memoizations = {"both": [False, True], "on": [True], "off": [False]}[args.memo]
+    results = []
+
+    columns = ["retained", "peak", "tree", "values", "extra_info", "comments", "memo"]
+    header = " ".join(f"{c:>10}" for c in columns)
+    print(f"{'benchmark (KB)':<34} {'input':>8} {header}")
+    for case in cases():
+        for memo in memoizations:
+            key = f"{case.name}/{case.parser_type}/{'memo' if memo else 'nomemo'}"
+            if args.filter and not re.search(args.filter, key):
+                continue
+            result = None
+            for scale in scales:
+                content = case.make_input(scale)
+                if content is None:
+                    continue
+                result = measure(case, memo, content)
+                result.update(name=f"{key}/x{scale}", case=case.name, scale=scale)
+                result.update(parser=case.parser_type, memoization=memo)
+                results.append(result)
+                values = " ".join(f"{result[c] / 1024:10.1f}" for c in columns)
+                print(f"{result['name']:<34} {len(content) / 1024:8.1f} {values}")
+            if result and args.rules:
+                for rule in result["rules"][: args.rules]:
+                    print(
+                        f"    {rule['rule']:<30} {rule['nodes']:>8} nodes "
+                        f"{rule['size'] / 1024:10.1f} KB"
+                    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,3 +6,12 @@ python test_memory_nomemoization.py >> reports/${1}_memory_report_nomemoization.
 
 python --version > reports/${1}_memory_report_memoization.txt 2>&1 
 python test_memory_memoization.py >> reports/${1}_memory_report_memoization.txt
+
+python --version > reports/${1}_memory_report_lazy_terminals.txt 2>&1
+python test_memory_lazy_terminals.py >> reports/${1}_memory_report_lazy_terminals.txt
+
+python --version > reports/${1}_memory_report_visitor.txt 2>&1
+python test_memory_visitor.py >> reports/${1}_memory_report_visitor.txt
+
+python --version > reports/${1}_memory_benchmark_report.txt 2>&1
+python memory_benchmark.py --output reports/${1}_memory_benchmark.json >> reports/${1}_memory_benchmark_report.txt
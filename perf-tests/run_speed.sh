@@ -3,3 +3,32 @@ mkdir -p reports
 python --version > reports/${1}_speed_report.txt 2>&1
 python test_speed.py >> reports/${1}_speed_report.txt
 
+python --version > reports/${1}_peg_construction_report.txt 2>&1
+python test_peg_construction.py >> reports/${1}_peg_construction_report.txt
+
+python --version > reports/${1}_visitor_speed_report.txt 2>&1
+python test_visitor_speed.py >> reports/${1}_visitor_speed_report.txt
+
+python --version > reports/${1}_visitor_parallel_report.txt 2>&1
+python test_visitor_parallel.py >> reports/${1}_visitor_parallel_report.txt
+
+python --version > reports/${1}_visitor_batch_report.txt 2>&1
+python test_visitor_batch.py >> reports/${1}_visitor_batch_report.txt
+
+python --version > reports/${1}_visitor_cache_report.txt 2>&1
+python test_visitor_cache.py >> reports/${1}_visitor_cache_report.txt
+
+python --version > reports/${1}_lazy_report.txt 2>&1
+python test_lazy.py >> reports/${1}_lazy_report.txt
+
+python --version > reports/${1}_profiler_report.txt 2>&1
+python test_profiler.py >> reports/${1}_profiler_report.txt
+
+python --version > reports/${1}_tracer_report.txt 2>&1
+python test_tracer.py >> reports/${1}_tracer_report.txt
+
+python --version > reports/${1}_operation_counts_report.txt 2>&1
+python test_operation_counts.py >> reports/${1}_operation_counts_report.txt
+
+python benchmark.py run --output reports/${1}_benchmark.json > reports/${1}_benchmark_report.txt
+python benchmark.py scaling --output reports/${1}_scaling.json > reports/${1}_scaling_report.txt
@@ -0,0 +1,78 @@
+#######################################################################
+# Testing lazy parsing of nested blocks. Only the top-level properties of
+# the Rhapsody model are parsed while nested objects are scanned for
+# their extent and parsed on demand. Compared to the full parse and to
+# the lazy parse followed by the expansion of all lazy blocks.
+# License: MIT License
+#######################################################################
+
+import codecs
+import time
+from os.path import dirname, join
+
+from grammar import GUID, _float, _int, _string, header, ident, obj, rhapsody
+
+from arpeggio import (
+    Lazy,
+    Not,
+    OneOrMore,
+    Optional,
+    ParserPython,
+    ZeroOrMore,
+    expand_lazy,
+)
+
+
+def outline_value():
+    return [_string, _int, _float, GUID, Lazy(obj), ident]
+
+
+def outline_prop():
+    return (
+        "-",
+        ident,
+        "=",
+        Optional(
+            outline_value, ZeroOrMore(Optional(";"), Not(["-", "}"]), outline_value)
+        ),
+        Optional(";"),
+    )
+
+
+def outline():
+    return header, "{", ident, OneOrMore(outline_prop), "}"
+
+
+def timeit(parser, content, message, expand=False):
+    t_start = time.time()
+    parse_tree = parser.parse(content)
+    if expand:
+        expand_lazy(parse_tree)
+    t_end = time.time()
+
+    print(message)
+    print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+    print()
+
+
+def main():
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitchDouble.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    parser = ParserPython(rhapsody)
+    lazy_parser = ParserPython(outline)
+
+    for i in range(3):
+        timeit(parser, content, f"{i + 1}. Full parse.")
+        timeit(lazy_parser, content, f"{i + 1}. Lazy parse of nested objects.")
+        timeit(
+            lazy_parser,
+            content,
+            f"{i + 1}. Lazy parse and expansion of all objects.",
+            expand=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#######################################################################
+# Purpose: Testing memory consumption with lazy terminals (no memoization)
+# License: MIT License
+#######################################################################
+
+import codecs
+from os.path import dirname, join
+
+from grammar import rhapsody
+from memory_profiler import profile
+
+from arpeggio import ParserPython
+
+
+@profile
+def lazy_terminals():
+    parser = ParserPython(rhapsody, memoization=False, lazy_terminals=True)
+
+    # Smaller file
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitch.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    small = parser.parse(content)
+
+    # File that is double in size
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitchDouble.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    large = parser.parse(content)
+
+
+if __name__ == "__main__":
+    lazy_terminals()
@@ -0,0 +1,58 @@
+#######################################################################
+# Purpose: Testing memory allocated for children results during a full
+#   visit of the parse tree. The visitor keeps the children results of
+#   every node so all allocated containers are retained. The time of a
+#   visit with default actions is reported as well.
+# License: MIT License
+#######################################################################
+
+import codecs
+import gc
+import time
+import tracemalloc
+from os.path import dirname, join
+
+from grammar import rhapsody
+
+from arpeggio import ParserPython, PTNodeVisitor, visit_parse_tree
+
+
+class KeepChildrenVisitor(PTNodeVisitor):
+    def visit__default__(self, node, children):
+        return children if children else str(node)
+
+
+def measure(parse_tree, visitor, message):
+    gc.collect()
+    tracemalloc.start()
+    result = visit_parse_tree(parse_tree, visitor)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    print(message)
+    print(f"Peak = {peak / 1e6:.2f}", "MB")
+    print(f"Retained = {current / 1e6:.2f}", "MB")
+    print()
+
+
+def main():
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitchDouble.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    parse_tree = ParserPython(rhapsody).parse(content)
+
+    measure(parse_tree, KeepChildrenVisitor(), "Visit keeping all children results.")
+
+    for i in range(3):
+        t_start = time.time()
+        visit_parse_tree(parse_tree, PTNodeVisitor())
+        t_end = time.time()
+        print(f"{i + 1}. Visit with default actions.")
+        print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+        print()
+
+
+if __name__ == "__main__":
+    main()
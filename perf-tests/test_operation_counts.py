@@ -0,0 +1,47 @@
+#######################################################################
+# Operation count budget of the Rhapsody parser. Counts the engine
+# operations of parsing the Rhapsody model with and without memoization.
+# The counts are deterministic so, unlike timings, they can be checked
+# exactly with pytest. Run as a script to print the counts.
+# License: MIT License
+#######################################################################
+
+import codecs
+from os.path import dirname, join
+
+from grammar import rhapsody
+
+from arpeggio import ParserPython
+from arpeggio.stats import assert_operation_budget, count_operations
+
+# The counts of the current engine with about 10% headroom.
+BUDGET = dict(calls=520000, no_matches=150000, nodes=215000, rescanned=38200)
+MEMO_BUDGET = dict(BUDGET, memo_lookups=274000)
+
+
+def rhapsody_counts(memoization):
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitch.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+    return count_operations(ParserPython(rhapsody, memoization=memoization), content)
+
+
+def test_rhapsody_budget():
+    assert_operation_budget(rhapsody_counts(False), **BUDGET)
+
+
+def test_rhapsody_memo_budget():
+    assert_operation_budget(rhapsody_counts(True), **MEMO_BUDGET)
+
+
+def main():
+    for memoization in (False, True):
+        counts = rhapsody_counts(memoization)
+        print(f"Memoization: {memoization}")
+        for name, value in counts.as_dict().items():
+            print(f"{name}: {value}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
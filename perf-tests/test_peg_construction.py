@@ -0,0 +1,72 @@
+#######################################################################
+# Testing ParserPEG construction throughput for small grammars. Parser
+# construction with the shared meta-parser is compared to construction
+# where the meta-parser is rebuilt for every grammar.
+# License: MIT License
+#######################################################################
+
+import time
+
+from arpeggio import cleanpeg, peg
+
+GRAMMARS = [
+    (
+        peg.ParserPEG,
+        r"""
+        number <- r'\d*\.\d*|\d+';
+        factor <- ("+" / "-")? (number / "(" expression ")");
+        term <- factor (( "*" / "/") factor)*;
+        expression <- term (("+" / "-") term)*;
+        calc <- expression+ EOF;
+        """,
+        "calc",
+    ),
+    (
+        cleanpeg.ParserPEG,
+        r"""
+        csvfile = (csvline / "\n")* EOF
+        csvline = field ("," field)*
+        field = r'[^,\n]+'
+        """,
+        "csvfile",
+    ),
+    (
+        cleanpeg.ParserPEG,
+        r"""
+        keyvalues = (key "=" value)+ EOF
+        key = r'\w+'
+        value = r'"[^"]*"' / r'\d+'
+        """,
+        "keyvalues",
+    ),
+]
+
+
+def timeit(message, count, shared):
+    t_start = time.time()
+    for _ in range(count):
+        for parser_class, grammar, root_rule in GRAMMARS:
+            if not shared:
+                # Emulate the previous behavior where a new meta-parser is
+                # built for each grammar.
+                peg._meta_parsers.clear()
+            parser_class(grammar, root_rule)
+    t_end = time.time()
+
+    constructed = count * len(GRAMMARS)
+    print(message)
+    print(f"Parsers constructed: {constructed}")
+    print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+    print(f"Speed = {constructed / (t_end - t_start):.2f}", "parsers/sec")
+    print()
+
+
+def main():
+    count = 200
+    for i in range(3):
+        timeit(f"{i + 1}. Meta-parser rebuilt for each grammar.", count, False)
+        timeit(f"{i + 1}. Shared meta-parser.", count, True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#######################################################################
+# Testing the overhead of the rule profiler. The Rhapsody model is parsed
+# before the profiler is created, with the profiler enabled and after it
+# is disabled. The top of the profiler report is printed. The same is
+# done for the backtracking heatmap and the flame graph.
+# License: MIT License
+#######################################################################
+
+import codecs
+import time
+from os.path import dirname, join
+
+from grammar import rhapsody
+
+from arpeggio import ParserPython
+from arpeggio.profiler import BacktrackHeatmap, FlameGraph, RuleProfiler
+
+
+def timeit(parser, content, message):
+    t_start = time.time()
+    parser.parse(content)
+    t_end = time.time()
+
+    print(message)
+    print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+    print()
+
+
+def main():
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitchDouble.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    parser = ParserPython(rhapsody)
+
+    timeit(parser, content, "Parse without profiler.")
+    profiler = RuleProfiler(parser)
+    with profiler:
+        timeit(parser, content, "Parse with profiler enabled.")
+    timeit(parser, content, "Parse with profiler disabled.")
+
+    print(profiler.report(limit=15))
+    print()
+
+    with BacktrackHeatmap(parser) as heatmap:
+        timeit(parser, content, "Parse with backtracking heatmap enabled.")
+    print(heatmap.report(limit=5))
+    print()
+
+    with FlameGraph(parser) as flame_graph:
+        timeit(parser, content, "Parse with flame graph enabled.")
+    stacks = sorted(flame_graph.times().items(), key=lambda s: -s[1])[:5]
+    print("Stacks with most self time:")
+    for stack, self_time in stacks:
+        print(f"{self_time * 1000:10.2f} ms  {stack}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#######################################################################
+# Testing the overhead of parse tracing. The Rhapsody model is parsed
+# with the default engine, with a tracer counting parse attempts and with
+# the debug tracer writing to a discarding sink and with the flight
+# recorder. The default engine is timed again after the tracer is removed.
+# License: MIT License
+#######################################################################
+
+import codecs
+import time
+from os.path import dirname, join
+
+from grammar import rhapsody
+
+from arpeggio import ParserPython
+from arpeggio.trace import DebugTracer, FlightRecorder, Tracer
+
+
+class CountingTracer(Tracer):
+    def __init__(self):
+        self.attempts = 0
+
+    def enter(self, expression, parser):
+        self.attempts += 1
+
+
+def timeit(parser, content, message):
+    t_start = time.time()
+    parser.parse(content)
+    t_end = time.time()
+
+    print(message)
+    print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+    print()
+
+
+def main():
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitchDouble.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    parser = ParserPython(rhapsody)
+    timeit(parser, content, "Parse with the default engine.")
+
+    tracer = CountingTracer()
+    parser.tracer = tracer
+    timeit(parser, content, "Parse with a counting tracer.")
+    print(f"Parse attempts: {tracer.attempts}")
+    print()
+
+    parser.tracer = DebugTracer(sink=lambda message: None)
+    timeit(parser, content, "Parse with the debug tracer.")
+
+    parser.tracer = FlightRecorder(parser, size=10000, budget=60)
+    timeit(parser, content, "Parse with the flight recorder.")
+
+    parser.tracer = None
+    timeit(parser, content, "Parse with the default engine again.")
+
+
+if __name__ == "__main__":
+    main()
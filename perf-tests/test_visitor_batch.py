@@ -0,0 +1,85 @@
+#######################################################################
+# Testing batch visit methods. A visit converting many number terminals
+# with visit_number is compared to the conversion of all of them at once
+# in visit_batch_number.
+# License: MIT License
+#######################################################################
+
+import random
+import time
+
+from arpeggio import EOF, OneOrMore, ParserPython, PTNodeVisitor, visit_parse_tree
+from arpeggio import RegExMatch as _
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def number():
+    return _(r"\d+\.\d+")
+
+
+def row():
+    return OneOrMore(number, sep=","), ";"
+
+
+def data():
+    return OneOrMore(row), EOF
+
+
+class RowVisitor(PTNodeVisitor):
+    def visit_row(self, node, children):
+        return children.number
+
+    def visit_data(self, node, children):
+        return children.row
+
+
+class NumberVisitor(RowVisitor):
+    def visit_number(self, node, children):
+        return float(node.value)
+
+
+class BatchVisitor(RowVisitor):
+    def visit_batch_number(self, batch):
+        return list(map(float, batch.values))
+
+
+class NumpyBatchVisitor(RowVisitor):
+    def visit_batch_number(self, batch):
+        return numpy.array(batch.values, dtype=float)
+
+
+def timeit(parse_tree, message, visitor):
+    t_start = time.time()
+    visit_parse_tree(parse_tree, visitor)
+    t_end = time.time()
+
+    print(message)
+    print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+    print()
+
+
+def main():
+    random.seed(1)
+    content = "\n".join(
+        ", ".join(f"{random.random() * 1000:.3f}" for _ in range(20)) + ";"
+        for _ in range(10000)
+    )
+    parse_tree = ParserPython(data, lazy_terminals=True).parse(content)
+
+    for i in range(3):
+        timeit(parse_tree, f"{i + 1}. visit_number.", NumberVisitor())
+        timeit(parse_tree, f"{i + 1}. visit_batch_number.", BatchVisitor())
+        if numpy is not None:
+            timeit(
+                parse_tree,
+                f"{i + 1}. visit_batch_number with NumPy.",
+                NumpyBatchVisitor(),
+            )
+
+
+if __name__ == "__main__":
+    main()
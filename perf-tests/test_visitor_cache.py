@@ -0,0 +1,67 @@
+#######################################################################
+# Testing visits of an edited input with results of unchanged subtrees
+# taken from the cache. The Rhapsody model is visited, a value is changed
+# and the new parse tree is visited with and without the cache. The same
+# is done with the persistent cache reopened as in the next run.
+# License: MIT License
+#######################################################################
+
+import codecs
+import tempfile
+import time
+from os.path import dirname, join
+
+from grammar import rhapsody
+
+from arpeggio import ParserPython, PTNodeVisitor, visit_parse_tree
+from arpeggio.cache import PersistentVisitCache, VisitCache
+
+
+class RhapsodyVisitor(PTNodeVisitor):
+    def visit_ident(self, node, children):
+        return node.value
+
+    def visit_prop(self, node, children):
+        return (children[0], children[1:])
+
+    def visit_obj(self, node, children):
+        return {name: value for name, value in children[1:]}
+
+
+def timeit(parse_tree, message, cache=None):
+    t_start = time.time()
+    visit_parse_tree(parse_tree, RhapsodyVisitor(), cache=cache)
+    t_end = time.time()
+
+    print(message)
+    print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+    if cache is not None:
+        print(f"Hit rate: {cache.hit_rate:.2%}")
+    print()
+
+
+def main():
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitchDouble.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    parser = ParserPython(rhapsody)
+    parse_tree = parser.parse(content)
+    edited = parser.parse(content.replace("_myState = 8192;", "_myState = 8193;", 1))
+
+    cache = VisitCache()
+    timeit(parse_tree, "Visit filling the cache.", cache)
+    timeit(edited, "Visit of the edited input.")
+    timeit(edited, "Cached visit of the edited input.", cache)
+    timeit(edited, "Cached visit of the same input.", cache)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = join(tmp_dir, "cache.db")
+        with PersistentVisitCache(path, parser, rules={"obj"}) as cache:
+            timeit(parse_tree, "Visit filling the persistent cache.", cache)
+        with PersistentVisitCache(path, parser, rules={"obj"}) as cache:
+            timeit(edited, "Persistent cache visit of the edited input.", cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#######################################################################
+# Testing parallel visiting of independent subtrees. Top-level properties
+# of the Rhapsody model are visited in process and thread pools and
+# compared to the sequential visit.
+# License: MIT License
+#######################################################################
+
+import codecs
+import time
+from os.path import dirname, join
+
+from grammar import rhapsody
+
+from arpeggio import ParserPython, PTNodeVisitor, visit_parse_tree
+
+
+class RhapsodyVisitor(PTNodeVisitor):
+    independent_rules = {"prop"}
+
+    def visit_ident(self, node, children):
+        return node.value
+
+    def visit_prop(self, node, children):
+        return (children[0], children[1:])
+
+    def visit_obj(self, node, children):
+        return {name: value for name, value in children[1:]}
+
+
+def timeit(parse_tree, message, **kwargs):
+    t_start = time.time()
+    visit_parse_tree(parse_tree, RhapsodyVisitor(), **kwargs)
+    t_end = time.time()
+
+    print(message)
+    print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+    print()
+
+
+def main():
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitchDouble.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    # Regex match objects can't be pickled for process workers.
+    parse_tree = ParserPython(rhapsody, lazy_terminals=True).parse(content)
+
+    for i in range(3):
+        timeit(parse_tree, f"{i + 1}. Sequential visit.")
+        timeit(
+            parse_tree,
+            f"{i + 1}. Parallel visit, 4 processes.",
+            parallel=4,
+            executor="process",
+        )
+        timeit(
+            parse_tree,
+            f"{i + 1}. Parallel visit, 4 threads.",
+            parallel=4,
+            executor="thread",
+        )
+
+
+if __name__ == "__main__":
+    main()
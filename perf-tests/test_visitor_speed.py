@@ -0,0 +1,90 @@
+#######################################################################
+# Testing parse tree visiting speed. The iterative visit_parse_tree is
+# compared to the previous recursive implementation.
+# License: MIT License
+#######################################################################
+
+import codecs
+import time
+from os.path import dirname, join
+
+from grammar import rhapsody
+
+from arpeggio import (
+    NonTerminal,
+    ParserPython,
+    PTNodeVisitor,
+    SemanticActionResults,
+    visit_parse_tree,
+)
+
+
+class RhapsodyVisitor(PTNodeVisitor):
+    def visit_name(self, node, children):
+        return node.value
+
+    def visit_value(self, node, children):
+        return children[0] if children else None
+
+    def visit_prop(self, node, children):
+        return (children[0], children[1:])
+
+    def visit_obj(self, node, children):
+        return children
+
+    def second_obj(self, obj):
+        pass
+
+
+def recursive_visit(node, visitor):
+    """
+    The recursive implementation of ParseTreeNode.visit used before.
+    """
+    children = SemanticActionResults()
+    if isinstance(node, NonTerminal):
+        for n in node:
+            child = recursive_visit(n, visitor)
+            if child is not None:
+                children.append_result(n.rule_name, child)
+
+    visit_name = f"visit_{node.rule_name}"
+    if hasattr(visitor, visit_name):
+        result = getattr(visitor, visit_name)(node, children)
+        if hasattr(visitor, f"second_{node.rule_name}"):
+            visitor.for_second_pass.append((node.rule_name, result))
+        return result
+    elif visitor.defaults:
+        return visitor.visit__default__(node, children)
+
+
+def recursive_visit_parse_tree(parse_tree, visitor):
+    result = recursive_visit(parse_tree, visitor)
+    for sa_name, asg_node in visitor.for_second_pass:
+        getattr(visitor, f"second_{sa_name}")(asg_node)
+    return result
+
+
+def timeit(parse_tree, message, visit):
+    t_start = time.time()
+    visit(parse_tree, RhapsodyVisitor())
+    t_end = time.time()
+
+    print(message)
+    print(f"Elapsed time: {t_end - t_start:.2f}", "sec")
+    print()
+
+
+def main():
+    file_name = join(dirname(__file__), "test_inputs", "LightSwitchDouble.rpy")
+    with codecs.open(file_name, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    parse_tree = ParserPython(rhapsody).parse(content)
+
+    for i in range(3):
+        timeit(parse_tree, f"{i + 1}. Recursive visit.", recursive_visit_parse_tree)
+        timeit(parse_tree, f"{i + 1}. visit_parse_tree.", visit_parse_tree)
+
+
+if __name__ == "__main__":
+    main()